@@ -40,8 +40,16 @@ class Settings(BaseSettings):
     
     # Caching
     redis_url: Optional[str] = None
+    redis_operation_timeout_ms: int = 100
+    redis_retry_interval_seconds: int = 30
+    redis_max_connections: int = 50
     cache_ttl_seconds: int = 3600
     enable_query_cache: bool = True
+    memory_cache_max_items: int = 1000
+    memory_cache_max_mb: int = 64
+    cache_sweep_interval_seconds: int = 60
+    cache_compression: str = "auto"  # auto, zstd, lz4, zlib, none
+    cache_compression_threshold_bytes: int = 1024
     
     # Logging
     log_level: str = "INFO"
@@ -4,13 +4,17 @@ Implementa controlo de taxa de pedidos para proteger a API
 """
 
 from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import time
+import hashlib
 import logging
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from app.core.config import settings
+from app.services.redis_pool import RedisUnavailable, SharedRedis, shared_redis
 
 logger = logging.getLogger(__name__)
 
@@ -20,17 +24,49 @@ limiter = Limiter(
     default_limits=[f"{settings.rate_limit_per_minute}/minute"]
 )
 
-# Cache em memória para tracking de requests (para uso sem Redis)
-request_cache: Dict[str, Dict] = {}
+# Contadores da janela deslizante no Redis: verificação e incremento atómicos para
+# todos os workers. KEYS: (actual, anterior) por janela; ARGV: agora, (tamanho, limite) por janela.
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local windows = (#ARGV - 1) / 2
+local estimates = {}
+for i = 1, windows do
+    local size = tonumber(ARGV[i * 2])
+    local limit = tonumber(ARGV[i * 2 + 1])
+    local current = tonumber(redis.call('GET', KEYS[i * 2 - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i * 2]) or '0')
+    local estimate = previous * (1 - (now % size) / size) + current
+    if estimate + 1 > limit then
+        return {0, i, tostring(estimate)}
+    end
+    estimates[i] = tostring(estimate + 1)
+end
+for i = 1, windows do
+    redis.call('INCR', KEYS[i * 2 - 1])
+    redis.call('EXPIRE', KEYS[i * 2 - 1], tonumber(ARGV[i * 2]) * 2)
+end
+return {1, 0, unpack(estimates)}
+"""
+
 
 class AdvancedRateLimiter:
-    """Rate limiter avançado com múltiplas estratégias"""
+    """
+    Rate limiter por janela deslizante (contadores da janela actual e anterior,
+    ponderados). Guarda poucos inteiros por cliente; usa o Redis partilhado entre
+    workers quando disponível e contadores em memória como fallback.
+    """
     
-    def __init__(self):
+    CLEANUP_INTERVAL = 60
+    
+    def __init__(self, redis: Optional[SharedRedis] = None):
         self.enabled = True
         self.per_minute_limit = settings.rate_limit_per_minute
         self.per_hour_limit = settings.rate_limit_per_hour
-        self.request_cache = {}
+        # client_id -> {"windows": {tamanho: [id_janela, contagem, contagem_anterior]}, "last_request": t}
+        self.request_cache: Dict[str, Dict] = {}
+        self.redis = redis or shared_redis
+        self._script = None
+        self._last_cleanup = time.time()
     
     def get_client_identifier(self, request: Request) -> str:
         """Identifica o cliente de forma única"""
@@ -40,132 +76,234 @@ class AdvancedRateLimiter:
         # Se disponível, usar user-agent para identificação adicional
         user_agent = request.headers.get("user-agent", "unknown")
         
-        return f"{client_ip}:{hash(user_agent) % 10000}"
+        # Digest estável: hash() de str muda entre processos e cada worker usaria chaves Redis diferentes
+        user_agent_digest = hashlib.blake2b(user_agent.encode(), digest_size=4).hexdigest()
+        
+        return f"{client_ip}:{user_agent_digest}"
     
-    def is_rate_limited(self, client_id: str) -> tuple[bool, Optional[dict]]:
-        """Verifica se o cliente excedeu os limites"""
-        current_time = time.time()
+    def _windows(self) -> List[Tuple[str, int, int]]:
+        # Lidos a cada pedido: os limites podem ser alterados em execução
+        return [
+            ("per_minute", 60, self.per_minute_limit),
+            ("per_hour", 3600, self.per_hour_limit)
+        ]
+    
+    def _result(self, now: float, counts: List[float], blocked: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Estado do pedido: se bloqueado, a janela que bloqueou; senão a janela com
+        menos pedidos restantes (é essa que os headers reportam)
+        """
+        windows = self._windows()
+        if blocked is not None:
+            index = blocked
+        else:
+            index = min(range(len(windows)), key=lambda i: windows[i][2] - counts[i])
+        limit_type, size, limit = windows[index]
+        count = counts[index]
+        return {
+            "allowed": blocked is None,
+            "limit_type": limit_type,
+            "limit": limit,
+            "current_count": int(count),
+            "remaining": max(0, int(limit - count)),
+            "reset_time": int((now // size + 1) * size)
+        }
+    
+    def _local_estimates(self, client_id: str, now: float) -> List[float]:
+        client_data = self.request_cache.setdefault(client_id, {"windows": {}, "last_request": now})
+        estimates = []
+        for _, size, _ in self._windows():
+            window_id = int(now // size)
+            state = client_data["windows"].setdefault(size, [window_id, 0, 0])
+            if state[0] != window_id:
+                # Nova janela: a actual passa a anterior (ou zero se houve um intervalo)
+                state[2] = state[1] if state[0] == window_id - 1 else 0
+                state[0], state[1] = window_id, 0
+            weight = 1 - (now % size) / size
+            estimates.append(state[2] * weight + state[1])
+        return estimates
+    
+    def check_and_record_local(self, client_id: str, now: Optional[float] = None) -> Dict[str, Any]:
+        """Verifica e regista o pedido nos contadores em memória (atómico no event loop)"""
+        now = now or time.time()
+        estimates = self._local_estimates(client_id, now)
         
-        if client_id not in self.request_cache:
-            self.request_cache[client_id] = {
-                "requests_per_minute": [],
-                "requests_per_hour": [],
-                "first_request": current_time
-            }
+        for i, (_, _, limit) in enumerate(self._windows()):
+            if estimates[i] + 1 > limit:
+                return self._result(now, estimates, blocked=i)
         
         client_data = self.request_cache[client_id]
+        for _, size, _ in self._windows():
+            client_data["windows"][size][1] += 1
+        client_data["last_request"] = now
         
-        # Limpar requests antigos
-        minute_ago = current_time - 60
-        hour_ago = current_time - 3600
-        
-        client_data["requests_per_minute"] = [
-            req_time for req_time in client_data["requests_per_minute"] 
-            if req_time > minute_ago
-        ]
-        
-        client_data["requests_per_hour"] = [
-            req_time for req_time in client_data["requests_per_hour"] 
-            if req_time > hour_ago
-        ]
+        if now - self._last_cleanup >= self.CLEANUP_INTERVAL:
+            self._cleanup_old_entries()
         
-        # Verificar limites
-        minute_count = len(client_data["requests_per_minute"])
-        hour_count = len(client_data["requests_per_hour"])
-        
-        if minute_count >= self.per_minute_limit:
-            return True, {
-                "error": "Rate limit exceeded",
-                "limit_type": "per_minute",
-                "current_count": minute_count,
-                "limit": self.per_minute_limit,
-                "reset_time": int(minute_ago + 60)
-            }
+        return self._result(now, [estimate + 1 for estimate in estimates])
+    
+    async def _check_and_record_redis(self, client_id: str, now: float) -> Dict[str, Any]:
+        keys, args = [], [now]
+        for _, size, limit in self._windows():
+            window_id = int(now // size)
+            keys += [f"ratelimit:{client_id}:{size}:{window_id}", f"ratelimit:{client_id}:{size}:{window_id - 1}"]
+            args += [size, limit]
         
-        if hour_count >= self.per_hour_limit:
-            return True, {
-                "error": "Rate limit exceeded", 
-                "limit_type": "per_hour",
-                "current_count": hour_count,
-                "limit": self.per_hour_limit,
-                "reset_time": int(hour_ago + 3600)
-            }
+        async def operation(client):
+            if self._script is None:
+                self._script = client.register_script(SLIDING_WINDOW_LUA)
+            return await self._script(keys=keys, args=args, client=client)
         
+        reply = await self.redis.execute(operation)
+        allowed, blocked = int(reply[0]), int(reply[1])
+        if not allowed:
+            counts = [0.0] * len(self._windows())
+            counts[blocked - 1] = float(reply[2])
+            return self._result(now, counts, blocked=blocked - 1)
+        return self._result(now, [float(value) for value in reply[2:]])
+    
+    async def check_and_record(self, client_id: str) -> Dict[str, Any]:
+        """Verifica o limite e, se permitido, regista o pedido (Redis ou memória)"""
+        now = time.time()
+        if self.redis.is_available():
+            try:
+                return await self._check_and_record_redis(client_id, now)
+            except RedisUnavailable:
+                pass
+            except Exception as e:
+                logger.error(f"Erro no rate limiting Redis: {e}")
+        return self.check_and_record_local(client_id, now)
+    
+    def is_rate_limited(self, client_id: str) -> tuple[bool, Optional[dict]]:
+        """Verifica se o cliente excedeu os limites (contadores em memória, sem registar)"""
+        now = time.time()
+        estimates = self._local_estimates(client_id, now)
+        for i, (_, _, limit) in enumerate(self._windows()):
+            if estimates[i] + 1 > limit:
+                return True, limit_info(self._result(now, estimates, blocked=i))
         return False, None
     
     def record_request(self, client_id: str):
-        """Regista um pedido para o cliente"""
-        current_time = time.time()
-        
-        if client_id in self.request_cache:
-            client_data = self.request_cache[client_id]
-            client_data["requests_per_minute"].append(current_time)
-            client_data["requests_per_hour"].append(current_time)
-        
-        # Limpar cache antigo (older than 1 hour)
-        self._cleanup_old_entries()
+        """Regista um pedido para o cliente (contadores em memória)"""
+        now = time.time()
+        self._local_estimates(client_id, now)
+        client_data = self.request_cache[client_id]
+        for _, size, _ in self._windows():
+            client_data["windows"][size][1] += 1
+        client_data["last_request"] = now
     
     def _cleanup_old_entries(self):
-        """Remove entradas antigas do cache"""
+        """Remove clientes sem pedidos na última hora (corre no máximo uma vez por minuto)"""
         current_time = time.time()
         hour_ago = current_time - 3600
+        self._last_cleanup = current_time
         
         expired_clients = [
             client_id for client_id, data in self.request_cache.items()
-            if data.get("first_request", 0) < hour_ago and not data["requests_per_hour"]
+            if data.get("last_request", 0) < hour_ago
         ]
         
         for client_id in expired_clients:
             del self.request_cache[client_id]
 
+
+def limit_info(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Detalhe do limite excedido, no formato da resposta 429"""
+    return {
+        "error": "Rate limit exceeded",
+        "limit_type": result["limit_type"],
+        "current_count": result["current_count"],
+        "limit": result["limit"],
+        "reset_time": result["reset_time"]
+    }
+
+
+def rate_limit_headers(result: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "X-RateLimit-Limit": str(result["limit"]),
+        "X-RateLimit-Remaining": str(result["remaining"]),
+        "X-RateLimit-Reset": str(result["reset_time"])
+    }
+
+
 # Instância global do rate limiter
 rate_limiter = AdvancedRateLimiter()
 
+# Endpoints de health check não contam para o rate limiting
+EXEMPT_PATHS = {"/health", "/api/health", "/"}
+
+
+def rate_limit_exceeded_response(client_id: str, result: Dict[str, Any]) -> JSONResponse:
+    """Resposta 429 com o detalhe do limite excedido"""
+    info = limit_info(result)
+    logger.warning(f"Rate limit exceeded for client {client_id}: {info}")
+    
+    return JSONResponse(
+        status_code=429,
+        content={
+            "detail": {
+                "message": "Taxa de pedidos excedida. Tente novamente mais tarde.",
+                "limit_info": info
+            }
+        },
+        headers={
+            "Retry-After": str(max(1, result["reset_time"] - int(time.time()))),
+            **rate_limit_headers(result)
+        }
+    )
+
+
+class RateLimitMiddleware:
+    """Rate limiting como middleware ASGI puro; headers injectados em http.response.start"""
+    
+    def __init__(self, app: ASGIApp, limiter: Optional[AdvancedRateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        
+        client_id = self.limiter.get_client_identifier(Request(scope))
+        result = await self.limiter.check_and_record(client_id)
+        
+        if not result["allowed"]:
+            await rate_limit_exceeded_response(client_id, result)(scope, receive, send)
+            return
+        
+        headers = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                   for name, value in rate_limit_headers(result).items()]
+        
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *headers]
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+
+
 async def rate_limit_middleware(request: Request, call_next):
-    """Middleware para verificar rate limiting"""
+    """Middleware para verificar rate limiting (forma @app.middleware("http"))"""
     
     # Saltar rate limiting para endpoints de health check
-    if request.url.path in ["/health", "/api/health", "/"]:
-        response = await call_next(request)
-        return response
-    
-    if not rate_limiter.enabled:
+    if request.url.path in EXEMPT_PATHS or not rate_limiter.enabled:
         response = await call_next(request)
         return response
     
     client_id = rate_limiter.get_client_identifier(request)
     
-    # Verificar se rate limited
-    is_limited, limit_info = rate_limiter.is_rate_limited(client_id)
+    # Verificar e registar o pedido numa única operação
+    result = await rate_limiter.check_and_record(client_id)
     
-    if is_limited:
-        logger.warning(f"Rate limit exceeded for client {client_id}: {limit_info}")
-        
-        raise HTTPException(
-            status_code=429,
-            detail={
-                "message": "Taxa de pedidos excedida. Tente novamente mais tarde.",
-                "limit_info": limit_info
-            },
-            headers={
-                "Retry-After": str(60 if limit_info["limit_type"] == "per_minute" else 3600),
-                "X-RateLimit-Limit": str(rate_limiter.per_minute_limit),
-                "X-RateLimit-Remaining": str(max(0, rate_limiter.per_minute_limit - limit_info["current_count"])),
-                "X-RateLimit-Reset": str(limit_info["reset_time"])
-            }
-        )
-    
-    # Registar o pedido
-    rate_limiter.record_request(client_id)
+    if not result["allowed"]:
+        return rate_limit_exceeded_response(client_id, result)
     
     # Processar pedido
     response = await call_next(request)
     
     # Adicionar headers informativos
-    minute_count = len(request_cache.get(client_id, {}).get("requests_per_minute", []))
-    
-    response.headers["X-RateLimit-Limit"] = str(rate_limiter.per_minute_limit)
-    response.headers["X-RateLimit-Remaining"] = str(max(0, rate_limiter.per_minute_limit - minute_count))
+    response.headers.update(rate_limit_headers(result))
     
     return response
 
@@ -3,116 +3,176 @@ Middleware de segurança para protecção de APIs
 Implementa protecção CORS, validação de headers, e detecção de ameaças
 """
 
-from fastapi import Request, Response, HTTPException
+from fastapi import Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import JSONResponse
 import time
 import re
-from typing import Set, Dict, List
+from typing import Set, Dict, List, NamedTuple, Optional, Tuple
 import ipaddress
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.logging.structured_logger import security_logger
 from app.security.authentication import security_manager
+from app.monitoring.system_monitor import system_monitor
 
-class SecurityMiddleware(BaseHTTPMiddleware):
-    """Middleware principal de segurança"""
+# Padrões de ameaças comuns (flags com âmbito local para poderem ser combinados)
+THREAT_PATTERNS = {
+    'sql_injection': [
+        r"(?i:union\s+select|drop\s+table|delete\s+from|insert\s+into)",
+        r"(?i:\b(?:or|and)\s+\d+\s*=\s*\d+)",
+        r"(?i:exec\s*\(|execute\s*\()"
+    ],
+    'xss': [
+        r"(?i:<script|<iframe|<object|<embed)",
+        r"(?i:javascript:|vbscript:|data:)",
+        r"(?i:(?:onload|onerror|onclick|onmouseover)\s*=)"
+    ],
+    'path_traversal': [
+        r"\.\.[\\/]",
+        r"[\\/]etc[\\/]passwd",
+        r"[\\/]proc[\\/]self"
+    ]
+}
+
+# Ferramentas de scanning identificadas pelo User-Agent
+SUSPICIOUS_USER_AGENTS = {
+    'scanner': [r"(?i:nikto|sqlmap|nmap|masscan|dirb|gobuster)"]
+}
+
+
+class ThreatMatch(NamedTuple):
+    category: str
+    pattern: str
+    fragment: str
+
+
+class ThreatScanner:
+    """
+    Padrões agrupados por categoria, compilados uma vez numa só alternância com
+    grupos nomeados: cada verificação é uma única passagem sobre o texto e o
+    grupo que casou identifica a categoria e o padrão
+    """
+    
+    def __init__(self, patterns: Dict[str, List[str]]):
+        self._groups: Dict[str, Tuple[str, str]] = {}
+        alternatives = []
+        for category, category_patterns in patterns.items():
+            for pattern in category_patterns:
+                group = f"g{len(self._groups)}"
+                self._groups[group] = (category, pattern)
+                alternatives.append(f"(?P<{group}>{pattern})")
+        self._regex = re.compile("|".join(alternatives))
+    
+    def scan(self, text: str) -> Optional[ThreatMatch]:
+        match = self._regex.search(text)
+        if match is None:
+            return None
+        category, pattern = self._groups[match.lastgroup]
+        return ThreatMatch(category, pattern, match.group())
+
+
+# Instâncias globais dos scanners (compilados uma vez)
+threat_scanner = ThreatScanner(THREAT_PATTERNS)
+user_agent_scanner = ThreatScanner(SUSPICIOUS_USER_AGENTS)
+
+
+class ReplayableReceive:
+    """
+    Envolve o receive ASGI para inspeccionar o início do body: as mensagens lidas
+    por peek() ficam em buffer e são devolvidas de novo à aplicação a jusante
+    """
+    
+    def __init__(self, receive: Receive):
+        self._receive = receive
+        self._buffer: List[Message] = []
+        self._complete = False
+    
+    async def peek(self, size: int) -> bytes:
+        """Primeiros size bytes do body, lendo só as mensagens necessárias"""
+        sample = b"".join(message.get("body", b"") for message in self._buffer)
+        while len(sample) < size and not self._complete:
+            message = await self._receive()
+            self._buffer.append(message)
+            if message["type"] != "http.request" or not message.get("more_body", False):
+                self._complete = True
+            sample += message.get("body", b"")
+        return sample[:size]
+    
+    async def __call__(self) -> Message:
+        if self._buffer:
+            return self._buffer.pop(0)
+        return await self._receive()
+
+
+# Headers de segurança adicionados a todas as respostas (pré-codificados)
+SECURITY_HEADERS = [
+    (name.lower().encode("latin-1"), value.encode("latin-1"))
+    for name, value in {
+        "X-Content-Type-Options": "nosniff",
+        "X-Frame-Options": "DENY",
+        "X-XSS-Protection": "1; mode=block",
+        "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+        "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+        "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
+    }.items()
+]
+
+
+def get_client_ip(request: Request) -> str:
+    """Obter IP real do cliente considerando proxies"""
+    # Verificar headers de proxy comuns
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if forwarded_for:
+        # Primeiro IP na lista é o cliente original
+        return forwarded_for.split(",")[0].strip()
+    
+    real_ip = request.headers.get("X-Real-IP")
+    if real_ip:
+        return real_ip.strip()
+    
+    # Fallback para IP directo
+    if request.client is not None:
+        return request.client.host
+    
+    return "unknown"
+
+
+class SecurityMiddleware:
+    """
+    Middleware principal de segurança (ASGI puro: sem a task e o stream extra
+    do BaseHTTPMiddleware; respostas em streaming passam sem buffer)
+    """
     
-    def __init__(self, app, 
+    def __init__(self, app: ASGIApp, 
                  trusted_hosts: List[str] = None,
                  allowed_methods: List[str] = None,
                  max_request_size: int = 50 * 1024 * 1024):  # 50MB
-        super().__init__(app)
+        self.app = app
         self.trusted_hosts = set(trusted_hosts or ["localhost", "127.0.0.1", "0.0.0.0"])
         self.allowed_methods = set(allowed_methods or ["GET", "POST", "PUT", "DELETE", "OPTIONS"])
         self.max_request_size = max_request_size
         
-        # Padrões de ameaças comuns
-        self.threat_patterns = {
-            'sql_injection': [
-                r"(?i)(union\s+select|drop\s+table|delete\s+from|insert\s+into)",
-                r"(?i)(\b(or|and)\s+\d+\s*=\s*\d+)",
-                r"(?i)(exec\s*\(|execute\s*\()"
-            ],
-            'xss': [
-                r"(?i)(<script|<iframe|<object|<embed)",
-                r"(?i)(javascript:|vbscript:|data:)",
-                r"(?i)(onload|onerror|onclick|onmouseover)\s*="
-            ],
-            'path_traversal': [
-                r"\.\.[\\/]",
-                r"[\\/]etc[\\/]passwd",
-                r"[\\/]proc[\\/]self"
-            ]
-        }
+        # Padrões de ameaças compilados numa única expressão
+        self.threat_scanner = threat_scanner
+        self.user_agent_scanner = user_agent_scanner
         
         # IPs suspeitos (exemplo)
         self.blocked_ips = set()
         self.suspicious_ips = set()
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Processar request através dos filtros de segurança"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = time.time()
+        request = Request(scope)
+        replay = ReplayableReceive(receive)
         
         try:
-            # 1. Verificar tamanho do request
-            if hasattr(request, 'content_length') and request.content_length:
-                if request.content_length > self.max_request_size:
-                    security_logger.log_security_event(
-                        "request_too_large",
-                        ip_address=self.get_client_ip(request),
-                        details={"size": request.content_length}
-                    )
-                    raise HTTPException(status_code=413, detail="Request demasiado grande")
-            
-            # 2. Verificar IP bloqueado
-            client_ip = self.get_client_ip(request)
-            if self.is_ip_blocked(client_ip):
-                security_logger.log_security_event(
-                    "blocked_ip_attempt",
-                    ip_address=client_ip
-                )
-                raise HTTPException(status_code=403, detail="IP bloqueado")
-            
-            # 3. Verificar rate limiting global
-            if security_manager.is_ip_blocked(client_ip):
-                security_logger.log_security_event(
-                    "rate_limit_exceeded",
-                    ip_address=client_ip
-                )
-                raise HTTPException(status_code=429, detail="Demasiados pedidos")
-            
-            # 4. Validar método HTTP
-            if request.method not in self.allowed_methods:
-                security_logger.log_security_event(
-                    "invalid_method",
-                    ip_address=client_ip,
-                    details={"method": request.method}
-                )
-                raise HTTPException(status_code=405, detail="Método não permitido")
-            
-            # 5. Verificar headers suspeitos
-            await self.check_suspicious_headers(request, client_ip)
-            
-            # 6. Verificar padrões de ameaças na URL e parâmetros
-            await self.check_threat_patterns(request, client_ip)
-            
-            # 7. Processar request
-            response = await call_next(request)
-            
-            # 8. Adicionar headers de segurança na resposta
-            response = self.add_security_headers(response)
-            
-            # 9. Log da request
-            processing_time = time.time() - start_time
-            security_logger.log_api_request(
-                method=request.method,
-                path=str(request.url.path),
-                status_code=response.status_code,
-                response_time=processing_time,
-                user_id=getattr(request.state, 'user_id', None)
-            )
-            
-            return response
-            
+            await self.check_request(request, replay)
         except HTTPException as e:
             # Log de excepções de segurança
             security_logger.log_security_event(
@@ -120,30 +180,86 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 ip_address=self.get_client_ip(request),
                 details={"status_code": e.status_code, "detail": e.detail}
             )
-            raise
-        
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, replay, send)
+            return
         except Exception as e:
             # Log de erros inesperados
             security_logger.error(f"Erro no middleware de segurança: {str(e)}")
-            raise HTTPException(status_code=500, detail="Erro interno do servidor")
+            await JSONResponse({"detail": "Erro interno do servidor"}, status_code=500)(scope, replay, send)
+            return
+        
+        status_code = 500
+        
+        async def send_with_headers(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                # 8. Adicionar headers de segurança na resposta
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), *SECURITY_HEADERS]
+            await send(message)
+        
+        try:
+            # 7. Processar request
+            await self.app(scope, replay, send_with_headers)
+        finally:
+            # 9. Log da request
+            processing_time = time.time() - start_time
+            security_logger.log_api_request(
+                method=request.method,
+                path=scope["path"],
+                status_code=status_code,
+                response_time=processing_time,
+                user_id=getattr(request.state, 'user_id', None)
+            )
     
-    def get_client_ip(self, request: Request) -> str:
-        """Obter IP real do cliente considerando proxies"""
-        # Verificar headers de proxy comuns
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            # Primeiro IP na lista é o cliente original
-            return forwarded_for.split(",")[0].strip()
+    async def check_request(self, request: Request, replay: ReplayableReceive):
+        """Filtros de segurança; levanta HTTPException se o pedido deve ser rejeitado"""
+        # 1. Verificar tamanho do request
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            if int(content_length) > self.max_request_size:
+                security_logger.log_security_event(
+                    "request_too_large",
+                    ip_address=self.get_client_ip(request),
+                    details={"size": int(content_length)}
+                )
+                raise HTTPException(status_code=413, detail="Request demasiado grande")
         
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip:
-            return real_ip.strip()
+        # 2. Verificar IP bloqueado
+        client_ip = self.get_client_ip(request)
+        if self.is_ip_blocked(client_ip):
+            security_logger.log_security_event(
+                "blocked_ip_attempt",
+                ip_address=client_ip
+            )
+            raise HTTPException(status_code=403, detail="IP bloqueado")
         
-        # Fallback para IP directo
-        if hasattr(request.client, 'host'):
-            return request.client.host
+        # 3. Verificar rate limiting global
+        if security_manager.is_ip_blocked(client_ip):
+            security_logger.log_security_event(
+                "rate_limit_exceeded",
+                ip_address=client_ip
+            )
+            raise HTTPException(status_code=429, detail="Demasiados pedidos")
         
-        return "unknown"
+        # 4. Validar método HTTP
+        if request.method not in self.allowed_methods:
+            security_logger.log_security_event(
+                "invalid_method",
+                ip_address=client_ip,
+                details={"method": request.method}
+            )
+            raise HTTPException(status_code=405, detail="Método não permitido")
+        
+        # 5. Verificar headers suspeitos
+        await self.check_suspicious_headers(request, client_ip)
+        
+        # 6. Verificar padrões de ameaças na URL e parâmetros
+        await self.check_threat_patterns(request, client_ip, replay)
+    
+    def get_client_ip(self, request: Request) -> str:
+        """Obter IP real do cliente considerando proxies"""
+        return get_client_ip(request)
     
     def is_ip_blocked(self, ip_address: str) -> bool:
         """Verificar se IP está na lista de bloqueados"""
@@ -163,108 +279,79 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     
     async def check_suspicious_headers(self, request: Request, client_ip: str):
         """Verificar headers suspeitos"""
-        suspicious_patterns = [
-            r"(?i)nikto",
-            r"(?i)sqlmap",
-            r"(?i)nmap",
-            r"(?i)masscan",
-            r"(?i)dirb",
-            r"(?i)gobuster"
-        ]
-        
         user_agent = request.headers.get("User-Agent", "")
-        for pattern in suspicious_patterns:
-            if re.search(pattern, user_agent):
-                security_logger.log_security_event(
-                    "suspicious_user_agent",
-                    ip_address=client_ip,
-                    details={"user_agent": user_agent}
-                )
-                raise HTTPException(status_code=403, detail="User-Agent suspeito")
+        if user_agent and self.user_agent_scanner.scan(user_agent):
+            security_logger.log_security_event(
+                "suspicious_user_agent",
+                ip_address=client_ip,
+                details={"user_agent": user_agent}
+            )
+            raise HTTPException(status_code=403, detail="User-Agent suspeito")
     
-    async def check_threat_patterns(self, request: Request, client_ip: str):
+    async def check_threat_patterns(self, request: Request, client_ip: str, replay: ReplayableReceive):
         """Verificar padrões de ameaças na request"""
         # Verificar URL
-        url_path = str(request.url.path)
-        query_params = str(request.url.query)
+        url_path = request.url.path
+        query_params = request.url.query
         
         # Verificar body se existir
         body_content = ""
         if request.method in ["POST", "PUT", "PATCH"]:
             try:
-                # Ler uma amostra do body (primeiros 1KB)
-                body_bytes = await request.receive()
-                if body_bytes.get("body"):
-                    body_content = body_bytes["body"][:1024].decode("utf-8", errors="ignore")
-            except:
+                # Ler uma amostra do body (primeiros 1KB), reposta para a rota
+                body_sample = await replay.peek(1024)
+                body_content = body_sample.decode("utf-8", errors="ignore")
+            except Exception:
                 pass
         
         # Combinar todos os conteúdos para análise
         content_to_check = f"{url_path} {query_params} {body_content}"
         
-        # Verificar cada tipo de ameaça
-        for threat_type, patterns in self.threat_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, content_to_check):
-                    security_logger.log_security_event(
-                        f"threat_detected_{threat_type}",
-                        ip_address=client_ip,
-                        details={
-                            "pattern": pattern,
-                            "content_sample": content_to_check[:200]
-                        }
-                    )
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Conteúdo suspeito detectado: {threat_type}"
-                    )
-    
-    def add_security_headers(self, response: Response) -> Response:
-        """Adicionar headers de segurança à resposta"""
-        security_headers = {
-            "X-Content-Type-Options": "nosniff",
-            "X-Frame-Options": "DENY",
-            "X-XSS-Protection": "1; mode=block",
-            "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
-            "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'",
-            "Referrer-Policy": "strict-origin-when-cross-origin",
-            "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
-        }
-        
-        for header, value in security_headers.items():
-            response.headers[header] = value
-        
-        return response
+        threat = self.threat_scanner.scan(content_to_check)
+        if threat:
+            security_logger.log_security_event(
+                f"threat_detected_{threat.category}",
+                ip_address=client_ip,
+                details={
+                    "pattern": threat.pattern,
+                    "match": threat.fragment[:100],
+                    "content_sample": content_to_check[:200]
+                }
+            )
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Conteúdo suspeito detectado: {threat.category}"
+            )
 
-class IPWhitelistMiddleware(BaseHTTPMiddleware):
+class IPWhitelistMiddleware:
     """Middleware para whitelist de IPs em endpoints críticos"""
     
-    def __init__(self, app, protected_paths: List[str] = None, whitelist: List[str] = None):
-        super().__init__(app)
-        self.protected_paths = protected_paths or ["/admin", "/api/admin"]
+    def __init__(self, app: ASGIApp, protected_paths: List[str] = None, whitelist: List[str] = None):
+        self.app = app
+        self.protected_paths = tuple(protected_paths or ["/admin", "/api/admin"])
         self.whitelist = set(whitelist or ["127.0.0.1", "localhost"])
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Verificar whitelist para paths protegidos"""
-        path = request.url.path
-        
         # Verificar se o path está protegido
-        if any(path.startswith(protected) for protected in self.protected_paths):
+        if scope["type"] == "http" and scope["path"].startswith(self.protected_paths):
+            request = Request(scope)
             client_ip = self.get_client_ip(request)
             
             if client_ip not in self.whitelist:
                 security_logger.log_security_event(
                     "unauthorized_admin_access",
                     ip_address=client_ip,
-                    details={"path": path}
+                    details={"path": scope["path"]}
                 )
-                raise HTTPException(
-                    status_code=403, 
-                    detail="Acesso não autorizado a área administrativa"
+                response = JSONResponse(
+                    {"detail": "Acesso não autorizado a área administrativa"},
+                    status_code=403
                 )
+                await response(scope, receive, send)
+                return
         
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
     
     def get_client_ip(self, request: Request) -> str:
         """Obter IP do cliente"""
@@ -272,22 +359,27 @@ class IPWhitelistMiddleware(BaseHTTPMiddleware):
         if forwarded_for:
             return forwarded_for.split(",")[0].strip()
         
-        if hasattr(request.client, 'host'):
+        if request.client is not None:
             return request.client.host
         
         return "unknown"
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware para logging detalhado de requests"""
+class RequestLoggingMiddleware:
+    """Middleware para logging detalhado de requests (ASGI puro)"""
     
-    def __init__(self, app, log_body: bool = False, max_body_size: int = 1024):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, log_body: bool = False, max_body_size: int = 1024):
+        self.app = app
         self.log_body = log_body
         self.max_body_size = max_body_size
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Log detalhado da request"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = time.time()
+        request = Request(scope)
         
         # Capturar dados da request
         request_data = {
@@ -300,27 +392,45 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         
         # Capturar body se habilitado
         if self.log_body and request.method in ["POST", "PUT", "PATCH"]:
+            replay = ReplayableReceive(receive)
+            receive = replay
             try:
-                body = await request.receive()
-                if body.get("body"):
-                    body_text = body["body"][:self.max_body_size].decode("utf-8", errors="ignore")
-                    request_data["body_sample"] = body_text
+                body = await replay.peek(self.max_body_size)
+                if body:
+                    request_data["body_sample"] = body.decode("utf-8", errors="ignore")
             except:
                 request_data["body_sample"] = "Error reading body"
         
-        # Processar request
-        response = await call_next(request)
+        status_code = 500
         
-        # Calcular tempo de processamento
-        processing_time = time.time() - start_time
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
-        # Log completo
-        security_logger.info("Request processed",
-                           request_data=request_data,
-                           response_status=response.status_code,
-                           processing_time=processing_time)
-        
-        return response
+        try:
+            # Processar request
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Calcular tempo de processamento
+            processing_time = time.time() - start_time
+            
+            # Log completo
+            security_logger.info("Request processed",
+                               request_data=request_data,
+                               response_status=status_code,
+                               processing_time=processing_time)
+            
+            # Latência por rota: usar o template da rota para limitar o número de chaves
+            route = scope.get("route")
+            system_monitor.record_request(
+                method=request.method,
+                path=getattr(route, "path", "unmatched"),
+                status_code=status_code,
+                response_time=processing_time,
+                client_id=request_data["client_ip"]
+            )
     
     def get_client_ip(self, request: Request) -> str:
         """Obter IP do cliente"""
@@ -328,7 +438,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         if forwarded_for:
             return forwarded_for.split(",")[0].strip()
         
-        if hasattr(request.client, 'host'):
+        if request.client is not None:
             return request.client.host
         
-        return "unknown"
\ No newline at end of file
+        return "unknown"
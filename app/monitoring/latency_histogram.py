@@ -0,0 +1,105 @@
+"""
+Histogramas de latência com memória fixa
+Buckets logarítmicos (estilo HDR/DDSketch): registar é O(1) e os percentis têm
+erro relativo limitado por relative_accuracy, independentemente do volume.
+"""
+
+import math
+from typing import Dict, List, Optional
+
+
+class LatencyHistogram:
+    """Histograma de latências em segundos, com p50/p90/p99 aproximados"""
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-4, max_value: float = 3600.0):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        # Bucket 0 guarda valores <= min_value; o último, valores >= max_value
+        self._buckets: List[int] = [0] * (self._index(max_value) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return math.ceil(math.log(value / self.min_value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        """Ponto do bucket com erro relativo mínimo"""
+        if index == 0:
+            return self.min_value
+        return self.min_value * 2 * self._gamma ** index / (self._gamma + 1)
+
+    def record(self, value: float):
+        index = min(self._index(value), len(self._buckets) - 1)
+        self._buckets[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Valor no quantil q (0..1); None sem registos"""
+        count = self.count
+        if not count:
+            return None
+        # Nearest-rank: o menor valor com pelo menos q * count registos até ele
+        rank = max(1, math.ceil(q * count))
+        seen = 0
+        for index, bucket in enumerate(self._buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Contagem, média e percentis em milissegundos"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1),
+            "p50_ms": round(self.quantile(0.50) * 1000, 1),
+            "p90_ms": round(self.quantile(0.90) * 1000, 1),
+            "p99_ms": round(self.quantile(0.99) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1)
+        }
+
+
+class HistogramRegistry:
+    """
+    Um histograma por chave (rota, provedor) mais um agregado. O número de chaves
+    é limitado: chaves novas acima de max_keys vão para "other"
+    """
+
+    OVERFLOW_KEY = "other"
+
+    def __init__(self, max_keys: int = 200, relative_accuracy: float = 0.01):
+        self.max_keys = max_keys
+        self.relative_accuracy = relative_accuracy
+        self.overall = LatencyHistogram(relative_accuracy)
+        self._histograms: Dict[str, LatencyHistogram] = {}
+
+    def record(self, key: str, value: float):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            if len(self._histograms) >= self.max_keys:
+                key = self.OVERFLOW_KEY
+                histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram(self.relative_accuracy)
+        histogram.record(value)
+        self.overall.record(value)
+
+    def get(self, key: str) -> Optional[LatencyHistogram]:
+        return self._histograms.get(key)
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            "overall": self.overall.summary(),
+            "by_key": {key: histogram.summary() for key, histogram in list(self._histograms.items())}
+        }
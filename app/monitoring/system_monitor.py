@@ -5,13 +5,14 @@ Colecta métricas de performance, saúde do sistema e alertas
 
 import psutil
 import time
-import asyncio
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from dataclasses import dataclass, asdict
 import logging
 import json
 from collections import deque
+from app.monitoring.latency_histogram import HistogramRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -50,59 +51,132 @@ class HealthStatus:
     issues: List[str]
     uptime_seconds: int
 
+class RingBuffer:
+    """
+    Buffer circular de tamanho fixo com um único escritor (a thread de amostragem)
+    e leitores sem lock: o escritor preenche o slot antes de avançar o contador,
+    portanto um leitor nunca vê um slot por preencher
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._slots: List[Any] = [None] * capacity
+        self._written = 0
+    
+    def append(self, item: Any):
+        written = self._written
+        self._slots[written % self.capacity] = item
+        self._written = written + 1
+    
+    def latest(self) -> Optional[Any]:
+        written = self._written
+        return self._slots[(written - 1) % self.capacity] if written else None
+    
+    def snapshot(self) -> List[Any]:
+        """Itens do mais antigo para o mais recente"""
+        written = self._written
+        if written <= self.capacity:
+            return self._slots[:written]
+        start = written % self.capacity
+        return self._slots[start:] + self._slots[:start]
+    
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+    
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.snapshot())
+    
+    def __getitem__(self, index: int) -> Any:
+        return self.snapshot()[index]
+
+
 class SystemMonitor:
     """Monitor principal do sistema"""
     
+    # Segundos até à primeira amostra (referência para o delta de CPU)
+    FIRST_SAMPLE_DELAY = 1.0
+    
     def __init__(self, max_history: int = 1000):
         self.max_history = max_history
-        self.system_metrics_history = deque(maxlen=max_history)
-        self.api_metrics_history = deque(maxlen=max_history)
+        # Escritos pela thread de amostragem, lidos pela API sem lock
+        self.system_metrics_history = RingBuffer(max_history)
+        self.api_metrics_history = RingBuffer(max_history)
         self.start_time = time.time()
         self.request_log = deque(maxlen=10000)  # Log de requests
         self.error_log = deque(maxlen=1000)     # Log de erros
         self.is_monitoring = False
         
+        # Latência por rota (memória fixa) e contadores acumulados; cada ciclo
+        # de amostragem usa a diferença face ao ciclo anterior
+        self.route_latency = HistogramRegistry()
+        self.error_count = 0
+        self._interval_clients = set()
+        self._last_totals = (time.monotonic(), 0, 0.0, 0)
+        self._process = psutil.Process()
+        self._stop_event = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        
         # Thresholds para alertas
         self.cpu_threshold = 80.0
         self.memory_threshold = 85.0
         self.disk_threshold = 90.0
         self.error_rate_threshold = 5.0
     
-    async def start_monitoring(self, interval: int = 60):
-        """Iniciar monitorização contínua"""
+    def start_sampler(self, interval: int = 60):
+        """Iniciar a thread de amostragem (o event loop nunca espera pela recolha)"""
+        if self._sampler and self._sampler.is_alive():
+            return
+        
         self.is_monitoring = True
+        self._stop_event.clear()
+        # Primeira chamada só fixa a referência para os deltas de CPU seguintes
+        psutil.cpu_percent(interval=None)
+        self._sampler = threading.Thread(
+            target=self._sample_loop, args=(interval,), name="system-monitor", daemon=True
+        )
+        self._sampler.start()
         logger.info("Iniciando monitorização do sistema")
-        
-        while self.is_monitoring:
-            try:
-                # Coletar métricas do sistema
-                system_metrics = self.collect_system_metrics()
-                self.system_metrics_history.append(system_metrics)
-                
-                # Coletar métricas da API
-                api_metrics = self.collect_api_metrics()
-                self.api_metrics_history.append(api_metrics)
-                
-                # Verificar alertas
-                await self.check_alerts(system_metrics, api_metrics)
-                
-                # Aguardar próximo ciclo
-                await asyncio.sleep(interval)
-                
-            except Exception as e:
-                logger.error(f"Erro na monitorização: {e}")
-                await asyncio.sleep(interval)
+    
+    def _sample_loop(self, interval: int):
+        # Primeira amostra após um curto intervalo (delta de CPU válido), sem esperar interval
+        wait = min(self.FIRST_SAMPLE_DELAY, interval)
+        while not self._stop_event.wait(wait):
+            self._sample()
+            wait = interval
+    
+    def _sample(self):
+        try:
+            # Coletar métricas do sistema
+            system_metrics = self.collect_system_metrics()
+            self.system_metrics_history.append(system_metrics)
+            
+            # Coletar métricas da API
+            api_metrics = self.collect_api_metrics()
+            self.api_metrics_history.append(api_metrics)
+            
+            # Verificar alertas
+            self.evaluate_alerts(system_metrics, api_metrics)
+            
+        except Exception as e:
+            logger.error(f"Erro na monitorização: {e}")
     
     def stop_monitoring(self):
         """Parar monitorização"""
         self.is_monitoring = False
+        self._stop_event.set()
         logger.info("Monitorização parada")
     
+    def _connection_count(self) -> int:
+        """Ligações inet deste processo (não percorre todos os sockets do sistema)"""
+        if hasattr(self._process, 'net_connections'):
+            return len(self._process.net_connections(kind='inet'))
+        return len(self._process.connections(kind='inet'))
+    
     def collect_system_metrics(self) -> SystemMetrics:
         """Coletar métricas do sistema"""
         try:
-            # CPU
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU (delta desde a amostra anterior, sem bloquear)
+            cpu_percent = psutil.cpu_percent(interval=None)
             
             # Memória
             memory = psutil.virtual_memory()
@@ -123,7 +197,7 @@ class SystemMonitor:
             
             # Processos e conexões
             process_count = len(psutil.pids())
-            active_connections = len(psutil.net_connections())
+            active_connections = self._connection_count()
             
             return SystemMetrics(
                 timestamp=datetime.utcnow().isoformat(),
@@ -151,30 +225,28 @@ class SystemMonitor:
             )
     
     def collect_api_metrics(self) -> APIMetrics:
-        """Coletar métricas da API"""
+        """Coletar métricas da API (diferenças dos contadores desde o ciclo anterior)"""
         now = datetime.utcnow()
-        one_minute_ago = now - timedelta(minutes=1)
         
-        # Filtrar requests do último minuto
-        recent_requests = [
-            req for req in self.request_log 
-            if req.get('timestamp', now) > one_minute_ago
-        ]
+        overall = self.route_latency.overall
+        totals = (time.monotonic(), overall.count, overall.total, self.error_count)
+        previous, self._last_totals = self._last_totals, totals
+        elapsed = max(totals[0] - previous[0], 1e-6)
+        interval_requests = totals[1] - previous[1]
         
         # Calcular métricas
-        total_requests = len(self.request_log)
-        requests_per_minute = len(recent_requests)
+        total_requests = totals[1]
+        requests_per_minute = round(interval_requests * 60 / elapsed)
         
         # Tempo médio de resposta
-        response_times = [req.get('response_time', 0) for req in recent_requests if 'response_time' in req]
-        average_response_time = sum(response_times) / len(response_times) if response_times else 0
+        average_response_time = (totals[2] - previous[2]) / interval_requests if interval_requests else 0
         
         # Taxa de erro
-        error_requests = [req for req in recent_requests if req.get('status_code', 200) >= 400]
-        error_rate = (len(error_requests) / len(recent_requests) * 100) if recent_requests else 0
+        error_rate = ((totals[3] - previous[3]) / interval_requests * 100) if interval_requests else 0
         
-        # Sessões ativas (simulado)
-        active_sessions = len(set(req.get('client_id', '') for req in recent_requests))
+        # Sessões ativas (clientes distintos no intervalo)
+        clients, self._interval_clients = self._interval_clients, set()
+        active_sessions = len(clients)
         
         # Cache hit ratio (obtido do cache service)
         cache_hit_ratio = 0.0
@@ -197,6 +269,10 @@ class SystemMonitor:
     
     async def check_alerts(self, system_metrics: SystemMetrics, api_metrics: APIMetrics):
         """Verificar condições de alerta"""
+        self.evaluate_alerts(system_metrics, api_metrics)
+    
+    def evaluate_alerts(self, system_metrics: SystemMetrics, api_metrics: APIMetrics):
+        """Verificar condições de alerta (síncrono, usado pela thread de amostragem)"""
         alerts = []
         
         # Alertas de sistema
@@ -232,6 +308,11 @@ class SystemMonitor:
             'client_id': client_id or 'unknown'
         }
         self.request_log.append(request_data)
+        
+        self.route_latency.record(f"{method} {path}", response_time)
+        if status_code >= 400:
+            self.error_count += 1
+        self._interval_clients.add(client_id or 'unknown')
     
     def record_error(self, error_type: str, message: str, path: str = None):
         """Registar erro para análise"""
@@ -255,8 +336,8 @@ class SystemMonitor:
         }
         
         # Verificar métricas recentes
-        if self.system_metrics_history:
-            latest = self.system_metrics_history[-1]
+        latest = self.system_metrics_history.latest()
+        if latest:
             
             if latest.cpu_percent > self.cpu_threshold:
                 issues.append(f"CPU alta ({latest.cpu_percent}%)")
@@ -269,7 +350,7 @@ class SystemMonitor:
         
         # Verificar erros recentes
         recent_errors = [
-            err for err in self.error_log 
+            err for err in list(self.error_log) 
             if err['timestamp'] > datetime.utcnow() - timedelta(minutes=5)
         ]
         
@@ -293,18 +374,23 @@ class SystemMonitor:
             uptime_seconds=uptime_seconds
         )
     
+    def get_latency_summary(self) -> Dict:
+        """Percentis de latência da API, no total e por rota"""
+        summary = self.route_latency.summary()
+        return {"overall": summary["overall"], "routes": summary["by_key"]}
+    
     def get_metrics_summary(self) -> Dict:
         """Obter resumo das métricas"""
-        if not self.system_metrics_history or not self.api_metrics_history:
+        latest_system = self.system_metrics_history.latest()
+        latest_api = self.api_metrics_history.latest()
+        if not latest_system or not latest_api:
             return {"error": "Dados insuficientes"}
         
-        latest_system = self.system_metrics_history[-1]
-        latest_api = self.api_metrics_history[-1]
-        
         return {
             "system": asdict(latest_system),
             "api": asdict(latest_api),
             "health": asdict(self.get_health_status()),
+            "latency": self.get_latency_summary(),
             "history_count": {
                 "system": len(self.system_metrics_history),
                 "api": len(self.api_metrics_history),
@@ -103,15 +103,12 @@ async def test_rate_limiting(request: Request):
         from app.middleware.rate_limiting import rate_limiter
         
         client_id = rate_limiter.get_client_identifier(request)
-        is_limited, limit_info = rate_limiter.is_rate_limited(client_id)
-        
-        if not is_limited:
-            rate_limiter.record_request(client_id)
+        result = await rate_limiter.check_and_record(client_id)
         
         return {
             "client_id": client_id[:20] + "...",  # Apenas parte do ID por privacidade
-            "is_rate_limited": is_limited,
-            "limit_info": limit_info,
+            "is_rate_limited": not result["allowed"],
+            "limit_info": result,
             "cache_size": len(rate_limiter.request_cache),
             "limits": {
                 "per_minute": rate_limiter.per_minute_limit,
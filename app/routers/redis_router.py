@@ -18,7 +18,7 @@ router = APIRouter(prefix="/api/redis", tags=["Redis Cache"])
 async def redis_health():
     """Health check do serviço Redis"""
     try:
-        health_info = redis_service.health_check()
+        health_info = await redis_service.health_check()
         return {
             "service": "Redis Cache",
             "timestamp": datetime.now().isoformat(),
@@ -32,7 +32,7 @@ async def redis_health():
 async def redis_stats():
     """Estatísticas detalhadas do Redis (requer autenticação admin)"""
     try:
-        stats = redis_service.get_stats()
+        stats = await redis_service.get_stats()
         return {
             "service": "Muzaia Redis Cache",
             "timestamp": datetime.now().isoformat(),
@@ -46,7 +46,7 @@ async def redis_stats():
 async def set_cache(key: str, value: str, ttl: int = 3600, prefix: str = "admin"):
     """Define valor no cache (requer autenticação admin)"""
     try:
-        success = redis_service.set(key, value, ttl, prefix)
+        success = await redis_service.set(key, value, ttl, prefix)
         if success:
             return {
                 "success": True,
@@ -64,7 +64,7 @@ async def set_cache(key: str, value: str, ttl: int = 3600, prefix: str = "admin"
 async def get_cache(key: str, prefix: str = "admin"):
     """Obtém valor do cache"""
     try:
-        value = redis_service.get(key, prefix)
+        value = await redis_service.get(key, prefix)
         if value is not None:
             return {
                 "found": True,
@@ -85,7 +85,7 @@ async def get_cache(key: str, prefix: str = "admin"):
 async def delete_cache(key: str, prefix: str = "admin"):
     """Remove chave do cache (requer autenticação admin)"""
     try:
-        success = redis_service.delete(key, prefix)
+        success = await redis_service.delete(key, prefix)
         return {
             "success": success,
             "key": f"{prefix}:{key}",
@@ -99,7 +99,7 @@ async def delete_cache(key: str, prefix: str = "admin"):
 async def clear_cache(prefix: str = "muzaia"):
     """Limpa todas as chaves com determinado prefixo (requer autenticação admin)"""
     try:
-        deleted_count = redis_service.clear_prefix(prefix)
+        deleted_count = await redis_service.clear_prefix(prefix)
         return {
             "success": True,
             "prefix": prefix,
@@ -114,7 +114,7 @@ async def clear_cache(prefix: str = "muzaia"):
 async def cache_exists(key: str, prefix: str = "admin"):
     """Verifica se chave existe no cache"""
     try:
-        exists = redis_service.exists(key, prefix)
+        exists = await redis_service.exists(key, prefix)
         return {
             "exists": exists,
             "key": f"{prefix}:{key}"
@@ -128,7 +128,7 @@ async def cache_exists(key: str, prefix: str = "admin"):
 async def get_cached_documents():
     """Obtém documentos legais do cache"""
     try:
-        documents = redis_service.get("legal_documents", "muzaia")
+        documents = await redis_service.get("legal_documents", "muzaia")
         if documents:
             return {
                 "cached": True,
@@ -148,7 +148,7 @@ async def get_cached_documents():
 async def cache_legal_documents(documents: list, ttl: int = 7200):
     """Armazena documentos legais no cache (requer autenticação admin)"""
     try:
-        success = redis_service.set("legal_documents", documents, ttl, "muzaia")
+        success = await redis_service.set("legal_documents", documents, ttl, "muzaia")
         if success:
             return {
                 "success": True,
@@ -165,7 +165,7 @@ async def cache_legal_documents(documents: list, ttl: int = 7200):
 async def get_cached_chat_sessions():
     """Obtém sessões de chat do cache"""
     try:
-        sessions = redis_service.get("chat_sessions", "muzaia")
+        sessions = await redis_service.get("chat_sessions", "muzaia")
         if sessions:
             return {
                 "cached": True,
@@ -298,7 +298,8 @@ async def get_system_health(current_user = Depends(require_admin)):
                 "failed_attempts_count": len(security_manager.failed_attempts),
                 "rate_limiting_active": True,
                 "security_middleware_active": True
-            }
+            },
+            "latency": system_monitor.get_latency_summary()
         }
         
         # Log da consulta administrativa
@@ -0,0 +1,177 @@
+"""
+Codec binário para valores em cache
+Cabeçalho de 2 bytes (versão do formato + serializador/compressão) seguido do
+payload. Árvores JSON simples usam msgpack/orjson; outros tipos usam pickle para
+não perder tipos. Payloads acima do limiar são comprimidos (zstd > lz4 > zlib).
+"""
+import json
+import math
+import pickle
+import zlib
+from typing import Any, Callable, Dict, Tuple
+
+from app.core.config import settings
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+# Primeiro byte de todos os valores codificados. Valores antigos (pickle começa
+# por 0x80; JSON/texto por um carácter imprimível) nunca começam por este byte.
+CODEC_VERSION = 0x01
+
+# Serializadores (4 bits altos do segundo byte)
+SERIALIZER_PICKLE = 0
+SERIALIZER_JSON = 1
+SERIALIZER_ORJSON = 2
+SERIALIZER_MSGPACK = 3
+
+# Compressão (4 bits baixos do segundo byte)
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_LZ4 = 3
+
+COMPRESSION_NAMES = {
+    'none': COMPRESSION_NONE,
+    'zlib': COMPRESSION_ZLIB,
+    'zstd': COMPRESSION_ZSTD,
+    'lz4': COMPRESSION_LZ4
+}
+
+
+def _is_plain(value: Any) -> bool:
+    """Árvore JSON pura (dict com chaves str, list, str, int, float finito, bool, None)"""
+    if value is None or type(value) in (str, int, bool):
+        return True
+    if type(value) is float:
+        # orjson grava NaN/infinito como null
+        return math.isfinite(value)
+    if type(value) is list:
+        return all(_is_plain(item) for item in value)
+    if type(value) is dict:
+        return all(type(key) is str and _is_plain(item) for key, item in value.items())
+    return False
+
+
+def _best_compression() -> int:
+    if ZSTD_AVAILABLE:
+        return COMPRESSION_ZSTD
+    if LZ4_AVAILABLE:
+        return COMPRESSION_LZ4
+    return COMPRESSION_ZLIB
+
+
+def _compressor(compression: int) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress
+    if compression == COMPRESSION_LZ4:
+        return lz4.frame.compress, lz4.frame.decompress
+    return (lambda data: zlib.compress(data, 6)), zlib.decompress
+
+
+class CacheCodec:
+    """Serialização compacta e versionada para Redis e para o fallback em memória"""
+
+    def __init__(self, compression: str = 'auto', compression_threshold: int = 1024):
+        if compression == 'auto':
+            self.compression = _best_compression()
+        elif compression not in COMPRESSION_NAMES:
+            raise ValueError(f"Compressão desconhecida: {compression}")
+        else:
+            self.compression = COMPRESSION_NAMES[compression]
+        self.compression_threshold = compression_threshold
+
+    @staticmethod
+    def is_encoded(data: bytes) -> bool:
+        """Distingue valores deste codec de valores gravados no formato antigo"""
+        return len(data) >= 2 and data[0] == CODEC_VERSION
+
+    def encode(self, value: Any) -> bytes:
+        serializer, payload = self._serialize(value)
+
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(payload) >= self.compression_threshold:
+            compressed = _compressor(self.compression)[0](payload)
+            # Só compensa se poupar espaço
+            if len(compressed) < len(payload):
+                compression, payload = self.compression, compressed
+
+        return bytes((CODEC_VERSION, serializer << 4 | compression)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        if not self.is_encoded(data):
+            raise ValueError("Valor não está no formato do codec")
+
+        serializer, compression = data[1] >> 4, data[1] & 0x0F
+        payload = memoryview(data)[2:]
+        if compression != COMPRESSION_NONE:
+            payload = _compressor(compression)[1](bytes(payload))
+
+        if serializer == SERIALIZER_MSGPACK:
+            return msgpack.unpackb(payload, raw=False)
+        if serializer in (SERIALIZER_ORJSON, SERIALIZER_JSON):
+            return orjson.loads(payload) if ORJSON_AVAILABLE else json.loads(bytes(payload))
+        if serializer == SERIALIZER_PICKLE:
+            return pickle.loads(payload)
+        raise ValueError(f"Serializador desconhecido: {serializer}")
+
+    def _serialize(self, value: Any) -> Tuple[int, bytes]:
+        if _is_plain(value):
+            try:
+                if MSGPACK_AVAILABLE:
+                    return SERIALIZER_MSGPACK, msgpack.packb(value, use_bin_type=True)
+                if ORJSON_AVAILABLE:
+                    return SERIALIZER_ORJSON, orjson.dumps(value)
+                return SERIALIZER_JSON, json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+            except (OverflowError, TypeError):
+                # Inteiros fora de 64 bits: usar pickle
+                pass
+        return SERIALIZER_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def describe(self) -> Dict[str, Any]:
+        serializer = 'msgpack' if MSGPACK_AVAILABLE else 'orjson' if ORJSON_AVAILABLE else 'json'
+        compression = {code: name for name, code in COMPRESSION_NAMES.items()}[self.compression]
+        return {
+            'serializer': serializer,
+            'compression': compression,
+            'compression_threshold': self.compression_threshold
+        }
+
+
+def decode_legacy_pickle(data: bytes) -> Any:
+    """
+    Valores antigos do RedisCache: pickle em bytes, ou pickle descodificado como
+    latin-1 e gravado como texto UTF-8 pelo cliente síncrono
+    """
+    try:
+        return pickle.loads(data)
+    except Exception:
+        return pickle.loads(data.decode('utf-8').encode('latin-1'))
+
+
+# Instância global do codec de cache
+cache_codec = CacheCodec(
+    compression=settings.cache_compression,
+    compression_threshold=settings.cache_compression_threshold_bytes
+)
@@ -4,158 +4,295 @@ Implementa caching em múltiplas camadas para optimizar performance
 """
 
 import hashlib
+import heapq
 import json
 import pickle
 import logging
-from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime
 import asyncio
 from app.core.config import settings
+from app.services.redis_pool import RedisUnavailable, SharedRedis, shared_redis
+from app.services.cache_codec import cache_codec, decode_legacy_pickle
 
 logger = logging.getLogger(__name__)
 
+def _prefix_of(key: str) -> str:
+    """Prefixo da chave para estatísticas ("muzaia:legal_query:<hash>" -> "muzaia:legal_query")"""
+    return key.rsplit(':', 1)[0] if ':' in key else 'default'
+
+
+def _estimate_size(value: Any) -> int:
+    """Tamanho aproximado em bytes (tamanho serializado)"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8', 'surrogatepass'))
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
 class InMemoryCache:
-    """Cache em memória para desenvolvimento e fallback"""
+    """
+    Cache LRU em memória para desenvolvimento e fallback.
+    OrderedDict com operações O(1), limite por número de itens e por bytes,
+    expiração preguiçosa no get e varrimento periódico das entradas expiradas.
+    """
     
-    def __init__(self, max_size: int = 1000):
-        self.cache: Dict[str, Dict] = {}
+    def __init__(
+        self,
+        max_size: int = 1000,
+        max_bytes: Optional[int] = None,
+        sweep_interval_seconds: float = 60.0
+    ):
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.max_size = max_size
-        self.access_order: List[str] = []
+        self.max_bytes = max_bytes
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.current_bytes = 0
+        # Heap (expira_em, chave) para o varrimento; entradas obsoletas são ignoradas
+        self._expiry_heap: List[tuple] = []
+        self._last_sweep = time.monotonic()
+        self._lock = threading.RLock()
+        self._prefix_stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0}
+        )
+    
+    def _remove(self, key: str, reason: Optional[str] = None):
+        item = self.cache.pop(key, None)
+        if item is None:
+            return
+        self.current_bytes -= item['size']
+        if reason:
+            self._prefix_stats[_prefix_of(key)][reason] += 1
     
     def _evict_lru(self):
-        """Remove o item menos recentemente usado"""
-        if len(self.cache) >= self.max_size and self.access_order:
-            lru_key = self.access_order.pop(0)
-            if lru_key in self.cache:
-                del self.cache[lru_key]
+        """Remove os itens menos recentemente usados até caber nos limites"""
+        while self.cache and (
+            len(self.cache) > self.max_size or
+            (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+        ):
+            lru_key = next(iter(self.cache))
+            self._remove(lru_key, 'evictions')
     
     def get(self, key: str) -> Optional[Any]:
         """Obtém item do cache"""
-        if key in self.cache:
-            item = self.cache[key]
+        with self._lock:
+            item = self.cache.get(key)
+            if item is None:
+                self._prefix_stats[_prefix_of(key)]['misses'] += 1
+                return None
             
             # Verificar expiração
-            if item['expires_at'] and datetime.now() > item['expires_at']:
-                del self.cache[key]
-                if key in self.access_order:
-                    self.access_order.remove(key)
+            if item['expires_at'] is not None and time.monotonic() >= item['expires_at']:
+                self._remove(key, 'expirations')
+                self._prefix_stats[_prefix_of(key)]['misses'] += 1
                 return None
             
             # Atualizar ordem de acesso
-            if key in self.access_order:
-                self.access_order.remove(key)
-            self.access_order.append(key)
-            
+            self.cache.move_to_end(key)
+            self._prefix_stats[_prefix_of(key)]['hits'] += 1
             return item['data']
-        
-        return None
     
     def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None):
         """Armazena item no cache"""
-        self._evict_lru()
+        size = _estimate_size(value)
+        now = time.monotonic()
+        expires_at = now + ttl_seconds if ttl_seconds else None
         
-        expires_at = None
-        if ttl_seconds:
-            expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
-        
-        self.cache[key] = {
-            'data': value,
-            'created_at': datetime.now(),
-            'expires_at': expires_at
-        }
-        
-        if key in self.access_order:
-            self.access_order.remove(key)
-        self.access_order.append(key)
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                logger.debug(f"Item demasiado grande para o cache em memória: {key} ({size} bytes)")
+                return
+            
+            self.cache[key] = {
+                'data': value,
+                'created_at': datetime.now(),
+                'expires_at': expires_at,
+                'size': size
+            }
+            self.current_bytes += size
+            self._prefix_stats[_prefix_of(key)]['sets'] += 1
+            if expires_at is not None:
+                heapq.heappush(self._expiry_heap, (expires_at, key))
+            
+            self._evict_lru()
+            
+            if now - self._last_sweep >= self.sweep_interval_seconds:
+                self.sweep_expired()
+    
+    def sweep_expired(self) -> int:
+        """Remove as entradas expiradas (custo proporcional às expiradas); devolve quantas"""
+        removed = 0
+        with self._lock:
+            now = time.monotonic()
+            self._last_sweep = now
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, key = heapq.heappop(self._expiry_heap)
+                item = self.cache.get(key)
+                # Ignorar entradas já removidas ou regravadas com outro TTL
+                if item is not None and item['expires_at'] == expires_at:
+                    self._remove(key, 'expirations')
+                    removed += 1
+            # Heap com demasiadas entradas obsoletas: reconstruir
+            if len(self._expiry_heap) > 2 * len(self.cache) + 64:
+                self._expiry_heap = [
+                    (item['expires_at'], key) for key, item in self.cache.items()
+                    if item['expires_at'] is not None
+                ]
+                heapq.heapify(self._expiry_heap)
+        return removed
     
     def delete(self, key: str):
         """Remove item do cache"""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.access_order:
-            self.access_order.remove(key)
+        with self._lock:
+            self._remove(key)
+    
+    def delete_prefix(self, prefix: str) -> int:
+        """Remove todas as chaves que começam pelo prefixo"""
+        with self._lock:
+            keys = [key for key in self.cache if key.startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
     
     def clear(self):
         """Limpa todo o cache"""
-        self.cache.clear()
-        self.access_order.clear()
+        with self._lock:
+            self.cache.clear()
+            self._expiry_heap.clear()
+            self.current_bytes = 0
     
     def stats(self) -> Dict[str, Any]:
         """Estatísticas do cache"""
+        with self._lock:
+            prefixes = {prefix: dict(counters) for prefix, counters in self._prefix_stats.items()}
+        
+        totals = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+        for counters in prefixes.values():
+            for name in totals:
+                totals[name] += counters[name]
+            lookups = counters['hits'] + counters['misses']
+            counters['hit_ratio'] = round(counters['hits'] / lookups * 100, 2) if lookups else 0.0
+        lookups = totals['hits'] + totals['misses']
+        
         return {
             'size': len(self.cache),
             'max_size': self.max_size,
-            'hit_ratio': 0.0,  # Simplificado para demo
-            'memory_usage': sum(len(str(item)) for item in self.cache.values())
+            'memory_usage': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            **totals,
+            'hit_ratio': round(totals['hits'] / lookups * 100, 2) if lookups else 0.0,
+            'prefixes': prefixes
         }
 
 class RedisCache:
-    """Cache Redis para produção"""
-    
-    def __init__(self):
-        self.redis = None
-        self._initialize_redis()
+    """
+    Cache Redis para produção (redis.asyncio sobre o pool partilhado).
+    Falhas e timeouts devolvem miss: o CacheService continua com a memória.
+    """
     
-    def _initialize_redis(self):
-        """Inicializa conexão Redis se disponível"""
-        if settings.redis_url:
-            try:
-                import redis
-                self.redis = redis.from_url(settings.redis_url, decode_responses=True)
-                # Testar conexão
-                self.redis.ping()
-                logger.info("✓ Redis conectado com sucesso")
-            except Exception as e:
-                logger.warning(f"Falha ao conectar Redis: {e}")
-                self.redis = None
+    def __init__(self, redis: Optional[SharedRedis] = None):
+        self.redis = redis or shared_redis
     
-    async def get(self, key: str) -> Optional[Any]:
-        """Obtém item do Redis"""
-        if not self.redis:
-            return None
+    async def get_many_with_ttl(self, keys: List[str]) -> List[Tuple[Optional[Any], Optional[float]]]:
+        """(valor, TTL restante em segundos) por chave, numa única ida ao Redis"""
+        async def operation(client):
+            async with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.get(key)
+                    pipe.pttl(key)
+                return await pipe.execute()
         
         try:
-            data = self.redis.get(key)
-            if data:
-                return pickle.loads(data.encode('latin-1'))
+            replies = await self.redis.execute(operation)
+        except RedisUnavailable:
+            return [(None, None)] * len(keys)
         except Exception as e:
             logger.error(f"Erro ao obter do Redis: {e}")
+            return [(None, None)] * len(keys)
         
-        return None
+        results = []
+        for data, pttl in zip(replies[::2], replies[1::2]):
+            value = None
+            if data is not None:
+                try:
+                    if cache_codec.is_encoded(data):
+                        value = cache_codec.decode(data)
+                    else:
+                        value = decode_legacy_pickle(data)
+                except Exception as e:
+                    logger.error(f"Valor Redis inválido: {e}")
+            results.append((value, pttl / 1000 if value is not None and pttl and pttl > 0 else None))
+        return results
     
-    async def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None):
-        """Armazena item no Redis"""
-        if not self.redis:
-            return
+    async def get(self, key: str) -> Optional[Any]:
+        """Obtém item do Redis"""
+        return (await self.get_many_with_ttl([key]))[0][0]
+    
+    async def set_many(self, items: Dict[str, Any], ttl_seconds: Optional[int] = None):
+        """Armazena vários itens numa única ida ao Redis"""
+        async def operation(client):
+            async with client.pipeline(transaction=False) as pipe:
+                for key, serialized in payloads.items():
+                    if ttl_seconds:
+                        pipe.setex(key, ttl_seconds, serialized)
+                    else:
+                        pipe.set(key, serialized)
+                return await pipe.execute()
         
         try:
-            serialized = pickle.dumps(value).decode('latin-1')
-            if ttl_seconds:
-                self.redis.setex(key, ttl_seconds, serialized)
-            else:
-                self.redis.set(key, serialized)
+            payloads = {key: cache_codec.encode(value) for key, value in items.items()}
+            await self.redis.execute(operation)
+        except RedisUnavailable:
+            pass
         except Exception as e:
             logger.error(f"Erro ao armazenar no Redis: {e}")
     
+    async def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None):
+        """Armazena item no Redis"""
+        await self.set_many({key: value}, ttl_seconds)
+    
     async def delete(self, key: str):
         """Remove item do Redis"""
-        if not self.redis:
-            return
-        
         try:
-            self.redis.delete(key)
+            await self.redis.execute(lambda client: client.delete(key))
+        except RedisUnavailable:
+            pass
         except Exception as e:
             logger.error(f"Erro ao remover do Redis: {e}")
     
+    async def delete_pattern(self, pattern: str) -> int:
+        """Remove as chaves que correspondem ao padrão"""
+        try:
+            return await self.redis.delete_pattern(pattern)
+        except RedisUnavailable:
+            return 0
+        except Exception as e:
+            logger.error(f"Erro ao remover padrão {pattern} do Redis: {e}")
+            return 0
+    
     def is_available(self) -> bool:
-        """Verifica se Redis está disponível"""
-        return self.redis is not None
+        """Verifica se Redis está disponível (sem chamadas de rede)"""
+        return self.redis.is_available()
 
 class CacheService:
     """Serviço de cache principal com múltiplas camadas"""
     
     def __init__(self):
-        self.memory_cache = InMemoryCache()
+        self.memory_cache = InMemoryCache(
+            max_size=settings.memory_cache_max_items,
+            max_bytes=settings.memory_cache_max_mb * 1024 * 1024,
+            sweep_interval_seconds=settings.cache_sweep_interval_seconds
+        )
+        self._sweeper_task: Optional[asyncio.Task] = None
         self.redis_cache = RedisCache()
         self.default_ttl = settings.cache_ttl_seconds
         self.enabled = settings.enable_query_cache
@@ -179,55 +316,62 @@ class CacheService:
         return f"muzaia:{prefix}:{hash_value}"
     
     async def get(self, prefix: str, key_data: Any) -> Optional[Any]:
-        """Obtém item do cache (tenta Redis primeiro, depois memória)"""
+        """Obtém item do cache (memória primeiro, depois Redis)"""
+        return (await self.get_many(prefix, [key_data]))[0]
+    
+    async def get_many(self, prefix: str, key_data_list: List[Any]) -> List[Optional[Any]]:
+        """Obtém vários itens; os que faltam em memória vêm do Redis numa única ida"""
         if not self.enabled:
-            return None
+            return [None] * len(key_data_list)
         
-        cache_key = self._get_cache_key(prefix, key_data)
+        cache_keys = [self._get_cache_key(prefix, key_data) for key_data in key_data_list]
+        results: List[Optional[Any]] = [None] * len(cache_keys)
         
         try:
-            # Tentar Redis primeiro
-            if self.redis_cache.is_available():
-                result = await self.redis_cache.get(cache_key)
-                if result is not None:
-                    self.stats['hits'] += 1
-                    logger.debug(f"Cache hit (Redis): {cache_key}")
-                    return result
+            missing = []
+            for i, cache_key in enumerate(cache_keys):
+                results[i] = self.memory_cache.get(cache_key)
+                if results[i] is None:
+                    missing.append(i)
             
-            # Tentar cache em memória
-            result = self.memory_cache.get(cache_key)
-            if result is not None:
-                self.stats['hits'] += 1
-                logger.debug(f"Cache hit (Memory): {cache_key}")
-                return result
+            if missing and self.redis_cache.is_available():
+                remote = await self.redis_cache.get_many_with_ttl([cache_keys[i] for i in missing])
+                for i, (value, ttl) in zip(missing, remote):
+                    if value is not None:
+                        # Promover para a memória com o TTL restante no Redis
+                        self.memory_cache.set(cache_keys[i], value, ttl or self.default_ttl)
+                        results[i] = value
             
-            self.stats['misses'] += 1
-            logger.debug(f"Cache miss: {cache_key}")
-            return None
+            hits = sum(1 for result in results if result is not None)
+            self.stats['hits'] += hits
+            self.stats['misses'] += len(results) - hits
+            return results
             
         except Exception as e:
             self.stats['errors'] += 1
             logger.error(f"Erro no cache get: {e}")
-            return None
+            return [None] * len(cache_keys)
     
     async def set(self, prefix: str, key_data: Any, value: Any, ttl_seconds: Optional[int] = None):
-        """Armazena item no cache (Redis e memória)"""
+        """Armazena item no cache (memória e Redis)"""
+        await self.set_many(prefix, [(key_data, value)], ttl_seconds)
+    
+    async def set_many(self, prefix: str, items: List[Tuple[Any, Any]], ttl_seconds: Optional[int] = None):
+        """Armazena vários pares (key_data, valor) com uma única ida ao Redis"""
         if not self.enabled:
             return
         
-        cache_key = self._get_cache_key(prefix, key_data)
         ttl = ttl_seconds or self.default_ttl
         
         try:
-            # Armazenar no Redis
-            if self.redis_cache.is_available():
-                await self.redis_cache.set(cache_key, value, ttl)
+            entries = {self._get_cache_key(prefix, key_data): value for key_data, value in items}
+            for cache_key, value in entries.items():
+                self.memory_cache.set(cache_key, value, ttl)
             
-            # Armazenar na memória
-            self.memory_cache.set(cache_key, value, ttl)
+            if self.redis_cache.is_available():
+                await self.redis_cache.set_many(entries, ttl)
             
-            self.stats['sets'] += 1
-            logger.debug(f"Cache set: {cache_key}")
+            self.stats['sets'] += len(entries)
             
         except Exception as e:
             self.stats['errors'] += 1
@@ -238,20 +382,46 @@ class CacheService:
         cache_key = self._get_cache_key(prefix, key_data)
         
         try:
+            self.memory_cache.delete(cache_key)
             if self.redis_cache.is_available():
                 await self.redis_cache.delete(cache_key)
-            
-            self.memory_cache.delete(cache_key)
             logger.debug(f"Cache delete: {cache_key}")
             
         except Exception as e:
             logger.error(f"Erro no cache delete: {e}")
     
-    async def clear_prefix(self, prefix: str):
+    async def clear_prefix(self, prefix: str) -> int:
         """Limpa todas as entradas com um prefixo específico"""
-        # Para implementação completa, seria necessário scan no Redis
-        # Por agora, implementação simplificada
-        logger.info(f"Cache clear prefix: {prefix}")
+        key_prefix = f"muzaia:{prefix}:"
+        removed = self.memory_cache.delete_prefix(key_prefix)
+        if self.redis_cache.is_available():
+            removed += await self.redis_cache.delete_pattern(f"{key_prefix}*")
+        logger.info(f"Cache clear prefix: {prefix} ({removed} entradas)")
+        return removed
+    
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(self.memory_cache.sweep_interval_seconds)
+            try:
+                removed = self.memory_cache.sweep_expired()
+                if removed:
+                    logger.debug(f"Cache sweep: {removed} entradas expiradas removidas")
+            except Exception as e:
+                logger.error(f"Erro no varrimento do cache: {e}")
+    
+    def start_sweeper(self):
+        """Inicia o varrimento periódico (chamar dentro do event loop, ex.: no startup)"""
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._sweeper())
+    
+    async def stop_sweeper(self):
+        if self._sweeper_task:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
     
     def get_stats(self) -> Dict[str, Any]:
         """Obtém estatísticas do cache"""
@@ -264,6 +434,8 @@ class CacheService:
             **self.stats,
             'hit_ratio': round(hit_ratio * 100, 2),
             'redis_available': self.redis_cache.is_available(),
+            'redis_last_error': self.redis_cache.redis.last_error,
+            'codec': cache_codec.describe(),
             'memory_cache_stats': self.memory_cache.stats(),
             'enabled': self.enabled
         }
@@ -0,0 +1,143 @@
+"""
+Cliente Redis assíncrono partilhado (redis.asyncio) para o CacheService e o RedisService
+Um único pool de ligações configurado a partir de settings.redis_url. Cada operação
+tem um timeout curto; após uma falha de ligação o Redis é ignorado durante um
+intervalo e os serviços respondem a partir do cache em memória.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class RedisUnavailable(Exception):
+    """Redis não configurado, em pausa após falha, ou operação falhou/expirou"""
+
+
+class SharedRedis:
+    """Pool redis.asyncio partilhado com timeout por operação e pausa após falhas"""
+
+    def __init__(
+        self,
+        url: Optional[str],
+        operation_timeout: float = 0.1,
+        retry_interval: float = 30.0,
+        max_connections: int = 50
+    ):
+        self.url = url
+        self.operation_timeout = operation_timeout
+        self.retry_interval = retry_interval
+        self.max_connections = max_connections
+        self._client = None
+        self._down_until = 0.0
+        self.last_error: Optional[str] = None
+
+        if url and not REDIS_AVAILABLE:
+            logger.warning("Pacote redis não instalado; cache Redis desactivado")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url) and REDIS_AVAILABLE
+
+    def is_available(self) -> bool:
+        """Configurado e fora do período de pausa (não faz chamadas de rede)"""
+        return self.configured and time.monotonic() >= self._down_until
+
+    def _get_client(self):
+        if self._client is None:
+            # Ligações binárias: cada serviço serializa/deserializa os seus valores
+            self._client = aioredis.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                socket_timeout=self.operation_timeout,
+                socket_connect_timeout=self.operation_timeout,
+                decode_responses=False
+            )
+        return self._client
+
+    def connection_info(self) -> Dict[str, Any]:
+        """Host, porta e base de dados do pool (sem credenciais)"""
+        if not self.configured:
+            return {}
+        kwargs = self._get_client().connection_pool.connection_kwargs
+        return {key: kwargs.get(key) for key in ('host', 'port', 'db')}
+
+    async def execute(
+        self,
+        operation: Callable[[Any], Awaitable[T]],
+        probe: bool = False
+    ) -> T:
+        """
+        Executa operation(cliente) com timeout. Falhas de ligação e timeouts põem o
+        Redis em pausa durante retry_interval e levantam RedisUnavailable.
+        probe=True ignora a pausa (ex.: health check).
+        """
+        if not self.configured or (not probe and not self.is_available()):
+            raise RedisUnavailable("Redis indisponível")
+
+        try:
+            result = await asyncio.wait_for(operation(self._get_client()), self.operation_timeout)
+        except (asyncio.TimeoutError, RedisConnectionError, RedisTimeoutError, OSError) as e:
+            self._mark_down(e)
+            raise RedisUnavailable(str(e) or type(e).__name__) from e
+
+        if self._down_until:
+            logger.info("✓ Redis disponível novamente")
+            self._down_until = 0.0
+            self.last_error = None
+        return result
+
+    async def scan_keys(self, pattern: str, batch_size: int = 500) -> AsyncIterator[List[bytes]]:
+        """Lotes de chaves do padrão via SCAN (sem bloquear o Redis como KEYS)"""
+        cursor = 0
+        while True:
+            cursor, keys = await self.execute(
+                lambda client: client.scan(cursor=cursor, match=pattern, count=batch_size)
+            )
+            if keys:
+                yield keys
+            if not cursor:
+                return
+
+    async def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """Remove as chaves do padrão com SCAN + UNLINK em lotes"""
+        deleted = 0
+        async for keys in self.scan_keys(pattern, batch_size):
+            deleted += await self.execute(lambda client: client.unlink(*keys))
+        return deleted
+
+    def _mark_down(self, error: Exception):
+        if time.monotonic() >= self._down_until:
+            logger.warning(
+                f"Redis falhou ({type(error).__name__}: {error}); "
+                f"a usar cache em memória durante {self.retry_interval:.0f}s"
+            )
+        self._down_until = time.monotonic() + self.retry_interval
+        self.last_error = str(error) or type(error).__name__
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Instância global do cliente Redis partilhado
+shared_redis = SharedRedis(
+    url=settings.redis_url,
+    operation_timeout=settings.redis_operation_timeout_ms / 1000,
+    retry_interval=settings.redis_retry_interval_seconds,
+    max_connections=settings.redis_max_connections
+)
@@ -1,59 +1,43 @@
 import json
-import redis
+import time
+import asyncio
+import functools
+import inspect
 import logging
-from typing import Any, Optional, Dict, List
-from datetime import datetime, timedelta
+import threading
+from typing import Any, Callable, Optional, Dict, List, NamedTuple
 import pickle
 import hashlib
 
+from app.core.config import settings
+from .cache_service import InMemoryCache
+from .redis_pool import RedisUnavailable, SharedRedis, shared_redis
+from .cache_codec import cache_codec
+
 logger = logging.getLogger(__name__)
 
 class RedisService:
     """
     Serviço Redis para cache avançado e gestão de sessões do Muzaia.
-    Suporta cache hierárquico, TTL configurável e fallback automático.
+    Usa o pool redis.asyncio partilhado (settings.redis_url), com TTL configurável
+    e fallback automático para memória quando o Redis falha ou demora.
     """
     
-    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: Optional[str] = None):
-        self.host = host
-        self.port = port
-        self.db = db
-        self.password = password
-        self.client = None
-        self.fallback_cache = {}  # Cache em memória como fallback
-        self.is_connected = False
-        
-        self._connect()
+    def __init__(self, redis: Optional[SharedRedis] = None):
+        self.redis = redis or shared_redis
+        # Cache em memória como fallback (valores já serializados)
+        self.fallback_cache = InMemoryCache(max_size=settings.memory_cache_max_items)
     
-    def _connect(self):
-        """Conecta ao Redis com fallback automático"""
-        try:
-            self.client = redis.Redis(
-                host=self.host,
-                port=self.port,
-                db=self.db,
-                password=self.password,
-                decode_responses=True,
-                socket_timeout=5,
-                socket_connect_timeout=5,
-                retry_on_timeout=True
-            )
-            
-            # Testar conexão
-            self.client.ping()
-            self.is_connected = True
-            logger.info(f"✅ Redis conectado: {self.host}:{self.port}")
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Redis não disponível: {e}. Usando cache em memória.")
-            self.client = None
-            self.is_connected = False
+    @property
+    def is_connected(self) -> bool:
+        """Redis configurado e sem falhas recentes (não faz chamadas de rede)"""
+        return self.redis.is_available()
     
     def _generate_key(self, key: str, prefix: str = "muzaia") -> str:
         """Gera chave Redis com prefixo padronizado"""
         return f"{prefix}:{key}"
     
-    def set(self, key: str, value: Any, ttl: int = 3600, prefix: str = "muzaia") -> bool:
+    async def set(self, key: str, value: Any, ttl: int = 3600, prefix: str = "muzaia") -> bool:
         """
         Define valor no cache com TTL
         
@@ -69,27 +53,18 @@ class RedisService:
         cache_key = self._generate_key(key, prefix)
         
         try:
-            # Serializar valor
-            if isinstance(value, (dict, list)):
-                serialized_value = json.dumps(value, default=str, ensure_ascii=False)
-            elif isinstance(value, (int, float, str, bool)):
-                serialized_value = str(value)
-            else:
-                # Para objectos complexos, usar pickle
-                serialized_value = pickle.dumps(value).hex()
-                cache_key += ":pickle"
+            # Serializar valor (codec binário versionado)
+            serialized_value = cache_codec.encode(value)
             
-            if self.is_connected and self.client:
-                result = self.client.setex(cache_key, ttl, serialized_value)
+            try:
+                result = await self.redis.execute(
+                    lambda client: client.setex(cache_key, ttl, serialized_value)
+                )
                 logger.debug(f"Cache Redis SET: {cache_key} (TTL: {ttl}s)")
-                return result
-            else:
+                return bool(result)
+            except RedisUnavailable:
                 # Fallback para cache em memória
-                expiry = datetime.now() + timedelta(seconds=ttl)
-                self.fallback_cache[cache_key] = {
-                    'value': serialized_value,
-                    'expires': expiry
-                }
+                self.fallback_cache.set(cache_key, serialized_value, ttl)
                 logger.debug(f"Cache Memory SET: {cache_key}")
                 return True
                 
@@ -97,7 +72,7 @@ class RedisService:
             logger.error(f"Erro ao definir cache {cache_key}: {e}")
             return False
     
-    def get(self, key: str, prefix: str = "muzaia") -> Optional[Any]:
+    async def get(self, key: str, prefix: str = "muzaia") -> Optional[Any]:
         """
         Obtém valor do cache
         
@@ -109,213 +84,310 @@ class RedisService:
             Valor deserializado ou None se não encontrado/expirado
         """
         cache_key = self._generate_key(key, prefix)
+        pickle_key = cache_key + ":pickle"
         
         try:
-            value = None
-            
-            if self.is_connected and self.client:
-                value = self.client.get(cache_key)
-                if value:
-                    logger.debug(f"Cache Redis HIT: {cache_key}")
-                else:
-                    # Tentar chave pickle
-                    pickle_key = cache_key + ":pickle"
-                    pickle_value = self.client.get(pickle_key)
-                    if pickle_value:
-                        try:
-                            return pickle.loads(bytes.fromhex(pickle_value))
-                        except Exception:
-                            pass
-                    logger.debug(f"Cache Redis MISS: {cache_key}")
-            else:
+            try:
+                # Chave do valor e chave ":pickle" do formato antigo numa única ida ao Redis
+                value, pickle_value = await self.redis.execute(
+                    lambda client: client.mget(cache_key, pickle_key)
+                )
+                logger.debug(f"Cache Redis {'HIT' if value or pickle_value else 'MISS'}: {cache_key}")
+            except RedisUnavailable:
                 # Fallback para cache em memória
-                cached_item = self.fallback_cache.get(cache_key)
-                if cached_item and cached_item['expires'] > datetime.now():
-                    value = cached_item['value']
-                    logger.debug(f"Cache Memory HIT: {cache_key}")
-                elif cached_item:
-                    # Remover item expirado
-                    del self.fallback_cache[cache_key]
-                    logger.debug(f"Cache Memory EXPIRED: {cache_key}")
-                else:
-                    logger.debug(f"Cache Memory MISS: {cache_key}")
+                value = self.fallback_cache.get(cache_key)
+                pickle_value = self.fallback_cache.get(pickle_key)
+                logger.debug(f"Cache Memory {'HIT' if value or pickle_value else 'MISS'}: {cache_key}")
             
-            if value is None:
-                return None
+            if value is not None:
+                if cache_codec.is_encoded(value):
+                    return cache_codec.decode(value)
+                # Formato antigo: JSON ou texto simples
+                value = value.decode('utf-8')
+                try:
+                    return json.loads(value)
+                except json.JSONDecodeError:
+                    return value
             
-            # Tentar deserializar
-            try:
-                # Tentar JSON primeiro
-                return json.loads(value)
-            except (json.JSONDecodeError, TypeError):
-                # Retornar como string se não for JSON
-                return value
+            if pickle_value:
+                # Formato antigo: pickle em hexadecimal na chave ":pickle"
+                return pickle.loads(bytes.fromhex(pickle_value.decode('ascii')))
+            return None
                 
         except Exception as e:
             logger.error(f"Erro ao obter cache {cache_key}: {e}")
             return None
     
-    def delete(self, key: str, prefix: str = "muzaia") -> bool:
+    async def delete(self, key: str, prefix: str = "muzaia") -> bool:
         """Remove chave do cache"""
         cache_key = self._generate_key(key, prefix)
+        keys = [cache_key, cache_key + ":pickle"]
         
         try:
-            if self.is_connected and self.client:
-                result = self.client.delete(cache_key, cache_key + ":pickle")
+            in_memory = any(self.fallback_cache.get(k) is not None for k in keys)
+            for k in keys:
+                self.fallback_cache.delete(k)
+            
+            try:
+                result = await self.redis.execute(lambda client: client.delete(*keys))
                 logger.debug(f"Cache Redis DELETE: {cache_key}")
-                return result > 0
-            else:
-                # Fallback para cache em memória
-                if cache_key in self.fallback_cache:
-                    del self.fallback_cache[cache_key]
-                    logger.debug(f"Cache Memory DELETE: {cache_key}")
-                    return True
-                return False
+                return result > 0 or in_memory
+            except RedisUnavailable:
+                logger.debug(f"Cache Memory DELETE: {cache_key}")
+                return in_memory
                 
         except Exception as e:
             logger.error(f"Erro ao deletar cache {cache_key}: {e}")
             return False
     
-    def exists(self, key: str, prefix: str = "muzaia") -> bool:
+    async def exists(self, key: str, prefix: str = "muzaia") -> bool:
         """Verifica se chave existe no cache"""
         cache_key = self._generate_key(key, prefix)
+        keys = [cache_key, cache_key + ":pickle"]
         
         try:
-            if self.is_connected and self.client:
-                return self.client.exists(cache_key) > 0
-            else:
-                cached_item = self.fallback_cache.get(cache_key)
-                return cached_item is not None and cached_item['expires'] > datetime.now()
+            try:
+                return await self.redis.execute(lambda client: client.exists(*keys)) > 0
+            except RedisUnavailable:
+                return any(self.fallback_cache.get(k) is not None for k in keys)
                 
         except Exception as e:
             logger.error(f"Erro ao verificar cache {cache_key}: {e}")
             return False
     
-    def clear_prefix(self, prefix: str = "muzaia") -> int:
+    async def clear_prefix(self, prefix: str = "muzaia") -> int:
         """Remove todas as chaves com determinado prefixo"""
         try:
-            if self.is_connected and self.client:
-                pattern = f"{prefix}:*"
-                keys = self.client.keys(pattern)
-                if keys:
-                    deleted = self.client.delete(*keys)
-                    logger.info(f"Cache Redis CLEAR: {deleted} chaves removidas com prefixo '{prefix}'")
-                    return deleted
-                return 0
-            else:
-                # Fallback para cache em memória
-                keys_to_delete = [k for k in self.fallback_cache.keys() if k.startswith(f"{prefix}:")]
-                for key in keys_to_delete:
-                    del self.fallback_cache[key]
-                logger.info(f"Cache Memory CLEAR: {len(keys_to_delete)} chaves removidas")
-                return len(keys_to_delete)
+            deleted = self.fallback_cache.delete_prefix(f"{prefix}:")
+            try:
+                deleted += await self.redis.delete_pattern(f"{prefix}:*")
+                logger.info(f"Cache Redis CLEAR: {deleted} chaves removidas com prefixo '{prefix}'")
+            except RedisUnavailable:
+                logger.info(f"Cache Memory CLEAR: {deleted} chaves removidas")
+            return deleted
                 
         except Exception as e:
             logger.error(f"Erro ao limpar cache com prefixo {prefix}: {e}")
             return 0
     
-    def get_stats(self) -> Dict[str, Any]:
+    async def get_stats(self) -> Dict[str, Any]:
         """Obtém estatísticas do cache"""
         stats = {
             "connected": self.is_connected,
-            "host": self.host,
-            "port": self.port,
-            "db": self.db
+            **self.redis.connection_info()
         }
         
         try:
-            if self.is_connected and self.client:
-                info = self.client.info()
-                stats.update({
-                    "redis_version": info.get("redis_version"),
-                    "used_memory": info.get("used_memory_human"),
-                    "connected_clients": info.get("connected_clients"),
-                    "total_commands_processed": info.get("total_commands_processed"),
-                    "keyspace_hits": info.get("keyspace_hits", 0),
-                    "keyspace_misses": info.get("keyspace_misses", 0)
-                })
-                
-                # Calcular hit ratio
-                hits = stats.get("keyspace_hits", 0)
-                misses = stats.get("keyspace_misses", 0)
-                total = hits + misses
-                stats["hit_ratio"] = round((hits / total * 100) if total > 0 else 0, 2)
-            else:
-                stats.update({
-                    "fallback_cache_size": len(self.fallback_cache),
-                    "fallback_mode": True
-                })
-                
+            info = await self.redis.execute(lambda client: client.info())
+            stats.update({
+                "redis_version": info.get("redis_version"),
+                "used_memory": info.get("used_memory_human"),
+                "connected_clients": info.get("connected_clients"),
+                "total_commands_processed": info.get("total_commands_processed"),
+                "keyspace_hits": info.get("keyspace_hits", 0),
+                "keyspace_misses": info.get("keyspace_misses", 0)
+            })
+            
+            # Calcular hit ratio
+            hits = stats.get("keyspace_hits", 0)
+            misses = stats.get("keyspace_misses", 0)
+            total = hits + misses
+            stats["hit_ratio"] = round((hits / total * 100) if total > 0 else 0, 2)
+        except RedisUnavailable:
+            stats.update({
+                "fallback_cache_size": len(self.fallback_cache.cache),
+                "fallback_mode": True,
+                "last_error": self.redis.last_error
+            })
         except Exception as e:
             logger.error(f"Erro ao obter estatísticas Redis: {e}")
             stats["error"] = str(e)
         
         return stats
     
-    def health_check(self) -> Dict[str, Any]:
-        """Verifica saúde da conexão Redis"""
+    async def health_check(self) -> Dict[str, Any]:
+        """Verifica saúde da conexão Redis (ignora a pausa após falhas)"""
+        if not self.redis.configured:
+            return {
+                "status": "fallback",
+                "connected": False,
+                "message": "Usando cache em memória",
+                "fallback_cache_size": len(self.fallback_cache.cache)
+            }
+        
         try:
-            if self.client:
-                start_time = datetime.now()
-                self.client.ping()
-                response_time = (datetime.now() - start_time).total_seconds() * 1000
-                
-                return {
-                    "status": "healthy",
-                    "connected": True,
-                    "response_time_ms": round(response_time, 2),
-                    "host": self.host,
-                    "port": self.port
-                }
-            else:
-                return {
-                    "status": "fallback",
-                    "connected": False,
-                    "message": "Usando cache em memória",
-                    "fallback_cache_size": len(self.fallback_cache)
-                }
+            start_time = time.perf_counter()
+            await self.redis.execute(lambda client: client.ping(), probe=True)
+            response_time = (time.perf_counter() - start_time) * 1000
+            
+            return {
+                "status": "healthy",
+                "connected": True,
+                "response_time_ms": round(response_time, 2),
+                **self.redis.connection_info()
+            }
                 
         except Exception as e:
             return {
                 "status": "error",
                 "connected": False,
                 "error": str(e),
-                "fallback_cache_size": len(self.fallback_cache)
+                "fallback_cache_size": len(self.fallback_cache.cache)
             }
 
 
+class CachedEntry(NamedTuple):
+    """Valor guardado pelo decorador: fresh_until (epoch) separa fresco de obsoleto"""
+    value: Any
+    fresh_until: float
+
+
+def default_key_builder(func: Callable, args: tuple, kwargs: dict) -> str:
+    """
+    Chave a partir dos argumentos normalizados pela assinatura (f(1, b=2) == f(1, 2)),
+    ignorando self/cls para que métodos de instância partilhem o cache
+    """
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = [
+            (name, value) for name, value in bound.arguments.items()
+            if name not in ('self', 'cls')
+        ]
+    except TypeError:
+        arguments = [('args', args), ('kwargs', sorted(kwargs.items()))]
+    args_hash = hashlib.md5(repr(arguments).encode()).hexdigest()
+    return f"{func.__module__}.{func.__qualname__}:{args_hash}"
+
+
+# Tier em memória das funções síncronas (não podem esperar pelo cliente assíncrono)
+_sync_cache = InMemoryCache(max_size=settings.memory_cache_max_items)
+
+
 # Cache decorador para automatizar cache de funções
-def cached(ttl: int = 3600, prefix: str = "func"):
+def cached(
+    ttl: int = 3600,
+    prefix: str = "func",
+    key_builder: Callable[[Callable, tuple, dict], str] = default_key_builder,
+    stale_ttl: int = 0
+):
     """
-    Decorador para cache automático de funções
+    Decorador para cache automático de funções (síncronas ou assíncronas)
     
     Args:
-        ttl: Time to live em segundos
+        ttl: Segundos em que o valor é fresco
         prefix: Prefixo para as chaves de cache
+        key_builder: key_builder(func, args, kwargs) -> chave
+        stale_ttl: Segundos adicionais em que o valor obsoleto é servido enquanto
+            é recalculado em segundo plano (stale-while-revalidate)
+    
+    Funções assíncronas usam o redis_service do módulo (Redis com fallback em
+    memória); funções síncronas usam um tier em memória do processo. Misses
+    concorrentes da mesma chave executam a função uma única vez.
     """
     def decorator(func):
-        def wrapper(*args, **kwargs):
-            # Gerar chave única baseada na função e argumentos
-            func_name = f"{func.__module__}.{func.__name__}"
-            args_hash = hashlib.md5(str((args, kwargs)).encode()).hexdigest()[:8]
-            cache_key = f"{func_name}:{args_hash}"
+        func_name = f"{func.__module__}.{func.__qualname__}"
+        
+        def make_entry(result) -> CachedEntry:
+            return CachedEntry(result, time.time() + ttl)
+        
+        if inspect.iscoroutinefunction(func):
+            inflight: Dict[str, asyncio.Task] = {}
             
-            # Tentar obter do cache
-            redis_service = RedisService()
-            cached_result = redis_service.get(cache_key, prefix)
+            async def compute(cache_key, args, kwargs):
+                try:
+                    result = await func(*args, **kwargs)
+                    await redis_service.set(cache_key, make_entry(result), ttl + stale_ttl, prefix)
+                    logger.debug(f"Cache SET para função {func_name}")
+                    return result
+                finally:
+                    inflight.pop(cache_key, None)
             
-            if cached_result is not None:
-                logger.debug(f"Cache HIT para função {func_name}")
-                return cached_result
+            def log_failure(task: asyncio.Task):
+                # Também marca a excepção como obtida nas revalidações sem chamador
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(f"Erro ao calcular cache de {func_name}: {task.exception()}")
+            
+            def start(cache_key, args, kwargs) -> asyncio.Task:
+                task = inflight.get(cache_key)
+                if task is None:
+                    task = asyncio.create_task(compute(cache_key, args, kwargs))
+                    task.add_done_callback(log_failure)
+                    inflight[cache_key] = task
+                return task
             
-            # Executar função e armazenar resultado
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_key = key_builder(func, args, kwargs)
+                entry = await redis_service.get(cache_key, prefix)
+                
+                if isinstance(entry, CachedEntry):
+                    if entry.fresh_until <= time.time():
+                        # Obsoleto: servir já e revalidar em segundo plano
+                        start(cache_key, args, kwargs)
+                    logger.debug(f"Cache HIT para função {func_name}")
+                    return entry.value
+                
+                # shield: o cancelamento de um chamador não cancela os restantes
+                return await asyncio.shield(start(cache_key, args, kwargs))
+            
+            return async_wrapper
+        
+        locks: Dict[str, threading.Lock] = {}
+        locks_guard = threading.Lock()
+        
+        def key_lock(cache_key) -> threading.Lock:
+            with locks_guard:
+                return locks.setdefault(cache_key, threading.Lock())
+        
+        def forget_lock(cache_key, lock):
+            with locks_guard:
+                if locks.get(cache_key) is lock:
+                    del locks[cache_key]
+        
+        def compute_sync(cache_key, args, kwargs):
             result = func(*args, **kwargs)
-            redis_service.set(cache_key, result, ttl, prefix)
+            _sync_cache.set(f"{prefix}:{cache_key}", make_entry(result), ttl + stale_ttl)
             logger.debug(f"Cache SET para função {func_name}")
-            
             return result
         
-        return wrapper
+        def revalidate(cache_key, lock, args, kwargs):
+            try:
+                compute_sync(cache_key, args, kwargs)
+            except Exception as e:
+                logger.error(f"Erro ao revalidar cache de {func_name}: {e}")
+            finally:
+                forget_lock(cache_key, lock)
+                lock.release()
+        
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            cache_key = key_builder(func, args, kwargs)
+            entry = _sync_cache.get(f"{prefix}:{cache_key}")
+            
+            if entry is not None:
+                # Lock só para entradas expiradas: hits frescos não criam entradas em locks
+                if entry.fresh_until <= time.time():
+                    lock = key_lock(cache_key)
+                    if lock.acquire(blocking=False):
+                        threading.Thread(
+                            target=revalidate, args=(cache_key, lock, args, kwargs), daemon=True
+                        ).start()
+                logger.debug(f"Cache HIT para função {func_name}")
+                return entry.value
+            
+            lock = key_lock(cache_key)
+            with lock:
+                # Outra thread pode ter calculado o valor enquanto esperávamos
+                entry = _sync_cache.get(f"{prefix}:{cache_key}")
+                if entry is not None:
+                    return entry.value
+                try:
+                    return compute_sync(cache_key, args, kwargs)
+                finally:
+                    forget_lock(cache_key, lock)
+        
+        return sync_wrapper
     return decorator
 
 
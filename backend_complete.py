@@ -17,8 +17,9 @@ from pathlib import Path
 try:
     import logging.config
     from app.core.config import settings, LOGGING_CONFIG
-    from app.middleware.rate_limiting import rate_limit_middleware, legal_chat_rate_limit, admin_rate_limit
+    from app.middleware.rate_limiting import RateLimitMiddleware, legal_chat_rate_limit, admin_rate_limit
     from app.services.cache_service import cache_service, cached
+    from app.services.redis_pool import shared_redis
     
     IMPROVEMENTS_AVAILABLE = True
     logging.config.dictConfig(LOGGING_CONFIG)
@@ -34,12 +35,15 @@ except ImportError as e:
 # FastAPI imports
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, ValidationError
 
 # Database imports
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg import AsyncConnection
+from psycopg.rows import tuple_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import PoolTimeout
 import sqlalchemy
 from sqlalchemy import create_engine, text
 
@@ -51,6 +55,7 @@ import re
 import unicodedata
 from pathlib import Path
 import chardet
+from models.legal_terms import COMPLEXITY_AREA_TERMS, legal_term_matcher
 
 # Document processing imports
 try:
@@ -85,7 +90,7 @@ except ImportError as e:
 # Import LLM Orchestra after logger setup
 try:
     from llm_orchestra import (
-        LLMOrchestrator, ClaudeProvider, GeminiProvider, 
+        LLMOrchestrator, HedgingPolicy, ClaudeProvider, GeminiProvider, 
         LLMProvider, MozambiqueLegalOptimizer
     )
     LLM_ORCHESTRA_AVAILABLE = True
@@ -108,7 +113,15 @@ else:
 orchestrator = None
 if LLM_ORCHESTRA_AVAILABLE:
     try:
-        orchestrator = LLMOrchestrator()
+        orchestrator = LLMOrchestrator(
+            health_probe_interval=float(os.getenv('LLM_HEALTH_PROBE_INTERVAL', 60)),
+            time_budget=float(os.getenv('LLM_TIME_BUDGET', 45)),
+            hedging=HedgingPolicy(
+                enabled=os.getenv('LLM_HEDGING_ENABLED', 'false').lower() == 'true',
+                percentile=float(os.getenv('LLM_HEDGE_PERCENTILE', 90)),
+                max_hedge_ratio=float(os.getenv('LLM_HEDGE_MAX_RATIO', 0.1))
+            )
+        )
         
         # Add Gemini provider
         if GEMINI_API_KEY:
@@ -142,6 +155,31 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required")
 
+# Pool de conexões partilhado pelo processo (aberto no startup)
+from services.db_pool import DatabasePool, db_pool, get_db, get_db_pool
+from services.fulltext_migration import (
+    apply_schema as apply_fulltext_schema, run_fulltext_migration, tsv_match_sql, tsv_rank_sql
+)
+from services.embedding_service import embedding_service
+from services.pdf_extractor import pdf_extractor
+from services.ingestion_jobs import IngestionJobManager
+from services.bulk_writer import copy_rows
+from services.answer_cache import answer_cache
+
+# Pesquisa full-text: usar o vector ponderado (título + chunk) em vez do só chunk
+RAG_WEIGHTED_SEARCH = os.getenv('RAG_WEIGHTED_SEARCH', 'false').lower() == 'true'
+FULLTEXT_BACKFILL_BATCH_SIZE = int(os.getenv('FULLTEXT_BACKFILL_BATCH_SIZE', 1000))
+fulltext_migration_task: Optional[asyncio.Task] = None
+
+# Ingestão em segundo plano (fila Redis se REDIS_URL estiver acessível)
+ingestion_jobs = IngestionJobManager(
+    db_pool,
+    DocumentIngestor(db_pool),
+    workers=int(os.getenv('INGESTION_WORKERS', 2)),
+    max_attempts=int(os.getenv('INGESTION_MAX_ATTEMPTS', 3)),
+    redis_url=os.getenv('REDIS_URL')
+) if LEGAL_SYSTEM_AVAILABLE else None
+
 # Initialize FastAPI
 app = FastAPI(
     title="Muzaia Legal Assistant API",
@@ -151,10 +189,6 @@ app = FastAPI(
 
 # Configurar middleware de melhorias se disponível
 if IMPROVEMENTS_AVAILABLE:
-    @app.middleware("http")
-    async def add_improvements_middleware(request, call_next):
-        return await rate_limit_middleware(request, call_next)
-    
     # Adicionar router de melhorias
     try:
         from app.routers.improvements import router as improvements_router
@@ -163,7 +197,9 @@ if IMPROVEMENTS_AVAILABLE:
     except ImportError as e:
         logger.warning(f"Router de melhorias não disponível: {e}")
     
-    # Adicionar middleware de segurança
+    # Cadeia de middlewares ASGI: logging -> segurança -> rate limiting -> rotas
+    # (add_middleware coloca cada um à volta dos anteriores)
+    app.add_middleware(RateLimitMiddleware)
     try:
         from app.middleware.security_middleware import SecurityMiddleware, RequestLoggingMiddleware
         app.add_middleware(SecurityMiddleware)
@@ -201,16 +237,6 @@ if IMPROVEMENTS_AVAILABLE:
             logger.info("✓ Router de autenticação complexo adicionado")
         except ImportError as e2:
             logger.warning(f"Nenhum router de autenticação disponível: {e2}")
-    
-    # Iniciar monitorização do sistema
-    try:
-        from app.monitoring.system_monitor import system_monitor
-        import asyncio
-        loop = asyncio.get_event_loop()
-        loop.create_task(system_monitor.start_monitoring(interval=300))  # 5 minutos
-        logger.info("✓ Monitorização do sistema iniciada")
-    except Exception as e:
-        logger.warning(f"Monitorização do sistema não disponível: {e}")
 
 # CORS configuration
 app.add_middleware(
@@ -253,21 +279,19 @@ class HealthResponse(BaseModel):
     services: Dict[str, str]
 
 # Database connection
-def get_db_connection():
-    """Get database connection"""
-    try:
-        return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-    except Exception as e:
-        logger.error(f"Database connection failed: {e}")
-        raise HTTPException(status_code=500, detail="Database connection failed")
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc: PoolTimeout):
+    """Pool esgotado: responder 503 em vez de bloquear o pedido"""
+    logger.error(f"Database pool timeout: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Base de dados temporariamente ocupada"})
 
 # Initialize database tables
-def init_database():
+async def init_database():
     """Initialize database tables"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
+    async with db_pool.connection() as conn:
+        async with conn.cursor() as cur:
             # Legal documents table - updated for advanced system
-            cur.execute("""
+            await cur.execute("""
                 CREATE TABLE IF NOT EXISTS legal_documents (
                     id SERIAL PRIMARY KEY,
                     title VARCHAR(500) NOT NULL,
@@ -286,7 +310,7 @@ def init_database():
             """)
 
             # Add new columns if they don't exist
-            cur.execute("""
+            await cur.execute("""
                 ALTER TABLE legal_documents 
                 ADD COLUMN IF NOT EXISTS document_type INTEGER DEFAULT 2,
                 ADD COLUMN IF NOT EXISTS legal_area INTEGER DEFAULT 2,
@@ -296,13 +320,13 @@ def init_database():
             """)
             
             # Ensure description column exists
-            cur.execute("""
+            await cur.execute("""
                 ALTER TABLE legal_documents 
                 ADD COLUMN IF NOT EXISTS description TEXT;
             """)
             
             # Document chunks table for RAG - updated for advanced system
-            cur.execute("""
+            await cur.execute("""
                 CREATE TABLE IF NOT EXISTS document_chunks (
                     id SERIAL PRIMARY KEY,
                     document_id INTEGER REFERENCES legal_documents(id) ON DELETE CASCADE,
@@ -316,20 +340,20 @@ def init_database():
             """)
 
             # Add content column if it doesn't exist
-            cur.execute("""
+            await cur.execute("""
                 ALTER TABLE document_chunks 
                 ADD COLUMN IF NOT EXISTS content TEXT;
             """)
 
             # Update content from chunk_text if content is null
-            cur.execute("""
+            await cur.execute("""
                 UPDATE document_chunks 
                 SET content = chunk_text 
                 WHERE content IS NULL;
             """)
             
             # Chat sessions table
-            cur.execute("""
+            await cur.execute("""
                 CREATE TABLE IF NOT EXISTS chat_sessions (
                     id VARCHAR(100) PRIMARY KEY,
                     user_id VARCHAR(100),
@@ -339,7 +363,7 @@ def init_database():
             """)
             
             # Chat messages table
-            cur.execute("""
+            await cur.execute("""
                 CREATE TABLE IF NOT EXISTS chat_messages (
                     id SERIAL PRIMARY KEY,
                     session_id VARCHAR(100) REFERENCES chat_sessions(id) ON DELETE CASCADE,
@@ -351,11 +375,10 @@ def init_database():
             """)
             
             # Create indexes for better performance
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON document_chunks(document_id);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_text ON document_chunks USING gin(to_tsvector('portuguese', chunk_text));")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON chat_messages(session_id);")
+            await cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON document_chunks(document_id);")
+            await cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON chat_messages(session_id);")
             
-            conn.commit()
+            await conn.commit()
             logger.info("✓ Database tables initialized")
 
 # Text processing utilities
@@ -450,19 +473,11 @@ class DocumentProcessor:
     
     @staticmethod
     def extract_text_from_pdf(file_content: bytes) -> str:
-        """Extract text from PDF"""
+        """Extract text from PDF (page ranges extracted in parallel worker processes)"""
         if not PyPDF2:
             raise ValueError("PyPDF2 not available for PDF processing")
         
-        import io
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        
-        return text
+        return pdf_extractor.extract_text(file_content, separator="\n")
     
     @staticmethod
     def extract_text_from_docx(file_content: bytes) -> str:
@@ -490,25 +505,20 @@ class DocumentProcessor:
 class ComplexityService:
     """Analyze legal text complexity"""
     
-    LEGAL_TERMS = {
-        'direito_civil': ['obrigação', 'contrato', 'propriedade', 'posse', 'usufructo'],
-        'direito_penal': ['crime', 'pena', 'sanção', 'culpabilidade', 'dolo'],
-        'direito_trabalho': ['contrato de trabalho', 'salário', 'despedimento', 'sindicato'],
-        'direito_comercial': ['sociedade', 'empresa', 'comerciante', 'firma', 'registo'],
-        'direito_administrativo': ['acto administrativo', 'funcionário público', 'serviço público']
-    }
+    LEGAL_TERMS = COMPLEXITY_AREA_TERMS
     
     @staticmethod
     def analyze_complexity(text: str) -> Dict[str, Any]:
         """Analyze text complexity"""
-        text_lower = text.lower()
+        # Uma única passagem pelo texto para todas as categorias
+        matches = legal_term_matcher.match(text, prefix='complexidade.')
         
         # Count legal terms
         legal_term_count = 0
         found_categories = []
         
-        for category, terms in ComplexityService.LEGAL_TERMS.items():
-            category_count = sum(1 for term in terms if term in text_lower)
+        for category in ComplexityService.LEGAL_TERMS:
+            category_count = len(matches.get(f'complexidade.{category}', []))
             if category_count > 0:
                 legal_term_count += category_count
                 found_categories.append(category)
@@ -569,29 +579,40 @@ class RAGService:
     """Retrieval-Augmented Generation service"""
     
     @staticmethod
-    def search_relevant_documents(query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    async def search_relevant_documents(
+        pool: DatabasePool,
+        query: str,
+        limit: int = 5,
+        weighted: bool = RAG_WEIGHTED_SEARCH
+    ) -> List[Dict[str, Any]]:
         """Search for relevant document chunks"""
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Use PostgreSQL full-text search
-                search_query = """
+        # Coluna tsvector materializada (ver services/fulltext_migration.py)
+        tsv_column = "dc.tsv_weighted" if weighted else "dc.tsv"
+        
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Use PostgreSQL full-text search; a tsquery é calculada uma única vez
+                search_query = f"""
                     SELECT 
+                        dc.id as chunk_id,
+                        dc.document_id,
                         dc.chunk_text,
                         dc.section_type,
                         dc.metadata,
                         ld.title,
                         ld.law_type,
                         ld.source,
-                        ts_rank(to_tsvector('portuguese', dc.chunk_text), plainto_tsquery('portuguese', %s)) as relevance
+                        {tsv_rank_sql(tsv_column)} as relevance
                     FROM document_chunks dc
                     JOIN legal_documents ld ON dc.document_id = ld.id
-                    WHERE to_tsvector('portuguese', dc.chunk_text) @@ plainto_tsquery('portuguese', %s)
+                    CROSS JOIN plainto_tsquery('portuguese', %s) q
+                    WHERE {tsv_match_sql(tsv_column)}
                     ORDER BY relevance DESC
                     LIMIT %s;
                 """
                 
-                cur.execute(search_query, (query, query, limit))
-                results = cur.fetchall()
+                await cur.execute(search_query, (query, limit))
+                results = await cur.fetchall()
                 
                 citations = []
                 for row in results:
@@ -601,7 +622,9 @@ class RAGService:
                         "law_type": row['law_type'],
                         "section_type": row['section_type'],
                         "relevance": float(row['relevance']),
-                        "full_source": row['source']
+                        "full_source": row['source'],
+                        "chunk_id": row['chunk_id'],
+                        "document_id": row['document_id']
                     })
                 
                 return citations
@@ -665,7 +688,7 @@ async def health_check():
     )
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatMessage):
+async def chat_endpoint(request: ChatMessage, pool: DatabasePool = Depends(get_db_pool)):
     """Main chat endpoint with LLM Orchestra and RAG"""
     try:
         # Create or get session
@@ -673,24 +696,24 @@ async def chat_endpoint(request: ChatMessage):
         session_id = request.session_id or str(uuid.uuid4())
         
         # Search for relevant documents
-        citations = RAGService.search_relevant_documents(request.message)
+        citations = await RAGService.search_relevant_documents(pool, request.message)
         context = "\n\n".join([citation.get('text', '') for citation in citations])
         
         # Use LLM Orchestrator if available, fallback to direct Gemini
         if orchestrator and LLM_ORCHESTRA_AVAILABLE:
             logger.info("Usando orquestrador de LLMs para resposta")
             
-            # Get response from LLM orchestra with fallback
-            llm_response = await orchestrator.get_legal_response(
-                query=request.message,
-                retrieved_context=context
-            )
+            # Get response from LLM orchestra with fallback (or the answer cache)
+            llm_response = await get_orchestrated_response(request.message, citations, context)
             
             ai_response = llm_response["response"]
             provider_used = llm_response["provider"]
             response_time = llm_response.get("response_time", 0)
             
-            logger.info(f"Resposta gerada por {provider_used} em {response_time:.2f}s")
+            if llm_response.get("cached"):
+                logger.info(f"Resposta servida do cache (gerada por {provider_used})")
+            else:
+                logger.info(f"Resposta gerada por {provider_used} em {response_time:.2f}s")
             
         else:
             # Fallback to direct Gemini
@@ -702,32 +725,10 @@ async def chat_endpoint(request: ChatMessage):
         complexity = ComplexityService.analyze_complexity(request.message)
         
         # Store message in database
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Ensure session exists
-                cur.execute("""
-                    INSERT INTO chat_sessions (id, user_id) VALUES (%s, %s) 
-                    ON CONFLICT (id) DO NOTHING
-                """, (session_id, 'anonymous'))
-                
-                # Store user message
-                cur.execute("""
-                    INSERT INTO chat_messages (session_id, role, content, metadata)
-                    VALUES (%s, %s, %s, %s)
-                """, (session_id, 'user', request.message, json.dumps(complexity)))
-                
-                # Store AI response with provider info
-                response_metadata = {
-                    "citations": len(citations),
-                    "provider": provider_used,
-                    "orchestra_used": bool(orchestrator and LLM_ORCHESTRA_AVAILABLE)
-                }
-                cur.execute("""
-                    INSERT INTO chat_messages (session_id, role, content, metadata)
-                    VALUES (%s, %s, %s, %s)
-                """, (session_id, 'assistant', ai_response, json.dumps(response_metadata)))
-                
-                conn.commit()
+        await store_chat_exchange(
+            pool, session_id, request.message, complexity,
+            ai_response, len(citations), provider_used
+        )
         
         return ChatResponse(
             response=ai_response,
@@ -740,6 +741,149 @@ async def chat_endpoint(request: ChatMessage):
         logger.error(f"Chat endpoint error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_orchestrated_response(
+    query: str,
+    citations: List[Dict[str, Any]],
+    context: str
+) -> Dict[str, Any]:
+    """
+    LLM orchestra answer, served from the answer cache when the same question was
+    already answered over the same retrieved chunks. Only successful answers are cached.
+    """
+    chunk_ids = [citation["chunk_id"] for citation in citations]
+    cached_response = await answer_cache.get(query, chunk_ids)
+    if cached_response is not None:
+        return {**cached_response, "response_time": 0.0, "cached": True}
+    
+    llm_response = await orchestrator.get_legal_response(
+        query=query,
+        retrieved_context=context
+    )
+    if llm_response["success"]:
+        await answer_cache.set(
+            query, chunk_ids,
+            [citation["document_id"] for citation in citations],
+            llm_response
+        )
+    return llm_response
+
+async def store_chat_exchange(
+    pool: DatabasePool,
+    session_id: str,
+    message: str,
+    complexity: Dict[str, Any],
+    ai_response: str,
+    citations_count: int,
+    provider_used: str
+):
+    """Persist the user message and the assistant answer"""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            # Ensure session exists
+            await cur.execute("""
+                INSERT INTO chat_sessions (id, user_id) VALUES (%s, %s) 
+                ON CONFLICT (id) DO NOTHING
+            """, (session_id, 'anonymous'))
+            
+            # Store user message
+            await cur.execute("""
+                INSERT INTO chat_messages (session_id, role, content, metadata)
+                VALUES (%s, %s, %s, %s)
+            """, (session_id, 'user', message, json.dumps(complexity)))
+            
+            # Store AI response with provider info
+            response_metadata = {
+                "citations": citations_count,
+                "provider": provider_used,
+                "orchestra_used": bool(orchestrator and LLM_ORCHESTRA_AVAILABLE)
+            }
+            await cur.execute("""
+                INSERT INTO chat_messages (session_id, role, content, metadata)
+                VALUES (%s, %s, %s, %s)
+            """, (session_id, 'assistant', ai_response, json.dumps(response_metadata)))
+            
+            await conn.commit()
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatMessage, pool: DatabasePool = Depends(get_db_pool)):
+    """
+    Streaming chat (Server-Sent Events): citations first, then LLM tokens as they
+    arrive, then a final event with complexity and session id.
+    The exchange is persisted after the stream closes.
+    """
+    import uuid
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    try:
+        citations = await RAGService.search_relevant_documents(pool, request.message)
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    context = "\n\n".join([citation.get('text', '') for citation in citations])
+    complexity = ComplexityService.analyze_complexity(request.message)
+    # Filled by the generator, read by the background task once the stream is closed
+    outcome: Dict[str, Any] = {}
+    
+    async def event_stream():
+        yield sse_event("citations", citations)
+        
+        chunk_ids = [citation["chunk_id"] for citation in citations]
+        cached_response = None
+        if orchestrator and LLM_ORCHESTRA_AVAILABLE:
+            cached_response = await answer_cache.get(request.message, chunk_ids)
+        
+        if cached_response is not None:
+            outcome.update(cached_response)
+            yield sse_event("token", {"text": cached_response["response"]})
+        elif orchestrator and LLM_ORCHESTRA_AVAILABLE:
+            async for event in orchestrator.stream_legal_response(request.message, context):
+                if event["type"] == "token":
+                    yield sse_event("token", {"text": event["text"]})
+                else:
+                    outcome.update(event)
+            if outcome.get("success"):
+                await answer_cache.set(
+                    request.message, chunk_ids,
+                    [citation["document_id"] for citation in citations],
+                    {key: outcome[key] for key in ("response", "provider", "response_time", "success")}
+                )
+        else:
+            ai_response = await GeminiService.generate_response(request.message, citations)
+            outcome.update(response=ai_response, provider="gemini_direct", success=True)
+            yield sse_event("token", {"text": ai_response})
+        
+        yield sse_event("done", {
+            "session_id": session_id,
+            "complexity": complexity,
+            "provider": outcome.get("provider"),
+            "success": outcome.get("success", False)
+        })
+        outcome["completed"] = True
+    
+    async def persist_exchange():
+        # Streams interrupted by the client are not stored
+        if not outcome.get("completed"):
+            return
+        try:
+            await store_chat_exchange(
+                pool, session_id, request.message, complexity,
+                outcome["response"], len(citations), outcome["provider"]
+            )
+        except Exception as e:
+            logger.error(f"Chat stream persistence error: {e}")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist_exchange)
+    )
+
 @app.post("/api/complexity", response_model=ComplexityResponse)
 async def analyze_complexity_endpoint(request: ComplexityRequest):
     """Analyze text complexity"""
@@ -766,7 +910,8 @@ async def get_orchestra_status():
             "available": True,
             "status": status,
             "available_providers": orchestrator.get_available_providers(),
-            "fallback_order": [p.value for p in orchestrator.fallback_order]
+            "fallback_order": [p.value for p in orchestrator.fallback_order],
+            "answer_cache": answer_cache.get_stats()
         }
     except Exception as e:
         logger.error(f"Erro ao obter status do orquestrador: {e}")
@@ -810,7 +955,8 @@ async def upload_document(
     title: str = Form(...),
     description: str = Form(...),
     law_type: str = Form(...),
-    source: str = Form(...)
+    source: str = Form(...),
+    pool: DatabasePool = Depends(get_db_pool)
 ):
     """Upload and process legal document"""
     try:
@@ -824,7 +970,7 @@ async def upload_document(
         
         # Extract text based on file type
         if file.content_type == 'application/pdf':
-            text = DocumentProcessor.extract_text_from_pdf(file_content)
+            text = await asyncio.to_thread(DocumentProcessor.extract_text_from_pdf, file_content)
         elif file.content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
             text = DocumentProcessor.extract_text_from_docx(file_content)
         else:  # text/plain
@@ -840,31 +986,29 @@ async def upload_document(
             raise HTTPException(status_code=400, detail="Documento não produziu chunks válidos")
         
         # Store in database
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
                 # Insert document
-                cur.execute("""
+                await cur.execute("""
                     INSERT INTO legal_documents (title, content, law_type, source)
                     VALUES (%s, %s, %s, %s)
                     RETURNING id
                 """, (title, text, law_type, source))
                 
-                document_id = cur.fetchone()['id']
+                document_id = (await cur.fetchone())['id']
                 
-                # Insert chunks
-                for chunk in chunks:
-                    cur.execute("""
-                        INSERT INTO document_chunks (document_id, chunk_text, chunk_index, section_type, metadata)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (
-                        document_id,
-                        chunk['text'],
-                        chunk['index'],
-                        chunk['section_type'],
-                        json.dumps(chunk['metadata'])
-                    ))
+                # Insert chunks with batched COPY
+                await copy_rows(
+                    cur,
+                    'document_chunks',
+                    ('document_id', 'chunk_text', 'chunk_index', 'section_type', 'metadata'),
+                    (
+                        (document_id, chunk['text'], chunk['index'], chunk['section_type'], Jsonb(chunk['metadata']))
+                        for chunk in chunks
+                    )
+                )
                 
-                conn.commit()
+                await conn.commit()
         
         return {
             "message": "Documento carregado com sucesso",
@@ -878,95 +1022,95 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/documents")
-async def list_documents():
+async def list_documents(conn: AsyncConnection = Depends(get_db)):
     """List all uploaded documents"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        ld.id,
-                        ld.title,
-                        ld.law_type,
-                        ld.source,
-                        ld.created_at,
-                        COUNT(dc.id) as chunk_count
-                    FROM legal_documents ld
-                    LEFT JOIN document_chunks dc ON ld.id = dc.document_id
-                    GROUP BY ld.id, ld.title, ld.law_type, ld.source, ld.created_at
-                    ORDER BY ld.created_at DESC
-                """)
-                
-                documents = cur.fetchall()
-                return {"documents": [dict(doc) for doc in documents]}
-                
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                SELECT 
+                    ld.id,
+                    ld.title,
+                    ld.law_type,
+                    ld.source,
+                    ld.created_at,
+                    COUNT(dc.id) as chunk_count
+                FROM legal_documents ld
+                LEFT JOIN document_chunks dc ON ld.id = dc.document_id
+                GROUP BY ld.id, ld.title, ld.law_type, ld.source, ld.created_at
+                ORDER BY ld.created_at DESC
+            """)
+            
+            documents = await cur.fetchall()
+            return {"documents": [dict(doc) for doc in documents]}
+            
     except Exception as e:
         logger.error(f"List documents error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/stats")
-async def get_stats():
+async def get_stats(conn: AsyncConnection = Depends(get_db)):
     """Get system statistics"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Count documents
-                cur.execute("SELECT COUNT(*) as count FROM legal_documents")
-                doc_count = cur.fetchone()['count']
-                
-                # Count chunks
-                cur.execute("SELECT COUNT(*) as count FROM document_chunks")
-                chunk_count = cur.fetchone()['count']
-                
-                # Count chat sessions
-                cur.execute("SELECT COUNT(*) as count FROM chat_sessions")
-                session_count = cur.fetchone()['count']
-                
-                # Count messages
-                cur.execute("SELECT COUNT(*) as count FROM chat_messages")
-                message_count = cur.fetchone()['count']
-                
-                # Get LLM orchestra metrics
-                orchestra_metrics = {}
-                if orchestrator:
-                    orchestra_metrics = orchestrator.metrics.get_performance_summary()
-                
-                return {
-                    "documents": doc_count,
-                    "chunks": chunk_count,
-                    "chat_sessions": session_count,
-                    "messages": message_count,
-                    "ai_status": "configured" if GEMINI_API_KEY else "not_configured",
-                    "llm_orchestra": {
-                        "enabled": bool(orchestrator),
-                        "available_providers": orchestrator.get_available_providers() if orchestrator else [],
-                        "total_requests": orchestra_metrics.get("total_requests", 0),
-                        "success_rate": f"{orchestra_metrics.get('success_rate', 0)}%",
-                        "avg_response_time": f"{orchestra_metrics.get('avg_response_time', 0)}s"
-                    }
-                }
-                
+        async with conn.cursor() as cur:
+            # Count documents
+            await cur.execute("SELECT COUNT(*) as count FROM legal_documents")
+            doc_count = (await cur.fetchone())['count']
+            
+            # Count chunks
+            await cur.execute("SELECT COUNT(*) as count FROM document_chunks")
+            chunk_count = (await cur.fetchone())['count']
+            
+            # Count chat sessions
+            await cur.execute("SELECT COUNT(*) as count FROM chat_sessions")
+            session_count = (await cur.fetchone())['count']
+            
+            # Count messages
+            await cur.execute("SELECT COUNT(*) as count FROM chat_messages")
+            message_count = (await cur.fetchone())['count']
+            
+            # Get LLM orchestra metrics
+            orchestra_metrics = {}
+            if orchestrator:
+                orchestra_metrics = orchestrator.metrics.get_performance_summary()
+            
+            return {
+                "documents": doc_count,
+                "chunks": chunk_count,
+                "chat_sessions": session_count,
+                "messages": message_count,
+                "ai_status": "configured" if GEMINI_API_KEY else "not_configured",
+                "llm_orchestra": {
+                    "enabled": bool(orchestrator),
+                    "available_providers": orchestrator.get_available_providers() if orchestrator else [],
+                    "total_requests": orchestra_metrics.get("total_requests", 0),
+                    "success_rate": f"{orchestra_metrics.get('success_rate', 0)}%",
+                    "avg_response_time": f"{orchestra_metrics.get('avg_response_time', 0)}s"
+                },
+                "database_pool": db_pool.get_stats()
+            }
+            
     except Exception as e:
         logger.error(f"Stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/admin/documents/{document_id}")
-async def delete_document(document_id: int):
+async def delete_document(document_id: int, conn: AsyncConnection = Depends(get_db)):
     """Delete a document and its chunks"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Check if document exists
-                cur.execute("SELECT id FROM legal_documents WHERE id = %s", (document_id,))
-                if not cur.fetchone():
-                    raise HTTPException(status_code=404, detail="Documento não encontrado")
-                
-                # Delete document (chunks will be deleted automatically due to CASCADE)
-                cur.execute("DELETE FROM legal_documents WHERE id = %s", (document_id,))
-                conn.commit()
-                
-                return {"message": "Documento removido com sucesso"}
-                
+        async with conn.cursor() as cur:
+            # Check if document exists
+            await cur.execute("SELECT id FROM legal_documents WHERE id = %s", (document_id,))
+            if not await cur.fetchone():
+                raise HTTPException(status_code=404, detail="Documento não encontrado")
+            
+            # Delete document (chunks and embeddings will be deleted automatically due to CASCADE)
+            await cur.execute("DELETE FROM legal_documents WHERE id = %s", (document_id,))
+            await conn.commit()
+            embedding_service.invalidate()
+            await answer_cache.invalidate_documents([document_id])
+            
+            return {"message": "Documento removido com sucesso"}
+            
     except Exception as e:
         logger.error(f"Delete document error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1002,7 +1146,7 @@ async def upload_document_advanced(
     description: Optional[str] = Form(None),
     source: Optional[str] = Form(None)
 ):
-    """Upload e processamento avançado de documento legal"""
+    """Upload de documento legal; o processamento avançado corre em segundo plano"""
     if not LEGAL_SYSTEM_AVAILABLE:
         raise HTTPException(status_code=503, detail="Sistema legal avançado não disponível")
     
@@ -1026,9 +1170,6 @@ async def upload_document_advanced(
             content = await file.read()
             buffer.write(content)
         
-        # Processar com sistema avançado
-        ingestor = DocumentIngestor(get_db_connection)
-        
         override_metadata = {}
         if document_type:
             override_metadata['document_type'] = document_type
@@ -1039,31 +1180,7 @@ async def upload_document_advanced(
         if source:
             override_metadata['source'] = source
         
-        result = ingestor.process_document(
-            str(temp_file_path),
-            file.filename,
-            override_metadata if override_metadata else None
-        )
-        
-        # Remover arquivo temporário
-        temp_file_path.unlink()
-        
-        if result['success']:
-            return {
-                "message": "Documento processado com sucesso",
-                "document_id": result['document_id'],
-                "title": result['title'],
-                "chunks_created": result['chunks_created'],
-                "metadata": result['metadata'],
-                "processing_info": {
-                    "chunking_method": "legal_structure",
-                    "legal_concepts_extracted": len(result['metadata'].get('keywords', [])),
-                    "document_type": result['metadata'].get('document_type', 'Desconhecido'),
-                    "legal_area": result['metadata'].get('legal_area', 'Desconhecido')
-                }
-            }
-        else:
-            raise HTTPException(status_code=500, detail=f"Erro no processamento: {result['error']}")
+        return await enqueue_ingestion(temp_file_path, file.filename, override_metadata)
     
     except Exception as e:
         logger.error(f"Erro no upload avançado: {e}")
@@ -1071,20 +1188,70 @@ async def upload_document_advanced(
             temp_file_path.unlink()
         raise HTTPException(status_code=500, detail=str(e))
 
+async def enqueue_ingestion(
+    file_path: Path,
+    original_filename: str,
+    override_metadata: Dict[str, Any]
+) -> JSONResponse:
+    """Regista o job de ingestão e responde de imediato com o seu id"""
+    job_id = await ingestion_jobs.submit(str(file_path), original_filename, override_metadata or None)
+    return JSONResponse(status_code=202, content={
+        "message": "Documento recebido, processamento em segundo plano",
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/legal/jobs/{job_id}"
+    })
+
+@app.get("/api/legal/jobs/{job_id}")
+async def get_ingestion_job(job_id: int):
+    """Estado de um job de ingestão: páginas extraídas, chunks escritos e ETA"""
+    if not ingestion_jobs:
+        raise HTTPException(status_code=503, detail="Sistema legal avançado não disponível")
+    
+    job = await ingestion_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.post("/api/legal/jobs/{job_id}/cancel")
+async def cancel_ingestion_job(job_id: int):
+    """Cancela um job de ingestão em fila ou em execução"""
+    if not ingestion_jobs:
+        raise HTTPException(status_code=503, detail="Sistema legal avançado não disponível")
+    
+    job = await ingestion_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.post("/api/legal/jobs/{job_id}/retry")
+async def retry_ingestion_job(job_id: int):
+    """Repete um job de ingestão falhado ou cancelado"""
+    if not ingestion_jobs:
+        raise HTTPException(status_code=503, detail="Sistema legal avançado não disponível")
+    
+    try:
+        job = await ingestion_jobs.retry(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
 @app.post("/api/legal/advanced-search")
-async def advanced_search(request: dict):
+async def advanced_search(request: dict, pool: DatabasePool = Depends(get_db_pool)):
     """Busca avançada com filtros e análise de relevância"""
     try:
         # Importar o serviço RAG avançado
         from services.advanced_rag_service import create_advanced_rag_service
         
-        rag_service = create_advanced_rag_service(get_db_connection)
+        rag_service = create_advanced_rag_service(pool)
         
         query = request.get('query', '')
         filters = request.get('filters', {})
         max_results = request.get('max_results', 10)
         
-        results = rag_service.advanced_search(query, filters, max_results)
+        results = await rag_service.advanced_search(query, filters, max_results)
         
         # Converter results para formato serializável
         documents = []
@@ -1118,94 +1285,93 @@ async def advanced_search(request: dict):
         }
 
 @app.get("/api/legal/analytics")
-async def get_legal_analytics():
+async def get_legal_analytics(conn: AsyncConnection = Depends(get_db)):
     """Retorna análises avançadas da base legal"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Análise por tipo de documento
-                cur.execute("""
-                    SELECT 
-                        COALESCE(metadata->>'document_type', 'Não especificado') as doc_type,
-                        COUNT(*) as count
-                    FROM legal_documents 
-                    GROUP BY metadata->>'document_type'
-                    ORDER BY count DESC
-                """)
-                docs_by_type = dict(cur.fetchall())
-                
-                # Análise por área legal
-                cur.execute("""
-                    SELECT 
-                        COALESCE(metadata->>'legal_area', 'Não especificado') as legal_area,
-                        COUNT(*) as count
-                    FROM legal_documents 
-                    GROUP BY metadata->>'legal_area'
-                    ORDER BY count DESC
-                """)
-                docs_by_area = dict(cur.fetchall())
-                
-                # Distribuição temporal
-                cur.execute("""
-                    SELECT 
-                        EXTRACT(YEAR FROM created_at) as year,
-                        COUNT(*) as count
-                    FROM legal_documents 
-                    WHERE created_at IS NOT NULL
-                    GROUP BY EXTRACT(YEAR FROM created_at)
-                    ORDER BY year DESC
-                    LIMIT 5
-                """)
-                temporal_dist = dict(cur.fetchall())
-                
-                # Análise de complexidade (simulada baseada no tamanho do conteúdo)
-                cur.execute("""
-                    SELECT 
-                        CASE 
-                            WHEN length(content) < 1000 THEN 'Simples'
-                            WHEN length(content) < 5000 THEN 'Moderado'
-                            WHEN length(content) < 15000 THEN 'Complexo'
-                            ELSE 'Muito Complexo'
-                        END as complexity,
-                        COUNT(*) as count
+        async with conn.cursor(row_factory=tuple_row) as cur:
+            # Análise por tipo de documento
+            await cur.execute("""
+                SELECT 
+                    COALESCE(metadata->>'document_type', 'Não especificado') as doc_type,
+                    COUNT(*) as count
+                FROM legal_documents 
+                GROUP BY metadata->>'document_type'
+                ORDER BY count DESC
+            """)
+            docs_by_type = dict(await cur.fetchall())
+            
+            # Análise por área legal
+            await cur.execute("""
+                SELECT 
+                    COALESCE(metadata->>'legal_area', 'Não especificado') as legal_area,
+                    COUNT(*) as count
+                FROM legal_documents 
+                GROUP BY metadata->>'legal_area'
+                ORDER BY count DESC
+            """)
+            docs_by_area = dict(await cur.fetchall())
+            
+            # Distribuição temporal
+            await cur.execute("""
+                SELECT 
+                    EXTRACT(YEAR FROM created_at) as year,
+                    COUNT(*) as count
+                FROM legal_documents 
+                WHERE created_at IS NOT NULL
+                GROUP BY EXTRACT(YEAR FROM created_at)
+                ORDER BY year DESC
+                LIMIT 5
+            """)
+            temporal_dist = dict(await cur.fetchall())
+            
+            # Análise de complexidade (simulada baseada no tamanho do conteúdo)
+            await cur.execute("""
+                SELECT 
+                    CASE 
+                        WHEN length(content) < 1000 THEN 'Simples'
+                        WHEN length(content) < 5000 THEN 'Moderado'
+                        WHEN length(content) < 15000 THEN 'Complexo'
+                        ELSE 'Muito Complexo'
+                    END as complexity,
+                    COUNT(*) as count
+                FROM legal_documents 
+                GROUP BY 
+                    CASE 
+                        WHEN length(content) < 1000 THEN 'Simples'
+                        WHEN length(content) < 5000 THEN 'Moderado'
+                        WHEN length(content) < 15000 THEN 'Complexo'
+                        ELSE 'Muito Complexo'
+                    END
+            """)
+            complexity_analysis = dict(await cur.fetchall())
+            
+            # Tópicos em tendência (baseado em palavras-chave mais comuns)
+            await cur.execute("""
+                WITH words AS (
+                    SELECT unnest(string_to_array(lower(title), ' ')) as word
                     FROM legal_documents 
-                    GROUP BY 
-                        CASE 
-                            WHEN length(content) < 1000 THEN 'Simples'
-                            WHEN length(content) < 5000 THEN 'Moderado'
-                            WHEN length(content) < 15000 THEN 'Complexo'
-                            ELSE 'Muito Complexo'
-                        END
-                """)
-                complexity_analysis = dict(cur.fetchall())
-                
-                # Tópicos em tendência (baseado em palavras-chave mais comuns)
-                cur.execute("""
-                    WITH words AS (
-                        SELECT unnest(string_to_array(lower(title), ' ')) as word
-                        FROM legal_documents 
-                    )
-                    SELECT 
-                        word,
-                        COUNT(*) as frequency
-                    FROM words 
-                    WHERE length(word) > 4
-                    GROUP BY word
-                    ORDER BY frequency DESC
-                    LIMIT 10
-                """)
-                word_freq = cur.fetchall()
-                
-                import random
-                trending_topics = []
-                for word, freq in word_freq:
-                    if word not in ['para', 'sobre', 'como', 'quando', 'onde', 'pela', 'pelo', 'pela', 'esta', 'esse', 'isso', 'muito']:
-                        trending_topics.append({
-                            'name': word.capitalize(),
-                            'mentions': freq,
-                            'trend': random.randint(-20, 30)  # Simulação de tendência
-                        })
-                
+                )
+                SELECT 
+                    word,
+                    COUNT(*) as frequency
+                FROM words 
+                WHERE length(word) > 4
+                GROUP BY word
+                ORDER BY frequency DESC
+                LIMIT 10
+            """)
+            word_freq = await cur.fetchall()
+            
+            import random
+            trending_topics = []
+            for word, freq in word_freq:
+                if word not in ['para', 'sobre', 'como', 'quando', 'onde', 'pela', 'pelo', 'pela', 'esta', 'esse', 'isso', 'muito']:
+                    trending_topics.append({
+                        'name': word.capitalize(),
+                        'mentions': freq,
+                        'trend': random.randint(-20, 30)  # Simulação de tendência
+                    })
+            
         return {
             'documentsByType': docs_by_type,
             'documentsByArea': docs_by_area,
@@ -1229,78 +1395,77 @@ async def get_legal_analytics():
         }
 
 @app.get("/api/legal/documents-advanced")
-async def list_documents_advanced():
+async def list_documents_advanced(conn: AsyncConnection = Depends(get_db)):
     """Listar documentos com informações detalhadas da hierarquia"""
     if not LEGAL_SYSTEM_AVAILABLE:
         raise HTTPException(status_code=503, detail="Sistema legal avançado não disponível")
     
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        ld.id,
-                        ld.title,
-                        ld.metadata->>'document_type' as document_type,
-                        ld.metadata->>'legal_area' as legal_area,
-                        ld.metadata->>'publication_date' as publication_date,
-                        ld.metadata->>'status' as status,
-                        ld.created_at,
-                        COUNT(dc.id) as chunk_count,
-                        ld.metadata->>'keywords' as keywords
-                    FROM legal_documents ld
-                    LEFT JOIN document_chunks dc ON ld.id = dc.document_id
-                    WHERE ld.metadata IS NOT NULL
-                    GROUP BY ld.id, ld.title, ld.metadata, ld.created_at
-                    ORDER BY 
-                        CAST(ld.metadata->>'document_type' AS INTEGER) ASC,
-                        ld.created_at DESC
-                """)
-                
-                documents = []
-                for row in cur.fetchall():
-                    doc_type_id = int(row['document_type']) if row['document_type'] else 2
-                    legal_area_id = int(row['legal_area']) if row['legal_area'] else 2
-                    
-                    documents.append({
-                        'id': row['id'],
-                        'title': row['title'],
-                        'document_type': {
-                            'id': doc_type_id,
-                            'name': LegalDocumentHierarchy.get_type_name(LegalDocumentType(doc_type_id)),
-                            'hierarchy_level': doc_type_id
-                        },
-                        'legal_area': {
-                            'id': legal_area_id,
-                            'name': LegalDocumentHierarchy.get_area_name(LegalArea(legal_area_id))
-                        },
-                        'publication_date': row['publication_date'],
-                        'status': row['status'] or 'active',
-                        'chunk_count': row['chunk_count'],
-                        'keywords': json.loads(row['keywords']) if row['keywords'] else [],
-                        'created_at': row['created_at'].isoformat() if row['created_at'] else None
-                    })
-                
-                return {
-                    "documents": documents,
-                    "total_count": len(documents),
-                    "document_types_summary": {},
-                    "legal_areas_summary": {}
-                }
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                SELECT 
+                    ld.id,
+                    ld.title,
+                    ld.metadata->>'document_type' as document_type,
+                    ld.metadata->>'legal_area' as legal_area,
+                    ld.metadata->>'publication_date' as publication_date,
+                    ld.metadata->>'status' as status,
+                    ld.created_at,
+                    COUNT(dc.id) as chunk_count,
+                    ld.metadata->>'keywords' as keywords
+                FROM legal_documents ld
+                LEFT JOIN document_chunks dc ON ld.id = dc.document_id
+                WHERE ld.metadata IS NOT NULL
+                GROUP BY ld.id, ld.title, ld.metadata, ld.created_at
+                ORDER BY 
+                    CAST(ld.metadata->>'document_type' AS INTEGER) ASC,
+                    ld.created_at DESC
+            """)
+            
+            documents = []
+            for row in await cur.fetchall():
+                doc_type_id = int(row['document_type']) if row['document_type'] else 2
+                legal_area_id = int(row['legal_area']) if row['legal_area'] else 2
                 
+                documents.append({
+                    'id': row['id'],
+                    'title': row['title'],
+                    'document_type': {
+                        'id': doc_type_id,
+                        'name': LegalDocumentHierarchy.get_type_name(LegalDocumentType(doc_type_id)),
+                        'hierarchy_level': doc_type_id
+                    },
+                    'legal_area': {
+                        'id': legal_area_id,
+                        'name': LegalDocumentHierarchy.get_area_name(LegalArea(legal_area_id))
+                    },
+                    'publication_date': row['publication_date'],
+                    'status': row['status'] or 'active',
+                    'chunk_count': row['chunk_count'],
+                    'keywords': json.loads(row['keywords']) if row['keywords'] else [],
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None
+                })
+            
+            return {
+                "documents": documents,
+                "total_count": len(documents),
+                "document_types_summary": {},
+                "legal_areas_summary": {}
+            }
+            
     except Exception as e:
         logger.error(f"Erro ao listar documentos avançados: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/legal/processing-stats")
-async def get_processing_statistics():
+async def get_processing_statistics(pool: DatabasePool = Depends(get_db_pool)):
     """Obter estatísticas detalhadas do processamento de documentos"""
     if not LEGAL_SYSTEM_AVAILABLE:
         raise HTTPException(status_code=503, detail="Sistema legal avançado não disponível")
     
     try:
-        ingestor = DocumentIngestor(get_db_connection)
-        stats = ingestor.get_processing_statistics()
+        ingestor = DocumentIngestor(pool)
+        stats = await ingestor.get_processing_stats()
         
         # Enriquecer estatísticas com nomes legíveis
         if 'documents_by_type' in stats:
@@ -1387,7 +1552,7 @@ async def upload_advanced_document(
     description: Optional[str] = Form(""),
     source: Optional[str] = Form("Sistema Muzaia")
 ):
-    """Upload avançado com processamento hierárquico e chunking inteligente"""
+    """Upload avançado; processamento hierárquico e chunking inteligente em segundo plano"""
     
     if not LEGAL_SYSTEM_AVAILABLE:
         return {
@@ -1414,10 +1579,6 @@ async def upload_advanced_document(
             content = await file.read()
             buffer.write(content)
         
-        # Processar com sistema avançado
-        from services.document_ingestor import DocumentIngestor
-        ingestor = DocumentIngestor(get_db_connection)
-        
         override_metadata = {}
         if document_type:
             override_metadata['document_type'] = document_type
@@ -1428,30 +1589,7 @@ async def upload_advanced_document(
         if source:
             override_metadata['source'] = source
         
-        result = ingestor.process_document(
-            str(temp_file_path),
-            file.filename,
-            override_metadata if override_metadata else None
-        )
-        
-        # Remover arquivo temporário
-        temp_file_path.unlink()
-        
-        if result['success']:
-            return {
-                "message": "Documento processado com sucesso",
-                "document_id": result['document_id'],
-                "title": result['title'],
-                "chunks_created": result['chunks_created'],
-                "metadata": result['metadata'],
-                "processing_info": {
-                    **result['processing_info'],
-                    "chunking_method": "legal_hierarchical",
-                    "system": "advanced"
-                }
-            }
-        else:
-            raise HTTPException(status_code=500, detail=f"Erro no processamento: {result['error']}")
+        return await enqueue_ingestion(temp_file_path, file.filename, override_metadata)
     
     except Exception as e:
         logger.error(f"Erro no upload avançado: {e}")
@@ -1460,53 +1598,52 @@ async def upload_advanced_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/legal/documents-advanced")
-async def get_documents_advanced():
+async def get_documents_advanced(conn: AsyncConnection = Depends(get_db)):
     """Lista documentos com metadados hierárquicos detalhados"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        ld.id,
-                        ld.title,
-                        ld.metadata,
-                        ld.created_at,
-                        ld.content_hash,
-                        COUNT(dc.id) as chunk_count,
-                        AVG(length(dc.content)) as avg_chunk_size
-                    FROM legal_documents ld
-                    LEFT JOIN document_chunks dc ON ld.id = dc.document_id
-                    GROUP BY ld.id, ld.title, ld.metadata, ld.created_at, ld.content_hash
-                    ORDER BY ld.created_at DESC
-                """)
+        async with conn.cursor(row_factory=tuple_row) as cur:
+            await cur.execute("""
+                SELECT 
+                    ld.id,
+                    ld.title,
+                    ld.metadata,
+                    ld.created_at,
+                    ld.content_hash,
+                    COUNT(dc.id) as chunk_count,
+                    AVG(length(dc.content)) as avg_chunk_size
+                FROM legal_documents ld
+                LEFT JOIN document_chunks dc ON ld.id = dc.document_id
+                GROUP BY ld.id, ld.title, ld.metadata, ld.created_at, ld.content_hash
+                ORDER BY ld.created_at DESC
+            """)
+            
+            documents = []
+            for row in await cur.fetchall():
+                doc_id, title, metadata, created_at, content_hash, chunk_count, avg_chunk_size = row
                 
-                documents = []
-                for row in cur.fetchall():
-                    doc_id, title, metadata, created_at, content_hash, chunk_count, avg_chunk_size = row
-                    
-                    # Parse metadata
-                    meta = metadata if metadata else {}
-                    
-                    documents.append({
-                        'id': doc_id,
-                        'title': title,
-                        'document_type': meta.get('document_type', 'Desconhecido'),
-                        'legal_area': meta.get('legal_area', 'Desconhecido'),
-                        'authority_weight': meta.get('authority_weight', 0.5),
-                        'status': meta.get('status', 'active'),
-                        'keywords': meta.get('keywords', []),
-                        'description': meta.get('description', ''),
-                        'source': meta.get('source', 'Sistema Muzaia'),
-                        'chunk_count': chunk_count or 0,
-                        'avg_chunk_size': int(avg_chunk_size) if avg_chunk_size else 0,
-                        'created_at': created_at.isoformat() if created_at else None,
-                        'content_hash': content_hash[:12] + '...' if content_hash else 'N/A'
-                    })
+                # Parse metadata
+                meta = metadata if metadata else {}
                 
-                return {
-                    'documents': documents,
-                    'total_count': len(documents)
-                }
+                documents.append({
+                    'id': doc_id,
+                    'title': title,
+                    'document_type': meta.get('document_type', 'Desconhecido'),
+                    'legal_area': meta.get('legal_area', 'Desconhecido'),
+                    'authority_weight': meta.get('authority_weight', 0.5),
+                    'status': meta.get('status', 'active'),
+                    'keywords': meta.get('keywords', []),
+                    'description': meta.get('description', ''),
+                    'source': meta.get('source', 'Sistema Muzaia'),
+                    'chunk_count': chunk_count or 0,
+                    'avg_chunk_size': int(avg_chunk_size) if avg_chunk_size else 0,
+                    'created_at': created_at.isoformat() if created_at else None,
+                    'content_hash': content_hash[:12] + '...' if content_hash else 'N/A'
+                })
+            
+            return {
+                'documents': documents,
+                'total_count': len(documents)
+            }
     
     except Exception as e:
         logger.error(f"Erro ao listar documentos avançados: {e}")
@@ -1517,22 +1654,22 @@ async def get_documents_advanced():
         }
 
 @app.get("/api/legal/processing-stats")
-async def get_processing_stats():
+async def get_processing_stats(pool: DatabasePool = Depends(get_db_pool)):
     """Estatísticas detalhadas do sistema de processamento"""
     try:
         if LEGAL_SYSTEM_AVAILABLE:
             from services.document_ingestor import DocumentIngestor
-            ingestor = DocumentIngestor(get_db_connection)
-            return ingestor.get_processing_stats()
+            ingestor = DocumentIngestor(pool)
+            return await ingestor.get_processing_stats()
         else:
             # Estatísticas básicas como fallback
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT COUNT(*) FROM legal_documents")
-                    doc_count = cur.fetchone()[0]
+            async with pool.connection() as conn:
+                async with conn.cursor(row_factory=tuple_row) as cur:
+                    await cur.execute("SELECT COUNT(*) FROM legal_documents")
+                    doc_count = (await cur.fetchone())[0]
                     
-                    cur.execute("SELECT COUNT(*) FROM document_chunks")  
-                    chunk_count = cur.fetchone()[0]
+                    await cur.execute("SELECT COUNT(*) FROM document_chunks")  
+                    chunk_count = (await cur.fetchone())[0]
                     
                     return {
                         'general': {
@@ -1553,9 +1690,54 @@ async def get_processing_stats():
 async def startup_event():
     """Initialize the application"""
     logger.info("🚀 Iniciando Muzaia Backend")
-    init_database()
+    await db_pool.open()
+    await init_database()
+    await apply_fulltext_schema(db_pool)
+    await embedding_service.ensure_schema(db_pool)
+    # Backfill em lotes e índices CONCURRENTLY correm em segundo plano
+    global fulltext_migration_task
+    fulltext_migration_task = asyncio.create_task(run_fulltext_migration(
+        db_pool, batch_size=FULLTEXT_BACKFILL_BATCH_SIZE, include_schema=False
+    ))
+    if ingestion_jobs:
+        await ingestion_jobs.start()
+    if orchestrator:
+        orchestrator.start_health_prober()
+    if IMPROVEMENTS_AVAILABLE:
+        cache_service.start_sweeper()
+        # Iniciar monitorização do sistema
+        try:
+            from app.monitoring.system_monitor import system_monitor
+            system_monitor.start_sampler(interval=300)  # 5 minutos, em thread própria
+            logger.info("✓ Monitorização do sistema iniciada")
+        except Exception as e:
+            logger.warning(f"Monitorização do sistema não disponível: {e}")
     logger.info("✓ Sistema pronto para uso")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources"""
+    if fulltext_migration_task and not fulltext_migration_task.done():
+        fulltext_migration_task.cancel()
+        try:
+            await fulltext_migration_task
+        except asyncio.CancelledError:
+            pass
+    if ingestion_jobs:
+        await ingestion_jobs.stop()
+    if orchestrator:
+        await orchestrator.stop_health_prober()
+    if IMPROVEMENTS_AVAILABLE:
+        await cache_service.stop_sweeper()
+        await shared_redis.close()
+        try:
+            from app.monitoring.system_monitor import system_monitor
+            system_monitor.stop_monitoring()
+        except ImportError:
+            pass
+    pdf_extractor.shutdown()
+    await db_pool.close()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv('PORT', 8000))
@@ -2,6 +2,7 @@ import asyncio
 from sqlalchemy.orm import Session
 from models import LegalDocument, DocumentEmbedding
 from utils.text_processing import TextProcessor
+from services.embedding_service import embedding_service, vector_to_bytes
 
 async def initialize_legal_documents(db: Session):
     """
@@ -140,12 +141,16 @@ async def initialize_legal_documents(db: Session):
             # Create text chunks and embeddings (simplified)
             chunks = text_processor.chunk_text(doc_data["content"], chunk_size=300)
             
+            vectors = embedding_service.backend.embed(chunks) if chunks else []
+            
             for i, chunk in enumerate(chunks):
                 embedding = DocumentEmbedding(
                     document_id=document.id,
                     chunk_text=chunk,
                     chunk_index=i,
-                    embedding_vector=[]  # Placeholder for now
+                    embedding_vector=vector_to_bytes(vectors[i]),
+                    embedding_model=embedding_service.model_name,
+                    embedding_dim=embedding_service.backend.dimension
                 )
                 db.add(embedding)
         
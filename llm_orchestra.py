@@ -4,18 +4,24 @@ Integra múltiplos provedores de IA com fallback automático
 """
 
 from enum import Enum
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
 import asyncio
 import time
 import logging
 from datetime import datetime
 import numpy as np
+from app.monitoring.latency_histogram import HistogramRegistry
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FALLBACK_RESPONSE = "Desculpe, todos os serviços de IA estão temporariamente indisponíveis. Por favor, tente novamente em alguns minutos."
+
 class LLMProvider(Enum):
     """Enum dos provedores de LLM disponíveis"""
     OPENAI_GPT4 = "openai_gpt4"
@@ -24,13 +30,32 @@ class LLMProvider(Enum):
     CLAUDE_3_OPUS = "claude_3_opus"
     GEMINI_2_FLASH = "gemini_2_flash"
 
+# Pool dedicado e limitado para chamadas de SDK que só existem em versão bloqueante
+_blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('LLM_BLOCKING_THREADS', 8)),
+    thread_name_prefix="llm-blocking"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Executa uma chamada bloqueante de SDK fora do event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, lambda: func(*args, **kwargs))
+
+class ProviderSaturated(Exception):
+    """Sem vaga no limite de concorrência local do provedor dentro do prazo"""
+
+
 class BaseLLMProvider(ABC):
     """Classe base abstrata para todos os provedores de LLM"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_concurrency: Optional[int] = None):
         self.api_key = api_key
         self.max_retries = 3
         self.timeout = 30
+        # Chamadas em curso por provedor (as restantes esperam pela sua vez)
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', 16))
+        self._limiter = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
         
     @abstractmethod
     async def generate_response(self, prompt: str, context: str = "") -> str:
@@ -46,6 +71,54 @@ class BaseLLMProvider(ABC):
     def get_model_info(self) -> Dict[str, Any]:
         """Retorna informações sobre o modelo"""
         pass
+    
+    async def generate_stream(self, prompt: str, context: str = "") -> AsyncIterator[str]:
+        """
+        Gera a resposta em fragmentos de texto à medida que o provedor os produz.
+        Por omissão (provedores sem streaming) devolve a resposta completa num só fragmento.
+        """
+        yield await self.generate_response(prompt, context)
+    
+    async def acquire(self, timeout: Optional[float] = None):
+        """
+        Reserva uma vaga de concorrência. Levanta ProviderSaturated se não houver
+        vaga dentro de timeout (saturação local, não uma falha do provedor).
+        """
+        try:
+            await asyncio.wait_for(self._limiter.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise ProviderSaturated(
+                f"{self.max_concurrency} chamadas em curso; sem vaga em {timeout:.1f}s"
+            ) from None
+        self._in_flight += 1
+    
+    def release(self):
+        self._in_flight -= 1
+        self._limiter.release()
+    
+    async def stream(self, prompt: str, context: str = "") -> AsyncIterator[str]:
+        """generate_stream limitado pelo número máximo de chamadas concorrentes"""
+        await self.acquire()
+        try:
+            async for text in self.generate_stream(prompt, context):
+                yield text
+        finally:
+            self.release()
+    
+    async def generate(self, prompt: str, context: str = "") -> str:
+        """generate_response limitado pelo número máximo de chamadas concorrentes"""
+        await self.acquire()
+        try:
+            return await self.generate_response(prompt, context)
+        finally:
+            self.release()
+    
+    def get_concurrency_info(self) -> Dict[str, int]:
+        return {"in_flight": self._in_flight, "max_concurrency": self.max_concurrency}
+    
+    async def health_check(self) -> bool:
+        """Sonda barata usada pelo prober de saúde (por omissão, is_available)"""
+        return await run_blocking(self.is_available)
 
 class ClaudeProvider(BaseLLMProvider):
     """Provedor para modelos Claude 3 da Anthropic"""
@@ -57,7 +130,7 @@ class ClaudeProvider(BaseLLMProvider):
         
         try:
             import anthropic
-            self.client = anthropic.Anthropic(api_key=api_key)
+            self.client = anthropic.AsyncAnthropic(api_key=api_key, timeout=self.timeout)
         except ImportError:
             logger.error("Biblioteca anthropic não instalada. Execute: pip install anthropic")
             self.client = None
@@ -71,18 +144,7 @@ class ClaudeProvider(BaseLLMProvider):
             raise Exception("Cliente Claude não inicializado")
             
         try:
-            # Prompt otimizado para contexto legal moçambicano
-            system_prompt = self._build_legal_system_prompt(context)
-            optimized_prompt = MozambiqueLegalOptimizer.optimize_prompt_for_claude(prompt, context)
-            
-            message = self.client.messages.create(
-                model=self.model_version,
-                max_tokens=self.max_tokens,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": optimized_prompt}
-                ]
-            )
+            message = await self.client.messages.create(**self._build_request(prompt, context))
             
             response_text = message.content[0].text
             logger.info(f"Claude resposta gerada: {len(response_text)} caracteres")
@@ -92,6 +154,30 @@ class ClaudeProvider(BaseLLMProvider):
             logger.error(f"Erro na resposta do Claude: {str(e)}")
             raise Exception(f"Erro na resposta do Claude: {str(e)}")
     
+    async def generate_stream(self, prompt: str, context: str = "") -> AsyncIterator[str]:
+        """Gera resposta do Claude em streaming"""
+        if not self.client:
+            raise Exception("Cliente Claude não inicializado")
+        
+        try:
+            async with self.client.messages.stream(**self._build_request(prompt, context)) as stream:
+                async for text in stream.text_stream:
+                    yield text
+        except Exception as e:
+            logger.error(f"Erro no streaming do Claude: {str(e)}")
+            raise Exception(f"Erro no streaming do Claude: {str(e)}")
+    
+    def _build_request(self, prompt: str, context: str) -> Dict[str, Any]:
+        """Parâmetros do pedido (prompt otimizado para contexto legal moçambicano)"""
+        return {
+            "model": self.model_version,
+            "max_tokens": self.max_tokens,
+            "system": self._build_legal_system_prompt(context),
+            "messages": [
+                {"role": "user", "content": MozambiqueLegalOptimizer.optimize_prompt_for_claude(prompt, context)}
+            ]
+        }
+    
     def _build_legal_system_prompt(self, context: str) -> str:
         """Constrói prompt de sistema otimizado para direito moçambicano"""
         return f"""Você é um assistente jurídico especialista em direito moçambicano. 
@@ -109,17 +195,16 @@ Contexto legal: {context}
 IMPORTANTE: As informações fornecidas são apenas educativas e não constituem aconselhamento jurídico formal."""
     
     def is_available(self) -> bool:
-        """Verifica disponibilidade do Claude"""
+        """Cliente configurado (o estado de rede vem do registo de saúde)"""
+        return self.client is not None
+    
+    async def health_check(self) -> bool:
+        """Consulta os metadados do modelo (sem gerar tokens)"""
         if not self.client:
             return False
-            
+        
         try:
-            # Teste simples de conectividade
-            response = self.client.messages.create(
-                model=self.model_version,
-                max_tokens=10,
-                messages=[{"role": "user", "content": "teste"}]
-            )
+            await self.client.models.retrieve(self.model_version)
             return True
         except Exception as e:
             logger.warning(f"Claude indisponível: {e}")
@@ -138,6 +223,9 @@ IMPORTANTE: As informações fornecidas são apenas educativas e não constituem
 class GeminiProvider(BaseLLMProvider):
     """Provedor para Google Gemini (já existente, adaptar interface)"""
     
+    # Fragmentos intermédios não têm finish_reason (None/UNSPECIFIED)
+    NORMAL_FINISH_REASONS = (None, "STOP", "FINISH_REASON_UNSPECIFIED")
+    
     def __init__(self, api_key: str, model_version: str = "gemini-2.0-flash"):
         super().__init__(api_key)
         self.model_version = model_version
@@ -159,30 +247,85 @@ class GeminiProvider(BaseLLMProvider):
             raise Exception("Cliente Gemini não inicializado")
             
         try:
-            system_prompt = f"""Você é um assistente jurídico especializado em legislação moçambicana.
+            response = await self.model.generate_content_async(
+                self._build_prompt(prompt, context),
+                request_options={"timeout": self.timeout}
+            )
+            return response.text
+            
+        except Exception as e:
+            logger.error(f"Erro na resposta do Gemini: {str(e)}")
+            raise Exception(f"Erro na resposta do Gemini: {str(e)}")
+    
+    async def generate_stream(self, prompt: str, context: str = "") -> AsyncIterator[str]:
+        """Gera resposta do Gemini em streaming"""
+        if not self.model:
+            raise Exception("Cliente Gemini não inicializado")
+        
+        try:
+            response = await self.model.generate_content_async(
+                self._build_prompt(prompt, context),
+                stream=True,
+                request_options={"timeout": self.timeout}
+            )
+            produced_text = False
+            finish_reason = None
+            async for chunk in response:
+                # chunk.text levanta em fragmentos sem texto (ex.: bloqueio de segurança)
+                text, chunk_finish = self._read_stream_chunk(chunk)
+                if text:
+                    produced_text = True
+                    yield text
+                finish_reason = chunk_finish or finish_reason
+        except Exception as e:
+            logger.error(f"Erro no streaming do Gemini: {str(e)}")
+            raise Exception(f"Erro no streaming do Gemini: {str(e)}")
+        
+        if finish_reason not in self.NORMAL_FINISH_REASONS:
+            logger.warning(f"Streaming do Gemini terminou com finish_reason={finish_reason}")
+            if not produced_text:
+                # Sem texto: falha para o orquestrador passar ao provedor seguinte
+                raise Exception(f"Gemini não devolveu texto (finish_reason={finish_reason})")
+    
+    @staticmethod
+    def _read_stream_chunk(chunk) -> Tuple[str, Optional[str]]:
+        """Texto das partes do primeiro candidato e o seu finish_reason (ou do bloqueio do prompt)"""
+        candidates = getattr(chunk, "candidates", None) or []
+        if not candidates:
+            block_reason = getattr(getattr(chunk, "prompt_feedback", None), "block_reason", None)
+            return "", getattr(block_reason, "name", None) if block_reason else None
+        
+        candidate = candidates[0]
+        parts = getattr(getattr(candidate, "content", None), "parts", None) or []
+        text = "".join(getattr(part, "text", "") or "" for part in parts)
+        finish_reason = getattr(candidate, "finish_reason", None)
+        return text, getattr(finish_reason, "name", None) if finish_reason else None
+    
+    def _build_prompt(self, prompt: str, context: str) -> str:
+        return f"""Você é um assistente jurídico especializado em legislação moçambicana.
             
 Contexto legal: {context}
 
 Pergunta: {prompt}
 
 Forneça uma resposta estruturada, citando fontes legais quando relevante."""
-            
-            response = self.model.generate_content(system_prompt)
-            return response.text
-            
-        except Exception as e:
-            logger.error(f"Erro na resposta do Gemini: {str(e)}")
-            raise Exception(f"Erro na resposta do Gemini: {str(e)}")
     
     def is_available(self) -> bool:
-        """Verifica disponibilidade do Gemini"""
+        """Modelo configurado (o estado de rede vem do registo de saúde)"""
+        return self.model is not None
+    
+    async def health_check(self) -> bool:
+        """Consulta os metadados do modelo (sem gerar tokens)"""
         if not self.model:
             return False
-            
+        
         try:
-            response = self.model.generate_content("teste")
+            from google.generativeai import get_model
+            # get_model não tem versão assíncrona
+            await run_blocking(get_model, f"models/{self.model_version}")
             return True
-        except Exception:
+        except Exception as e:
+            logger.warning(f"Gemini indisponível: {e}")
             return False
     
     def get_model_info(self) -> Dict[str, Any]:
@@ -195,10 +338,265 @@ Forneça uma resposta estruturada, citando fontes legais quando relevante."""
             "specialties": ["multimodal", "velocidade", "custo-efetivo"]
         }
 
+class ProviderHealthRegistry:
+    """
+    Estado de saúde em cache por provedor.
+    Actualizado pelo prober em segundo plano e passivamente pelos pedidos reais;
+    as decisões de routing só lêem este estado (sem chamadas de rede).
+    """
+    
+    UNKNOWN = "unknown"
+    HEALTHY = "healthy"
+    UNHEALTHY = "unhealthy"
+    
+    def __init__(self, failure_threshold: int = 3):
+        # Falhas consecutivas (sondas ou pedidos reais) até marcar o provedor como indisponível
+        self.failure_threshold = failure_threshold
+        self._state: Dict[LLMProvider, Dict[str, Any]] = {}
+    
+    def register(self, provider_type: LLMProvider):
+        self._state.setdefault(provider_type, {
+            "status": self.UNKNOWN,
+            "consecutive_failures": 0,
+            "last_checked": None,
+            "last_success": None,
+            "last_failure": None,
+            "last_error": None,
+            "last_latency": None,
+            "source": None
+        })
+    
+    def is_available(self, provider_type: LLMProvider) -> bool:
+        """Provedores ainda não sondados contam como disponíveis"""
+        state = self._state.get(provider_type)
+        return state is not None and state["status"] != self.UNHEALTHY
+    
+    def record_success(self, provider_type: LLMProvider, latency: Optional[float] = None, source: str = "request"):
+        state = self._state[provider_type]
+        now = datetime.now()
+        state.update({
+            "status": self.HEALTHY,
+            "consecutive_failures": 0,
+            "last_checked": now,
+            "last_success": now,
+            "last_latency": latency,
+            "source": source
+        })
+    
+    def record_failure(self, provider_type: LLMProvider, error: str, source: str = "request"):
+        state = self._state[provider_type]
+        now = datetime.now()
+        state["consecutive_failures"] += 1
+        state.update({
+            "last_checked": now,
+            "last_failure": now,
+            "last_error": error,
+            "source": source
+        })
+        # Sondas e pedidos reais só marcam indisponível após falhas consecutivas:
+        # uma sonda falhada isolada não pode retirar o provedor até à próxima ronda
+        if state["consecutive_failures"] >= self.failure_threshold:
+            state["status"] = self.UNHEALTHY
+    
+    def snapshot(self, provider_type: LLMProvider) -> Dict[str, Any]:
+        state = dict(self._state.get(provider_type, {}))
+        for key in ("last_checked", "last_success", "last_failure"):
+            if state.get(key):
+                state[key] = state[key].isoformat()
+        return state
+
+class CircuitBreaker:
+    """
+    Circuit breaker por provedor (closed / open / half_open) com janela deslizante
+    de resultados. Abre por taxa de falhas ou de chamadas lentas e deriva o
+    deadline de cada chamada do p95 de latência observado.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(
+        self,
+        name: str = "",
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: float = 20.0,
+        slow_call_rate_threshold: float = 0.8,
+        open_duration: float = 30.0,
+        min_timeout: float = 5.0,
+        latency_multiplier: float = 1.5
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_duration = open_duration
+        self.min_timeout = min_timeout
+        self.latency_multiplier = latency_multiplier
+        
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window_size)  # (sucesso, latência)
+        self._latencies = deque(maxlen=100)  # latências de sucesso para o p95
+        self._opened_at = 0.0
+        self._half_open_started: Optional[float] = None
+    
+    def allow_request(self) -> bool:
+        """Decide sem custo de rede se o provedor pode ser tentado agora"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_duration:
+                return False
+            self.state = self.HALF_OPEN
+            self._half_open_started = None
+        
+        if self.state == self.HALF_OPEN:
+            # Uma única chamada de teste de cada vez (liberta se nunca reportou resultado)
+            now = time.monotonic()
+            if self._half_open_started is not None and now - self._half_open_started < self.open_duration:
+                return False
+            self._half_open_started = now
+        
+        return True
+    
+    def record_success(self, latency: float):
+        self._latencies.append(latency)
+        if self.state == self.HALF_OPEN:
+            self._close()
+            return
+        self._outcomes.append((True, latency))
+        self._evaluate()
+    
+    def record_failure(self, latency: Optional[float] = None):
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append((False, latency))
+        self._evaluate()
+    
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Percentil das latências de sucesso (None sem histórico suficiente)"""
+        if len(self._latencies) < self.min_calls:
+            return None
+        return float(np.percentile(self._latencies, percentile))
+    
+    def deadline(self, max_timeout: float) -> float:
+        """Timeout da próxima chamada: p95 observado x multiplicador, entre min_timeout e max_timeout"""
+        p95 = self.latency_percentile(95)
+        if p95 is None:
+            return max_timeout
+        return min(max_timeout, max(self.min_timeout, p95 * self.latency_multiplier))
+    
+    def _evaluate(self):
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        
+        failures = sum(1 for success, _ in self._outcomes if not success)
+        slow_calls = sum(
+            1 for success, latency in self._outcomes
+            if success and latency is not None and latency >= self.slow_call_threshold
+        )
+        if (failures / calls >= self.failure_rate_threshold or
+                slow_calls / calls >= self.slow_call_rate_threshold):
+            self._open()
+    
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_started = None
+        logger.warning(f"Circuit breaker aberto para {self.name}")
+    
+    def _close(self):
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._half_open_started = None
+    
+    def snapshot(self, max_timeout: float) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        failures = sum(1 for success, _ in self._outcomes if not success)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "failure_rate": round(failures / calls, 2) if calls else 0.0,
+            "deadline_seconds": round(self.deadline(max_timeout), 2)
+        }
+
+class HedgingPolicy:
+    """
+    Pedidos em hedge: se o provedor primário não responder dentro de um percentil
+    da sua latência histórica, o mesmo prompt é enviado ao provedor seguinte e
+    fica a primeira resposta. max_hedge_ratio limita a fracção de pedidos com
+    hedge (cada hedge é uma chamada paga a mais).
+    """
+    
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 90.0,
+        max_hedge_ratio: float = 0.1,
+        min_delay: float = 0.5
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_delay = min_delay
+        
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.hedges_lost = 0
+        self.hedges_suppressed = 0
+    
+    def hedge_delay(self, breaker: CircuitBreaker) -> Optional[float]:
+        """Espera antes do hedge (None: sem hedge, ex.: sem histórico de latência)"""
+        if not self.enabled:
+            return None
+        latency = breaker.latency_percentile(self.percentile)
+        if latency is None:
+            return None
+        return max(self.min_delay, latency)
+    
+    def try_acquire(self) -> bool:
+        """Autoriza um hedge se a taxa de hedges continuar dentro do limite"""
+        if self.hedges_fired + 1 > self.max_hedge_ratio * max(self.requests, 1):
+            self.hedges_suppressed += 1
+            return False
+        self.hedges_fired += 1
+        return True
+    
+    def record_outcome(self, hedge_won: bool):
+        if hedge_won:
+            self.hedges_won += 1
+        else:
+            self.hedges_lost += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        decided = self.hedges_won + self.hedges_lost
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "max_hedge_ratio": self.max_hedge_ratio,
+            "requests": self.requests,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedges_lost": self.hedges_lost,
+            "hedges_suppressed": self.hedges_suppressed,
+            "hedge_rate": round(self.hedges_fired / self.requests, 3) if self.requests else 0.0,
+            "hedge_win_rate": round(self.hedges_won / decided, 3) if decided else 0.0
+        }
+
 class LLMOrchestrator:
     """Orquestrador principal que gerencia múltiplos provedores de LLM"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        health_probe_interval: float = 60.0,
+        time_budget: float = 45.0,
+        hedging: Optional[HedgingPolicy] = None
+    ):
         self.providers: Dict[LLMProvider, BaseLLMProvider] = {}
         self.fallback_order = [
             LLMProvider.CLAUDE_3_SONNET,
@@ -206,59 +604,356 @@ class LLMOrchestrator:
             LLMProvider.CLAUDE_3_HAIKU
         ]
         self.metrics = LLMMetrics()
+        self.health = ProviderHealthRegistry()
+        self.health_probe_interval = health_probe_interval
+        self._prober_task: Optional[asyncio.Task] = None
+        # Tempo máximo total de um pedido, somando todas as tentativas de fallback
+        self.time_budget = time_budget
+        self.breakers: Dict[LLMProvider, CircuitBreaker] = {}
+        self.hedging = hedging or HedgingPolicy()
         
     def add_provider(self, provider_type: LLMProvider, provider: BaseLLMProvider):
         """Adiciona um provedor ao orquestrador"""
         self.providers[provider_type] = provider
+        self.health.register(provider_type)
+        self.breakers[provider_type] = CircuitBreaker(name=provider_type.value)
         logger.info(f"Provedor {provider_type.value} adicionado")
+    
+    async def probe_providers(self):
+        """Sonda todos os provedores em paralelo e actualiza o registo de saúde"""
+        async def probe(provider_type: LLMProvider, provider: BaseLLMProvider):
+            start = time.time()
+            try:
+                healthy = await provider.health_check()
+                error = None if healthy else "sonda de saúde falhou"
+            except Exception as e:
+                healthy, error = False, str(e)
+            
+            if healthy:
+                self.health.record_success(provider_type, time.time() - start, source="probe")
+            else:
+                self.health.record_failure(provider_type, error, source="probe")
+        
+        await asyncio.gather(*(probe(t, p) for t, p in self.providers.items()))
+    
+    async def _health_prober(self):
+        while True:
+            try:
+                await self.probe_providers()
+            except Exception as e:
+                logger.error(f"Erro no prober de saúde dos LLMs: {e}")
+            await asyncio.sleep(self.health_probe_interval)
+    
+    def start_health_prober(self):
+        """Inicia a sonda periódica (chamar dentro do event loop, ex.: no startup)"""
+        if self._prober_task is None or self._prober_task.done():
+            self._prober_task = asyncio.create_task(self._health_prober())
+    
+    async def stop_health_prober(self):
+        if self._prober_task:
+            self._prober_task.cancel()
+            try:
+                await self._prober_task
+            except asyncio.CancelledError:
+                pass
+            self._prober_task = None
         
     def set_fallback_order(self, order: List[LLMProvider]):
         """Define ordem de fallback personalizada"""
         self.fallback_order = order
         logger.info(f"Ordem de fallback atualizada: {[p.value for p in order]}")
         
-    async def get_legal_response(self, query: str, retrieved_context: str) -> Dict[str, Any]:
+    def _next_providers(self, start_time: float, budget: float):
+        """
+        Provedores a tentar, pela ordem de fallback: (tipo, timeout). É avaliado
+        de forma preguiçosa, pelo que o breaker e o orçamento restante são
+        consultados no momento em que cada tentativa começa.
+        """
+        for provider_type in self.fallback_order:
+            if provider_type not in self.providers:
+                continue
+            
+            if not self.health.is_available(provider_type):
+                logger.warning(f"Provedor {provider_type.value} indisponível")
+                continue
+            
+            remaining = budget - (time.time() - start_time)
+            if remaining <= 0:
+                logger.warning("Orçamento de tempo esgotado antes de esgotar o fallback")
+                return
+            
+            breaker = self.breakers[provider_type]
+            if not breaker.allow_request():
+                logger.warning(f"Circuit breaker não permite chamadas a {provider_type.value}")
+                continue
+            
+            yield provider_type, min(breaker.deadline(self.providers[provider_type].timeout), remaining)
+    
+    async def _attempt(
+        self,
+        provider_type: LLMProvider,
+        timeout: float,
+        query: str,
+        retrieved_context: str,
+        budget_end: Optional[float] = None
+    ) -> str:
+        """
+        Uma tentativa num provedor, com registo de saúde e breaker. A espera por uma
+        vaga no limite de concorrência não conta para o prazo nem para a latência;
+        sem vaga a tempo, a tentativa termina como saturada (ProviderSaturated) sem
+        afectar a saúde nem o breaker. Se a tarefa for cancelada (hedge perdido)
+        nada é registado.
+        """
+        provider = self.providers[provider_type]
+        breaker = self.breakers[provider_type]
+        
+        try:
+            await provider.acquire(timeout)
+        except ProviderSaturated as e:
+            logger.warning(f"{provider_type.value} saturado: {e}")
+            self.metrics.track_saturation(provider_type.value)
+            raise
+        
+        try:
+            # O prazo começa depois de obtida a vaga, sem ultrapassar o orçamento total
+            if budget_end is not None:
+                timeout = min(timeout, max(budget_end - time.time(), 0.001))
+            attempt_start = time.time()
+            try:
+                logger.info(f"Tentando resposta com {provider_type.value} (timeout {timeout:.1f}s)")
+                response = await asyncio.wait_for(
+                    provider.generate_response(query, retrieved_context),
+                    timeout=timeout
+                )
+            except Exception as e:
+                error = f"timeout após {timeout:.1f}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+                logger.error(f"Falhou com {provider_type.value}: {error}")
+                self.metrics.track_failure(provider_type.value, error)
+                self.health.record_failure(provider_type, error)
+                breaker.record_failure(time.time() - attempt_start)
+                raise
+        finally:
+            provider.release()
+        
+        attempt_time = time.time() - attempt_start
+        self.health.record_success(provider_type, attempt_time)
+        breaker.record_success(attempt_time)
+        return response
+    
+    async def get_legal_response(
+        self,
+        query: str,
+        retrieved_context: str,
+        time_budget: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Obtém resposta legal usando ordem de fallback, dentro do orçamento de tempo.
+        Com hedging activo, um primário lento é corrido em paralelo com o provedor
+        seguinte e fica a primeira resposta com sucesso.
+        """
+        start_time = time.time()
+        budget = time_budget or self.time_budget
+        budget_end = start_time + budget
+        candidates = self._next_providers(start_time, budget)
+        self.hedging.requests += 1
+        
+        running: Dict[asyncio.Task, LLMProvider] = {}
+        hedge_task: Optional[asyncio.Task] = None
+        hedge_race = set()
+        hedge_considered = False
+        # Candidato obtido para um hedge recusado: fica para o fallback sequencial
+        deferred = None
+        
+        try:
+            while True:
+                if not running:
+                    candidate, deferred = deferred or next(candidates, None), None
+                    if candidate is None:
+                        break
+                    provider_type, timeout = candidate
+                    # O candidato adiado pode ter sido obtido há algum tempo
+                    timeout = min(timeout, budget_end - time.time())
+                    if timeout <= 0:
+                        logger.warning("Orçamento de tempo esgotado antes de esgotar o fallback")
+                        break
+                    task = asyncio.create_task(
+                        self._attempt(provider_type, timeout, query, retrieved_context, budget_end)
+                    )
+                    running[task] = provider_type
+                
+                hedge_delay = None
+                if not hedge_considered and len(running) == 1:
+                    primary_type = next(iter(running.values()))
+                    hedge_delay = self.hedging.hedge_delay(self.breakers[primary_type])
+                
+                done, _ = await asyncio.wait(
+                    running, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    # Primário sem resposta dentro do percentil: hedge no provedor seguinte
+                    hedge_considered = True
+                    # Sem provedor seguinte não há hedge, nem consumo da quota de hedges
+                    candidate = next(candidates, None)
+                    if candidate is None:
+                        continue
+                    if not self.hedging.try_acquire():
+                        deferred = candidate
+                        continue
+                    provider_type, timeout = candidate
+                    logger.info(f"Hedge: pedido duplicado para {provider_type.value}")
+                    hedge_task = asyncio.create_task(
+                        self._attempt(provider_type, timeout, query, retrieved_context, budget_end)
+                    )
+                    running[hedge_task] = provider_type
+                    hedge_race = set(running)
+                    continue
+                
+                for task in done:
+                    provider_type = running.pop(task)
+                    if task.exception() is not None:
+                        continue
+                    
+                    if task in hedge_race:
+                        self.hedging.record_outcome(hedge_won=task is hedge_task)
+                    
+                    provider = self.providers[provider_type]
+                    response_time = time.time() - start_time
+                    self.metrics.track_request(provider_type.value, response_time)
+                    return {
+                        "response": task.result(),
+                        "provider": provider_type.value,
+                        "response_time": response_time,
+                        "success": True,
+                        "model_info": provider.get_model_info()
+                    }
+        finally:
+            # Cancelar a tentativa perdedora (ou todas, se o pedido for cancelado)
+            for task in running:
+                task.cancel()
+        
+        # Fallback final
+        self.metrics.track_fallback_activation()
+        return {
+            "response": FALLBACK_RESPONSE,
+            "provider": "fallback",
+            "response_time": time.time() - start_time,
+            "success": False,
+            "error": "Todos os provedores falharam"
+        }
+    
+    async def stream_legal_response(
+        self,
+        query: str,
+        retrieved_context: str,
+        time_budget: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Obtém resposta legal usando ordem de fallback
+        Resposta legal em streaming: eventos {"type": "token", "text"} seguidos de
+        {"type": "done", ...}. O fallback só é possível antes do primeiro fragmento;
+        depois disso uma falha termina o stream com success=False.
         """
         start_time = time.time()
+        budget = time_budget or self.time_budget
         
         for provider_type in self.fallback_order:
             if provider_type not in self.providers:
                 continue
-                
+            
             provider = self.providers[provider_type]
+            breaker = self.breakers[provider_type]
             
-            if not provider.is_available():
+            if not self.health.is_available(provider_type):
                 logger.warning(f"Provedor {provider_type.value} indisponível")
                 continue
-                
+            
+            remaining = budget - (time.time() - start_time)
+            if remaining <= 0:
+                logger.warning("Orçamento de tempo esgotado antes de esgotar o fallback")
+                break
+            
+            if not breaker.allow_request():
+                logger.warning(f"Circuit breaker não permite chamadas a {provider_type.value}")
+                continue
+            
+            timeout = min(breaker.deadline(provider.timeout), remaining)
+            
+            # Espera por vaga fora do prazo; saturação local não conta como falha
             try:
-                logger.info(f"Tentando resposta com {provider_type.value}")
+                await provider.acquire(timeout)
+            except ProviderSaturated as e:
+                logger.warning(f"{provider_type.value} saturado: {e}")
+                self.metrics.track_saturation(provider_type.value)
+                continue
+            
+            try:
+                timeout = min(timeout, max(budget - (time.time() - start_time), 0.001))
+                attempt_start = time.time()
+                stream = provider.generate_stream(query, retrieved_context)
                 
-                response = await provider.generate_response(query, retrieved_context)
-                response_time = time.time() - start_time
+                # Até ao primeiro fragmento ainda é possível passar ao provedor seguinte
+                try:
+                    logger.info(f"Tentando streaming com {provider_type.value} (timeout {timeout:.1f}s)")
+                    first_text = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                except Exception as e:
+                    await stream.aclose()
+                    if isinstance(e, StopAsyncIteration):
+                        error = "resposta vazia"
+                    elif isinstance(e, asyncio.TimeoutError):
+                        error = f"timeout após {timeout:.1f}s"
+                    else:
+                        error = str(e)
+                    logger.error(f"Falhou com {provider_type.value}: {error}")
+                    self.metrics.track_failure(provider_type.value, error)
+                    self.health.record_failure(provider_type, error)
+                    breaker.record_failure(time.time() - attempt_start)
+                    continue
                 
-                # Registrar métricas
+                parts = [first_text]
+                error = None
+                try:
+                    yield {"type": "token", "text": first_text, "provider": provider_type.value}
+                    while True:
+                        # Entre fragmentos aplica-se o timeout do provedor
+                        text = await asyncio.wait_for(stream.__anext__(), timeout=provider.timeout)
+                        parts.append(text)
+                        yield {"type": "token", "text": text}
+                except StopAsyncIteration:
+                    pass
+                except Exception as e:
+                    error = f"timeout após {provider.timeout}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+                finally:
+                    await stream.aclose()
+            finally:
+                provider.release()
+            
+            response_time = time.time() - start_time
+            if error:
+                logger.error(f"Streaming interrompido com {provider_type.value}: {error}")
+                self.metrics.track_failure(provider_type.value, error)
+                self.health.record_failure(provider_type, error)
+                breaker.record_failure(time.time() - attempt_start)
+            else:
                 self.metrics.track_request(provider_type.value, response_time)
-                
-                return {
-                    "response": response,
-                    "provider": provider_type.value,
-                    "response_time": response_time,
-                    "success": True,
-                    "model_info": provider.get_model_info()
-                }
-                
-            except Exception as e:
-                logger.error(f"Falhou com {provider_type.value}: {str(e)}")
-                self.metrics.track_failure(provider_type.value, str(e))
-                continue
+                self.health.record_success(provider_type, time.time() - attempt_start)
+                breaker.record_success(time.time() - attempt_start)
+            
+            yield {
+                "type": "done",
+                "response": "".join(parts),
+                "provider": provider_type.value,
+                "response_time": response_time,
+                "success": error is None,
+                **({"error": error} if error else {})
+            }
+            return
         
         # Fallback final
         self.metrics.track_fallback_activation()
-        return {
-            "response": "Desculpe, todos os serviços de IA estão temporariamente indisponíveis. Por favor, tente novamente em alguns minutos.",
+        yield {"type": "token", "text": FALLBACK_RESPONSE}
+        yield {
+            "type": "done",
+            "response": FALLBACK_RESPONSE,
             "provider": "fallback",
             "response_time": time.time() - start_time,
             "success": False,
@@ -266,24 +961,27 @@ class LLMOrchestrator:
         }
     
     def get_available_providers(self) -> List[str]:
-        """Lista provedores disponíveis no momento"""
-        available = []
-        for provider_type, provider in self.providers.items():
-            if provider.is_available():
-                available.append(provider_type.value)
-        return available
+        """Lista provedores disponíveis segundo o estado em cache"""
+        return [
+            provider_type.value for provider_type in self.providers
+            if self.health.is_available(provider_type)
+        ]
     
     def get_health_status(self) -> Dict[str, Any]:
         """Status de saúde do orquestrador"""
         status = {
             "providers": {},
             "fallback_order": [p.value for p in self.fallback_order],
-            "metrics": self.metrics.get_performance_summary()
+            "metrics": self.metrics.get_performance_summary(),
+            "hedging": self.hedging.snapshot()
         }
         
         for provider_type, provider in self.providers.items():
             status["providers"][provider_type.value] = {
-                "available": provider.is_available(),
+                "available": self.health.is_available(provider_type),
+                "health": self.health.snapshot(provider_type),
+                "circuit_breaker": self.breakers[provider_type].snapshot(provider.timeout),
+                "concurrency": provider.get_concurrency_info(),
                 "model_info": provider.get_model_info()
             }
             
@@ -337,25 +1035,24 @@ Se não há informação suficiente no contexto, indique claramente essa limita
 class LLMMetrics:
     """Sistema de métricas e monitoramento para LLMs"""
     
-    def __init__(self):
+    def __init__(self, max_failures: int = 100):
         self.usage_stats = {
             "claude_3_sonnet_requests": 0,
             "claude_3_haiku_requests": 0,
             "gemini_2_flash_requests": 0,
             "fallback_activations": 0,
             "total_failures": 0,
-            "response_times": [],
-            "failures": []
+            "saturations": 0,
+            "failures": deque(maxlen=max_failures)
         }
+        # Latência por provedor com memória fixa (em vez de uma lista sem limite)
+        self.latency = HistogramRegistry(max_keys=len(LLMProvider) + 1)
     
     def track_request(self, provider: str, response_time: float):
         """Registra uma requisição bem-sucedida"""
-        self.usage_stats[f"{provider}_requests"] += 1
-        self.usage_stats["response_times"].append({
-            "provider": provider,
-            "time": response_time,
-            "timestamp": datetime.now()
-        })
+        key = f"{provider}_requests"
+        self.usage_stats[key] = self.usage_stats.get(key, 0) + 1
+        self.latency.record(provider, response_time)
         
     def track_failure(self, provider: str, error: str):
         """Registra uma falha"""
@@ -366,6 +1063,10 @@ class LLMMetrics:
             "timestamp": datetime.now()
         })
         
+    def track_saturation(self, provider: str):
+        """Regista uma tentativa sem vaga no limite de concorrência local"""
+        self.usage_stats["saturations"] += 1
+        
     def track_fallback_activation(self):
         """Registra ativação do fallback"""
         self.usage_stats["fallback_activations"] += 1
@@ -374,17 +1075,22 @@ class LLMMetrics:
         """Sumário de performance"""
         total_requests = sum([v for k, v in self.usage_stats.items() if "_requests" in k])
         
-        avg_response_time = 0
-        if self.usage_stats["response_times"]:
-            avg_response_time = np.mean([r["time"] for r in self.usage_stats["response_times"]])
+        latency = self.latency.summary()
+        overall = self.latency.overall
+        avg_response_time = overall.total / overall.count if overall.count else 0
         
         return {
             "total_requests": total_requests,
             "total_failures": self.usage_stats["total_failures"],
             "fallback_activations": self.usage_stats["fallback_activations"],
+            "saturations": self.usage_stats["saturations"],
             "avg_response_time": round(avg_response_time, 2),
             "success_rate": round((total_requests - self.usage_stats["total_failures"]) / max(total_requests, 1) * 100, 2),
             "provider_distribution": {
                 k: v for k, v in self.usage_stats.items() if "_requests" in k
+            },
+            "latency": {
+                "overall": latency["overall"],
+                "providers": latency["by_key"]
             }
         }
\ No newline at end of file
@@ -6,6 +6,8 @@ import google.generativeai as genai
 import os
 import re
 
+from models.legal_terms import RATING_LEGAL_TERMS, RATING_COMPLEX_WORDS, legal_term_matcher
+
 app = FastAPI(title="Muzaia Legal Assistant API")
 
 # Configure CORS
@@ -43,34 +45,15 @@ class ChatResponse(BaseModel):
 
 # Legal complexity rating system
 def get_complexity_rating(text: str) -> ComplexityRating:
-    legal_terms = [
-        'constituição', 'código civil', 'código penal', 'código comercial',
-        'habeas corpus', 'mandado de segurança', 'usucapião', 'prescrição',
-        'jurisprudência', 'acórdão', 'recurso', 'apelação', 'cassação',
-        'responsabilidade civil', 'danos morais', 'indenização',
-        'contrato', 'obrigação', 'direito real', 'propriedade',
-        'sucessão', 'herança', 'testamento', 'inventário',
-        'processo civil', 'processo penal', 'processo administrativo'
-    ]
-    
-    complex_words = [
-        'interpretação', 'aplicação', 'competência', 'jurisdição',
-        'legitimidade', 'interesse processual', 'mérito',
-        'preliminar', 'prejudicial', 'conexão', 'continência'
-    ]
-    
-    text_lower = text.lower()
+    # Single pass over the text for every term
+    found_terms = legal_term_matcher.find_terms(text)
     complexity = 0
     
     # Count legal terms
-    for term in legal_terms:
-        if term in text_lower:
-            complexity += 1
+    complexity += len(legal_term_matcher.terms_in(found_terms, RATING_LEGAL_TERMS))
     
     # Count complex words (worth more)
-    for word in complex_words:
-        if word in text_lower:
-            complexity += 2
+    complexity += 2 * len(legal_term_matcher.terms_in(found_terms, RATING_COMPLEX_WORDS))
     
     # Text length factor
     if len(text) > 500:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Enum, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -75,7 +75,9 @@ class DocumentEmbedding(Base):
     document_id = Column(Integer, ForeignKey("legal_documents.id"))
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer)
-    embedding_vector = Column(JSON)  # Store as JSON for now (simplified)
+    embedding_vector = Column(LargeBinary)  # float32 little-endian (services/embedding_service.py)
+    embedding_model = Column(String(200))
+    embedding_dim = Column(Integer)
     created_at = Column(DateTime, default=func.now())
     
     # Relationships
@@ -7,6 +7,10 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
 
+from models.legal_terms import (
+    AREA_DETECTION_KEYWORDS, AREA_SPECIFIC_KEYWORDS, GENERAL_KEYWORDS, legal_term_matcher
+)
+
 class LegalDocumentType(IntEnum):
     """Tipos de documentos legais em ordem hierárquica"""
     CONSTITUICAO = 1
@@ -309,70 +313,32 @@ class LegalDocumentHierarchy:
     @classmethod
     def detect_legal_area(cls, title: str, content: str) -> LegalArea:
         """Detecta a área legal baseado no título e conteúdo"""
-        text = (title + " " + content).lower()
-        
-        area_keywords = {
-            LegalArea.CONSTITUCIONAL: ["constituição", "direitos fundamentais", "estado", "poderes"],
-            LegalArea.CIVIL: ["civil", "contrato", "propriedade", "obrigação", "responsabilidade"],
-            LegalArea.PENAL: ["penal", "crime", "pena", "prisão", "delito"],
-            LegalArea.COMERCIAL: ["comercial", "empresa", "sociedade", "negócio", "actividade empresarial"],
-            LegalArea.TRABALHO: ["trabalho", "trabalhador", "empregador", "salário", "emprego"],
-            LegalArea.ADMINISTRATIVO: ["administrativo", "administração pública", "funcionário público"],
-            LegalArea.FISCAL: ["fiscal", "imposto", "taxa", "tributação", "receita"],
-            LegalArea.FUNDIARIO: ["terra", "fundiário", "propriedade fundiária", "uso da terra"],
-            LegalArea.AMBIENTAL: ["ambiente", "ambiental", "conservação", "poluição"],
-            LegalArea.FAMILIA: ["família", "casamento", "divórcio", "filhos", "adopção"],
-            LegalArea.PROCESSO_CIVIL: ["processo civil", "acção", "recurso", "tribunal civil"],
-            LegalArea.PROCESSO_PENAL: ["processo penal", "acusação", "julgamento", "tribunal penal"],
-            LegalArea.SEGURANCA_SOCIAL: ["segurança social", "pensão", "reforma", "subsídio"],
-            LegalArea.IMIGRACAO: ["imigração", "visto", "residência", "nacionalidade"],
-            LegalArea.PROPRIEDADE_INTELECTUAL: ["propriedade intelectual", "marca", "patente", "direitos autorais"]
-        }
+        # Uma única passagem pelo texto para as palavras-chave de todas as áreas
+        matches = legal_term_matcher.match(title + " " + content, prefix='area.')
         
         best_area = LegalArea.CIVIL  # Default
         max_matches = 0
         
-        for area, keywords in area_keywords.items():
-            matches = sum(1 for keyword in keywords if keyword in text)
-            if matches > max_matches:
-                max_matches = matches
-                best_area = area
+        for area_name in AREA_DETECTION_KEYWORDS:
+            matches_count = len(matches.get(f'area.{area_name}', []))
+            if matches_count > max_matches:
+                max_matches = matches_count
+                best_area = LegalArea[area_name]
         
         return best_area
     
     @classmethod
     def extract_keywords(cls, title: str, content: str, legal_area: LegalArea) -> List[str]:
         """Extrai palavras-chave relevantes do documento"""
-        text = (title + " " + content).lower()
+        found_terms = legal_term_matcher.find_terms(title + " " + content)
         
         # Keywords gerais jurídicas
-        general_keywords = [
-            "artigo", "lei", "decreto", "regulamento", "direito", "dever", "obrigação",
-            "responsabilidade", "processo", "tribunal", "sentença", "recurso", "multa",
-            "pena", "sanção", "indemnização", "compensação", "prazo", "procedimento"
-        ]
-        
-        # Keywords específicas por área
-        area_specific = {
-            LegalArea.COMERCIAL: ["empresa", "sociedade", "contrato comercial", "actividade económica"],
-            LegalArea.TRABALHO: ["contrato trabalho", "despedimento", "férias", "horário"],
-            LegalArea.CIVIL: ["propriedade", "usufruito", "herança", "sucessão"],
-            LegalArea.PENAL: ["crime", "delito", "prisão", "liberdade condicional"],
-            LegalArea.FISCAL: ["imposto", "iva", "irps", "declaração fiscal"]
-        }
-        
-        keywords = []
-        
-        # Adicionar keywords encontradas
-        for keyword in general_keywords:
-            if keyword in text:
-                keywords.append(keyword)
+        keywords = legal_term_matcher.terms_in(found_terms, GENERAL_KEYWORDS)
         
         # Adicionar keywords específicas da área
-        if legal_area in area_specific:
-            for keyword in area_specific[legal_area]:
-                if keyword in text:
-                    keywords.append(keyword)
+        area_name = LegalArea(legal_area).name
+        if area_name in AREA_SPECIFIC_KEYWORDS:
+            keywords.extend(legal_term_matcher.terms_in(found_terms, AREA_SPECIFIC_KEYWORDS[area_name]))
         
         return list(set(keywords))  # Remover duplicados
     
@@ -0,0 +1,248 @@
+"""
+Vocabulário Jurídico - Dicionários de termos e matcher Aho-Corasick partilhado
+Um único autómato construído no import encontra todos os termos numa só passagem
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# pyahocorasick (C) é opcional; sem ele usa-se a implementação em Python puro
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# ComplexityService (backend_complete)
+COMPLEXITY_AREA_TERMS = {
+    'direito_civil': ['obrigação', 'contrato', 'propriedade', 'posse', 'usufructo'],
+    'direito_penal': ['crime', 'pena', 'sanção', 'culpabilidade', 'dolo'],
+    'direito_trabalho': ['contrato de trabalho', 'salário', 'despedimento', 'sindicato'],
+    'direito_comercial': ['sociedade', 'empresa', 'comerciante', 'firma', 'registo'],
+    'direito_administrativo': ['acto administrativo', 'funcionário público', 'serviço público']
+}
+
+# services/complexity_service.py
+SERVICE_LEGAL_TERMS = [
+    'constituição', 'código civil', 'código penal', 'código comercial',
+    'habeas corpus', 'mandado de segurança', 'usucapião', 'prescrição',
+    'jurisprudência', 'acórdão', 'recurso', 'apelação', 'cassação',
+    'responsabilidade civil', 'danos morais', 'indenização',
+    'contrato', 'obrigação', 'direito real', 'propriedade',
+    'sucessão', 'herança', 'testamento', 'inventário',
+    'processo civil', 'processo penal', 'processo administrativo',
+    'tribunal', 'sentença', 'decisão judicial', 'competência',
+    'jurisdição', 'legitimidade', 'interesse processual'
+]
+
+SERVICE_COMPLEX_CONCEPTS = [
+    'interpretação constitucional', 'aplicação da lei', 'hermenêutica jurídica',
+    'princípios gerais do direito', 'analogia legal', 'lacuna da lei',
+    'retroatividade', 'irretroatividade', 'direito adquirido',
+    'ato jurídico perfeito', 'coisa julgada', 'devido processo legal',
+    'contraditório', 'ampla defesa', 'presunção de inocência'
+]
+
+# main.get_complexity_rating
+RATING_LEGAL_TERMS = [
+    'constituição', 'código civil', 'código penal', 'código comercial',
+    'habeas corpus', 'mandado de segurança', 'usucapião', 'prescrição',
+    'jurisprudência', 'acórdão', 'recurso', 'apelação', 'cassação',
+    'responsabilidade civil', 'danos morais', 'indenização',
+    'contrato', 'obrigação', 'direito real', 'propriedade',
+    'sucessão', 'herança', 'testamento', 'inventário',
+    'processo civil', 'processo penal', 'processo administrativo'
+]
+
+RATING_COMPLEX_WORDS = [
+    'interpretação', 'aplicação', 'competência', 'jurisdição',
+    'legitimidade', 'interesse processual', 'mérito',
+    'preliminar', 'prejudicial', 'conexão', 'continência'
+]
+
+# LegalChunker (chaves: nome do LegalArea)
+CHUNKER_AREA_CONCEPTS = {
+    'CIVIL': [
+        "personalidade jurídica", "capacidade", "responsabilidade civil",
+        "contrato", "propriedade", "obrigação", "direitos reais", "posse",
+        "usufruito", "servidão", "hipoteca", "penhor", "herança", "sucessão"
+    ],
+    'PENAL': [
+        "crime", "dolo", "culpa", "pena", "prisão", "multa", "medida de segurança",
+        "legítima defesa", "estado de necessidade", "tentativa", "comparticipação",
+        "prescrição", "extinção da responsabilidade", "atenuação", "agravação"
+    ],
+    'COMERCIAL': [
+        "sociedade comercial", "empresa", "estabelecimento comercial", "marca",
+        "patente", "concorrência", "falência", "recuperação", "títulos de crédito",
+        "letra de câmbio", "cheque", "nota promissória", "seguro", "transporte"
+    ],
+    'TRABALHO': [
+        "contrato de trabalho", "trabalhador", "empregador", "salário", "férias",
+        "despedimento", "cessação", "horário de trabalho", "horas extraordinárias",
+        "segurança no trabalho", "acidentes de trabalho", "greve", "sindicato"
+    ],
+    'ADMINISTRATIVO': [
+        "administração pública", "funcionário público", "acto administrativo",
+        "procedimento administrativo", "recurso administrativo", "contrato público",
+        "serviço público", "domínio público", "expropriação", "licenciamento"
+    ]
+}
+
+CHUNKER_GENERAL_CONCEPTS = [
+    "direito", "dever", "obrigação", "responsabilidade", "lei", "norma",
+    "tribunal", "processo", "sentença", "recurso", "prazo", "procedimento"
+]
+
+# LegalDocumentHierarchy.detect_legal_area (chaves: nome do LegalArea)
+AREA_DETECTION_KEYWORDS = {
+    'CONSTITUCIONAL': ["constituição", "direitos fundamentais", "estado", "poderes"],
+    'CIVIL': ["civil", "contrato", "propriedade", "obrigação", "responsabilidade"],
+    'PENAL': ["penal", "crime", "pena", "prisão", "delito"],
+    'COMERCIAL': ["comercial", "empresa", "sociedade", "negócio", "actividade empresarial"],
+    'TRABALHO': ["trabalho", "trabalhador", "empregador", "salário", "emprego"],
+    'ADMINISTRATIVO': ["administrativo", "administração pública", "funcionário público"],
+    'FISCAL': ["fiscal", "imposto", "taxa", "tributação", "receita"],
+    'FUNDIARIO': ["terra", "fundiário", "propriedade fundiária", "uso da terra"],
+    'AMBIENTAL': ["ambiente", "ambiental", "conservação", "poluição"],
+    'FAMILIA': ["família", "casamento", "divórcio", "filhos", "adopção"],
+    'PROCESSO_CIVIL': ["processo civil", "acção", "recurso", "tribunal civil"],
+    'PROCESSO_PENAL': ["processo penal", "acusação", "julgamento", "tribunal penal"],
+    'SEGURANCA_SOCIAL': ["segurança social", "pensão", "reforma", "subsídio"],
+    'IMIGRACAO': ["imigração", "visto", "residência", "nacionalidade"],
+    'PROPRIEDADE_INTELECTUAL': ["propriedade intelectual", "marca", "patente", "direitos autorais"]
+}
+
+# LegalDocumentHierarchy.extract_keywords
+GENERAL_KEYWORDS = [
+    "artigo", "lei", "decreto", "regulamento", "direito", "dever", "obrigação",
+    "responsabilidade", "processo", "tribunal", "sentença", "recurso", "multa",
+    "pena", "sanção", "indemnização", "compensação", "prazo", "procedimento"
+]
+
+AREA_SPECIFIC_KEYWORDS = {
+    'COMERCIAL': ["empresa", "sociedade", "contrato comercial", "actividade económica"],
+    'TRABALHO': ["contrato trabalho", "despedimento", "férias", "horário"],
+    'CIVIL': ["propriedade", "usufruito", "herança", "sucessão"],
+    'PENAL': ["crime", "delito", "prisão", "liberdade condicional"],
+    'FISCAL': ["imposto", "iva", "irps", "declaração fiscal"]
+}
+
+
+def _prefixed(prefix: str, vocabulary: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    return {f"{prefix}.{key}": terms for key, terms in vocabulary.items()}
+
+
+# Todas as categorias conhecidas pelo matcher partilhado
+LEGAL_VOCABULARIES: Dict[str, List[str]] = {
+    **_prefixed('complexidade', COMPLEXITY_AREA_TERMS),
+    'servico_complexidade.termos': SERVICE_LEGAL_TERMS,
+    'servico_complexidade.conceitos': SERVICE_COMPLEX_CONCEPTS,
+    'rating.termos': RATING_LEGAL_TERMS,
+    'rating.palavras_complexas': RATING_COMPLEX_WORDS,
+    **_prefixed('chunker', CHUNKER_AREA_CONCEPTS),
+    'chunker.geral': CHUNKER_GENERAL_CONCEPTS,
+    **_prefixed('area', AREA_DETECTION_KEYWORDS),
+    'keywords.geral': GENERAL_KEYWORDS,
+    **_prefixed('keywords', AREA_SPECIFIC_KEYWORDS)
+}
+
+
+class _PythonAutomaton:
+    """Autómato Aho-Corasick em Python puro (mesma interface usada do pyahocorasick)"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str]]] = [[]]
+
+    def add_word(self, word: str, value: Tuple[int, str]):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(value)
+
+    def make_automaton(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Saídas do estado de falha também terminam aqui
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, Tuple[int, str]]]:
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for value in output[state]:
+                yield end, value
+
+
+class LegalTermMatcher:
+    """
+    Matcher multi-padrão para vocabulário jurídico.
+    Semântica idêntica a `term in text.lower()` para cada termo, mas com uma
+    única passagem linear pelo texto para todas as categorias.
+    """
+
+    def __init__(self, vocabularies: Dict[str, List[str]]):
+        self.vocabularies = vocabularies
+        self.term_categories: Dict[str, List[str]] = {}
+
+        for category, terms in vocabularies.items():
+            for term in terms:
+                self.term_categories.setdefault(term.lower(), []).append(category)
+
+        self._automaton = ahocorasick.Automaton() if AHOCORASICK_AVAILABLE else _PythonAutomaton()
+        for term_id, term in enumerate(self.term_categories):
+            self._automaton.add_word(term, (term_id, term))
+        self._automaton.make_automaton()
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str, List[str]]]:
+        """Todas as ocorrências: (posição inicial, termo, categorias)"""
+        for end, (_, term) in self._automaton.iter(text.lower()):
+            yield end - len(term) + 1, term, self.term_categories[term]
+
+    def find_terms(self, text: str) -> Set[str]:
+        """Conjunto de termos distintos presentes no texto"""
+        return {term for _, (_, term) in self._automaton.iter(text.lower())}
+
+    def match(self, text: str, prefix: Optional[str] = None) -> Dict[str, List[str]]:
+        """
+        Termos encontrados por categoria, na ordem do vocabulário.
+        Só devolve categorias com pelo menos um termo presente.
+        """
+        found = self.find_terms(text)
+        categories = {
+            category
+            for term in found
+            for category in self.term_categories[term]
+            if prefix is None or category.startswith(prefix)
+        }
+        return {
+            category: [term for term in self.vocabularies[category] if term.lower() in found]
+            for category in categories
+        }
+
+    def terms_in(self, found: Set[str], terms: Iterable[str]) -> List[str]:
+        """Filtra uma lista de termos (ordem preservada) pelos termos encontrados"""
+        return [term for term in terms if term.lower() in found]
+
+
+# Instância global construída uma vez no import
+legal_term_matcher = LegalTermMatcher(LEGAL_VOCABULARIES)
@@ -5,9 +5,20 @@ Sistema de busca semântica avançada com embeddings e análise de relevância
 import re
 import json
 import random
+import asyncio
+import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from dataclasses import dataclass
+from psycopg.rows import tuple_row
+from services.db_pool import DatabasePool
+from services.fulltext_migration import tsv_match_sql, tsv_rank_sql
+from models.legal_terms import LegalTermMatcher
+from services.embedding_service import EmbeddingService, embedding_service as default_embedding_service
+
+# Candidatos por ramo na busca híbrida e constante k da reciprocal-rank fusion
+HYBRID_CANDIDATES = 50
+RRF_K = 60
 
 @dataclass
 class SearchResult:
@@ -24,8 +35,9 @@ class SearchResult:
 class AdvancedRAGService:
     """Serviço RAG avançado com busca semântica e análise contextual"""
     
-    def __init__(self, db_connection):
-        self.db = db_connection
+    def __init__(self, db_pool: DatabasePool, embedding_service: Optional[EmbeddingService] = None):
+        self.db_pool = db_pool
+        self.embedding_service = embedding_service or default_embedding_service
         self.legal_keywords = self._load_legal_keywords()
         self.concept_weights = self._initialize_concept_weights()
         
@@ -58,7 +70,7 @@ class AdvancedRAGService:
             "general": 1.0        # Peso base
         }
     
-    def advanced_search(
+    async def advanced_search(
         self, 
         query: str, 
         filters: Dict[str, Any] = None,
@@ -74,44 +86,142 @@ class AdvancedRAGService:
         expanded_query = self._expand_query(query)
         legal_concepts = self._extract_legal_concepts(query)
         
-        # 2. Busca na base de dados com filtros
-        sql_query = self._build_search_query(expanded_query, filters)
-        
+        # 2. Busca na base de dados com filtros (lexical, semântica ou híbrida)
         try:
-            with self.db.cursor() as cursor:
-                cursor.execute(sql_query['query'], sql_query['params'])
-                raw_results = cursor.fetchall()
+            if filters.get('searchMode') == 'hybrid':
+                return await self.hybrid_search(query, expanded_query, filters, max_results)
+            
+            if filters.get('searchMode') == 'semantic':
+                raw_results = await self.semantic_candidates(query, filters)
+            else:
+                sql_query = self._build_search_query(expanded_query, filters)
+                async with self.db_pool.connection() as conn:
+                    async with conn.cursor(row_factory=tuple_row) as cursor:
+                        await cursor.execute(sql_query['query'], sql_query['params'])
+                        raw_results = await cursor.fetchall()
         except Exception as e:
             print(f"Erro na busca: {e}")
             return []
         
-        # 3. Calcular relevância avançada
+        # 3. Calcular relevância avançada (todos os candidatos de uma vez)
+        relevance_scores = self._calculate_batch_relevance(query, legal_concepts, raw_results)
+        
         scored_results = []
-        for result in raw_results:
-            relevance_score = self._calculate_advanced_relevance(
-                query, expanded_query, legal_concepts, result
+        for result, relevance_score in zip(raw_results, relevance_scores):
+            if relevance_score >= filters.get('relevanceThreshold', 0.3):
+                scored_results.append(self._to_search_result(result, float(relevance_score)))
+        
+        # 4. Ordenar por relevância e retornar top results
+        scored_results.sort(key=lambda x: x.relevance_score, reverse=True)
+        return scored_results[:max_results]
+    
+    def _to_search_result(self, result: tuple, relevance_score: float) -> SearchResult:
+        """Converte uma linha candidata em SearchResult"""
+        return SearchResult(
+            document_id=result[0],
+            title=result[1],
+            content=result[2][:500] + "..." if len(result[2]) > 500 else result[2],
+            relevance_score=relevance_score,
+            document_type=str(result[3]) if result[3] else "",
+            legal_area=str(result[4]) if result[4] else "",
+            date_published=result[5].isoformat() if result[5] else None,
+            chunk_index=result[6] if len(result) > 6 else 0,
+            metadata={
+                'description': result[7] if len(result) > 7 else "",
+                'keywords': result[8] if len(result) > 8 else []
+            }
+        )
+    
+    async def hybrid_search(
+        self,
+        query: str,
+        expanded_query: List[str],
+        filters: Dict[str, Any],
+        max_results: int = 10
+    ) -> List[SearchResult]:
+        """
+        Busca full-text e vectorial em paralelo, fundidas por reciprocal-rank
+        fusion; os pesos hierárquico e temporal aplicam-se só depois da fusão
+        """
+        lexical, semantic = await asyncio.gather(
+            self.lexical_candidates(expanded_query, filters, HYBRID_CANDIDATES),
+            self.semantic_candidates(query, filters, HYBRID_CANDIDATES)
+        )
+        
+        fused = self._reciprocal_rank_fusion([lexical, semantic])
+        # Um candidato em 1º lugar nas duas listas atinge o máximo teórico
+        max_fused = 2.0 / (RRF_K + 1)
+        
+        scored_results = []
+        for row, fused_score in fused:
+            relevance_score = (
+                (fused_score / max_fused) * 0.7 +
+                self._get_hierarchy_weight(row[3] if row[3] else 0) * 0.2 +
+                self._get_temporal_weight(row[5]) * 0.1
             )
+            relevance_score = min(max(relevance_score, 0), 1)
             
             if relevance_score >= filters.get('relevanceThreshold', 0.3):
-                scored_results.append(SearchResult(
-                    document_id=result[0],
-                    title=result[1],
-                    content=result[2][:500] + "..." if len(result[2]) > 500 else result[2],
-                    relevance_score=relevance_score,
-                    document_type=str(result[3]) if result[3] else "",
-                    legal_area=str(result[4]) if result[4] else "",
-                    date_published=result[5].isoformat() if result[5] else None,
-                    chunk_index=result[6] if len(result) > 6 else 0,
-                    metadata={
-                        'description': result[7] if len(result) > 7 else "",
-                        'keywords': result[8] if len(result) > 8 else []
-                    }
-                ))
+                scored_results.append(self._to_search_result(row, relevance_score))
         
-        # 4. Ordenar por relevância e retornar top results
         scored_results.sort(key=lambda x: x.relevance_score, reverse=True)
         return scored_results[:max_results]
     
+    def _reciprocal_rank_fusion(self, ranked_lists: List[List[tuple]]) -> List[Tuple[tuple, float]]:
+        """Funde listas ordenadas: score = Σ 1 / (RRF_K + posição)"""
+        scores: Dict[Tuple[int, int], float] = {}
+        rows: Dict[Tuple[int, int], tuple] = {}
+        
+        for ranked in ranked_lists:
+            for position, row in enumerate(ranked, start=1):
+                key = (row[0], row[6])  # (document_id, chunk_index)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + position)
+                rows.setdefault(key, row)
+        
+        ordered = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(rows[key], score) for key, score in ordered]
+    
+    async def lexical_candidates(
+        self,
+        expanded_query: List[str],
+        filters: Dict[str, Any],
+        limit: int = 50
+    ) -> List[tuple]:
+        """
+        Candidatos full-text ao nível do chunk, ordenados por ts_rank sobre a
+        coluna tsvector materializada, no mesmo formato de linha que _build_search_query
+        """
+        if not expanded_query:
+            return []
+        
+        publication_date = "(ld.metadata->>'publication_date')::date"
+        conditions, params = self._build_filter_conditions(filters, date_column=publication_date)
+        
+        sql = f"""
+        SELECT
+            ld.id,
+            ld.title,
+            COALESCE(dc.chunk_text, dc.content),
+            ld.document_type,
+            ld.legal_area,
+            {publication_date} AS date_published,
+            dc.chunk_index,
+            ld.description,
+            ld.metadata->'keywords' AS keywords
+        FROM document_chunks dc
+        JOIN legal_documents ld ON ld.id = dc.document_id
+        CROSS JOIN websearch_to_tsquery('portuguese', %s) q
+        WHERE {tsv_match_sql('dc.tsv')}
+        """
+        if conditions:
+            sql += " AND " + " AND ".join(conditions)
+        sql += f" ORDER BY {tsv_rank_sql('COALESCE(dc.tsv_weighted, dc.tsv)')} DESC LIMIT %s"
+        
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor(row_factory=tuple_row) as cursor:
+                await cursor.execute(sql, [" or ".join(expanded_query), *params, limit])
+                return await cursor.fetchall()
+    
     def _expand_query(self, query: str) -> List[str]:
         """Expande a query com sinónimos e termos relacionados"""
         synonyms = {
@@ -149,6 +259,86 @@ class AdvancedRAGService:
                 
         return concepts
     
+    def _build_filter_conditions(
+        self,
+        filters: Dict[str, Any],
+        date_column: str = "ld.date_published"
+    ) -> Tuple[List[str], List[Any]]:
+        """Condições SQL para os filtros de tipo, área e data"""
+        conditions = []
+        params = []
+        
+        # Filtro por tipo de documento
+        if filters.get('documentType'):
+            conditions.append("ld.document_type = %s")
+            params.append(int(filters['documentType']))
+        
+        # Filtro por área legal
+        if filters.get('legalArea'):
+            conditions.append("ld.legal_area = %s")
+            params.append(int(filters['legalArea']))
+        
+        # Filtro por data
+        if filters.get('dateRange'):
+            if filters['dateRange'] == 'recent':
+                conditions.append(f"{date_column} >= CURRENT_DATE - INTERVAL '2 years'")
+            elif filters['dateRange'] == 'last_5_years':
+                conditions.append(f"{date_column} >= CURRENT_DATE - INTERVAL '5 years'")
+        
+        return conditions, params
+    
+    async def semantic_candidates(
+        self,
+        query: str,
+        filters: Dict[str, Any],
+        limit: int = 50
+    ) -> List[tuple]:
+        """
+        Candidatos por similaridade vectorial (top-k no índice de embeddings),
+        no mesmo formato de linha que _build_search_query
+        """
+        hits = await self.embedding_service.search(self.db_pool, query, k=limit)
+        if not hits:
+            return []
+        
+        publication_date = "(ld.metadata->>'publication_date')::date"
+        conditions, params = self._build_filter_conditions(filters, date_column=publication_date)
+        
+        sql = f"""
+        SELECT
+            ld.id,
+            ld.title,
+            de.chunk_text,
+            ld.document_type,
+            ld.legal_area,
+            {publication_date} AS date_published,
+            de.chunk_index,
+            ld.description,
+            ld.metadata->'keywords' AS keywords
+        FROM document_embeddings de
+        JOIN legal_documents ld ON ld.id = de.document_id
+        JOIN unnest(%s::int[], %s::int[]) AS hit(document_id, chunk_index)
+            ON hit.document_id = de.document_id AND hit.chunk_index = de.chunk_index
+        WHERE de.embedding_model = %s
+        """
+        if conditions:
+            sql += " AND " + " AND ".join(conditions)
+        
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor(row_factory=tuple_row) as cursor:
+                await cursor.execute(sql, [
+                    [hit[0] for hit in hits],
+                    [hit[1] for hit in hits],
+                    self.embedding_service.model_name,
+                    *params
+                ])
+                rows = await cursor.fetchall()
+        
+        # Manter a ordem de similaridade do índice
+        rank = {(hit[0], hit[1]): position for position, hit in enumerate(hits)}
+        rows.sort(key=lambda row: rank.get((row[0], row[6]), len(rank)))
+        return rows
+    
     def _build_search_query(self, expanded_query: List[str], filters: Dict[str, Any]) -> Dict[str, Any]:
         """Constrói query SQL com filtros avançados"""
         base_query = """
@@ -175,22 +365,9 @@ class AdvancedRAGService:
             conditions.append("to_tsvector('portuguese', ld.content || ' ' || ld.title) @@ plainto_tsquery('portuguese', %s)")
             params.append(search_terms)
         
-        # Filtro por tipo de documento
-        if filters.get('documentType'):
-            conditions.append("ld.document_type = %s")
-            params.append(int(filters['documentType']))
-        
-        # Filtro por área legal
-        if filters.get('legalArea'):
-            conditions.append("ld.legal_area = %s")
-            params.append(int(filters['legalArea']))
-        
-        # Filtro por data
-        if filters.get('dateRange'):
-            if filters['dateRange'] == 'recent':
-                conditions.append("ld.date_published >= CURRENT_DATE - INTERVAL '2 years'")
-            elif filters['dateRange'] == 'last_5_years':
-                conditions.append("ld.date_published >= CURRENT_DATE - INTERVAL '5 years'")
+        filter_conditions, filter_params = self._build_filter_conditions(filters)
+        conditions.extend(filter_conditions)
+        params.extend(filter_params)
         
         # Combinar condições
         if conditions:
@@ -205,37 +382,74 @@ class AdvancedRAGService:
             'params': params
         }
     
-    def _calculate_advanced_relevance(
-        self, 
-        original_query: str, 
-        expanded_query: List[str], 
+    def _calculate_batch_relevance(
+        self,
+        original_query: str,
         legal_concepts: Dict[str, float],
-        result: tuple
-    ) -> float:
-        """Calcula score de relevância avançado considerando múltiplos fatores"""
+        results: List[tuple]
+    ) -> np.ndarray:
+        """
+        Score de relevância de todos os candidatos de uma vez. Cada conteúdo e cada
+        título são percorridos uma única vez para contar os termos da query e as
+        keywords das áreas detectadas; os scores saem de operações de matriz.
+        """
+        n = len(results)
+        if n == 0:
+            return np.zeros(0)
+        
+        contents = [result[2].lower() for result in results]
+        titles = [result[1].lower() for result in results]
         
-        content = result[2].lower()
-        title = result[1].lower()
-        doc_type = result[3] if result[3] else 0
-        legal_area = result[4] if result[4] else 0
-        date_published = result[5]
+        query_terms = original_query.lower().split()
+        area_keywords = {
+            area: self.legal_keywords[area] for area in legal_concepts if area in self.legal_keywords
+        }
         
-        # 1. Score textual básico (TF-IDF simplificado)
-        text_score = self._calculate_text_relevance(original_query, content, title)
+        # Vocabulário: termos da query seguidos das keywords das áreas
+        vocabulary = list(dict.fromkeys(
+            query_terms + [keyword for keywords in area_keywords.values() for keyword in keywords]
+        ))
+        column = {term: j for j, term in enumerate(vocabulary)}
+        content_counts = self._term_count_matrix(contents, vocabulary)
+        
+        # 1. Score textual (TF simplificado): colunas repetidas contam como na query
+        if query_terms:
+            query_columns = [column[term] for term in query_terms]
+            query_vocabulary = list(dict.fromkeys(query_terms))
+            title_counts = self._term_count_matrix(titles, query_vocabulary)
+            title_columns = [query_vocabulary.index(term) for term in query_terms]
+            
+            title_score = (title_counts[:, title_columns] > 0).sum(axis=1) / len(query_terms)
+            
+            word_counts = np.fromiter((len(content.split()) for content in contents), dtype=np.float64, count=n)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                tf = np.where(content_counts > 0, content_counts / word_counts[:, None], 0.0)
+            content_score = tf[:, query_columns].sum(axis=1) / len(query_terms)
+            
+            text_score = title_score * 0.6 + content_score * 0.4
+        else:
+            text_score = np.zeros(n)
         
         # 2. Score por área legal
-        area_score = legal_concepts.get(str(legal_area), 0) * 0.3
+        area_score = np.fromiter(
+            (legal_concepts.get(str(result[4] if result[4] else 0), 0) for result in results),
+            dtype=np.float64, count=n
+        ) * 0.3
         
-        # 3. Score hierárquico (documentos de maior hierarquia têm mais peso)
-        hierarchy_score = self._get_hierarchy_weight(doc_type) * 0.2
+        # 3. Score hierárquico
+        hierarchy_score = np.fromiter(
+            (self._get_hierarchy_weight(result[3] if result[3] else 0) for result in results),
+            dtype=np.float64, count=n
+        ) * 0.2
         
-        # 4. Score temporal (documentos mais recentes têm ligeiro boost)
-        temporal_score = self._get_temporal_weight(date_published) * 0.1
+        # 4. Score temporal
+        temporal_score = self._batch_temporal_weights([result[5] for result in results]) * 0.1
         
-        # 5. Score de especificidade (termos específicos da área)
-        specificity_score = self._calculate_specificity_score(content, legal_concepts) * 0.2
+        # 5. Score de especificidade
+        specificity_score = self._batch_specificity_scores(
+            content_counts, column, area_keywords, legal_concepts
+        ) * 0.2
         
-        # Combinar scores com pesos
         final_score = (
             text_score * 0.4 +
             area_score +
@@ -244,31 +458,72 @@ class AdvancedRAGService:
             specificity_score
         )
         
-        # Normalizar para 0-1
-        return min(max(final_score, 0), 1)
+        return np.clip(final_score, 0, 1)
     
-    def _calculate_text_relevance(self, query: str, content: str, title: str) -> float:
-        """Calcula relevância textual usando TF-IDF simplificado"""
-        query_terms = query.lower().split()
-        
-        # Score no título (peso maior)
-        title_score = sum(1 for term in query_terms if term in title) / len(query_terms)
-        
-        # Score no conteúdo
-        content_words = content.split()
-        content_score = 0
-        
-        for term in query_terms:
-            term_count = content.count(term)
-            if term_count > 0:
-                # TF normalizado
-                tf = term_count / len(content_words)
-                content_score += tf
+    def _term_count_matrix(self, texts: List[str], vocabulary: List[str]) -> np.ndarray:
+        """
+        Matriz (textos × vocabulário) de ocorrências, com uma passagem Aho-Corasick
+        por texto. Ocorrências do mesmo termo não se sobrepõem, como em str.count.
+        """
+        counts = np.zeros((len(texts), len(vocabulary)))
+        if not vocabulary:
+            return counts
+        
+        matcher = LegalTermMatcher({'vocabulary': vocabulary})
+        column = {term: j for j, term in enumerate(vocabulary)}
+        rows, columns = [], []
+        for i, text in enumerate(texts):
+            next_start: Dict[str, int] = {}
+            for start, term, _ in matcher.iter_matches(text):
+                if start >= next_start.get(term, 0):
+                    next_start[term] = start + len(term)
+                    rows.append(i)
+                    columns.append(column[term])
+        
+        # Triplos esparsos (linha, coluna, 1) acumulados na matriz
+        np.add.at(counts, (rows, columns), 1)
+        return counts
+    
+    def _batch_temporal_weights(self, dates: List[Any]) -> np.ndarray:
+        """Pesos temporais para um lote de datas (mesmos escalões de _get_temporal_weight)"""
+        today = datetime.now().date()
+        years_old = np.full(len(dates), np.nan)
+        
+        for i, date_published in enumerate(dates):
+            if not date_published:
+                continue
+            try:
+                years_old[i] = (today - date_published).days / 365.25
+            except Exception:
+                pass
+        
+        return np.select(
+            [np.isnan(years_old), years_old < 1, years_old < 5, years_old < 10],
+            [0.5, 1.0, 0.8, 0.6],
+            default=0.4
+        )
+    
+    def _batch_specificity_scores(
+        self,
+        content_counts: np.ndarray,
+        column: Dict[str, int],
+        area_keywords: Dict[str, List[str]],
+        legal_concepts: Dict[str, float]
+    ) -> np.ndarray:
+        """Fracção de keywords de cada área presentes, ponderada pelo peso da área"""
+        n = content_counts.shape[0]
+        if not legal_concepts:
+            return np.full(n, 0.5)
+        if not area_keywords:
+            return np.zeros(n)
         
-        content_score = content_score / len(query_terms)
+        # Pesos (vocabulário × 1): cada keyword vale peso_da_área / nº de keywords
+        weights = np.zeros(content_counts.shape[1])
+        for area, keywords in area_keywords.items():
+            for keyword in keywords:
+                weights[column[keyword]] += legal_concepts[area] / len(keywords)
         
-        # Combinar com peso para título
-        return title_score * 0.6 + content_score * 0.4
+        return np.minimum((content_counts > 0) @ weights, 1.0)
     
     def _get_hierarchy_weight(self, doc_type: int) -> float:
         """Retorna peso baseado na hierarquia legal"""
@@ -304,25 +559,6 @@ class AdvancedRAGService:
                 return 0.4
         except:
             return 0.5
-    
-    def _calculate_specificity_score(self, content: str, legal_concepts: Dict[str, float]) -> float:
-        """Calcula score baseado em termos específicos da área legal"""
-        if not legal_concepts:
-            return 0.5
-        
-        specificity_score = 0
-        content_lower = content.lower()
-        
-        for area, score in legal_concepts.items():
-            if area in self.legal_keywords:
-                area_terms_found = sum(
-                    1 for keyword in self.legal_keywords[area] 
-                    if keyword in content_lower
-                )
-                area_specificity = area_terms_found / len(self.legal_keywords[area])
-                specificity_score += area_specificity * score
-        
-        return min(specificity_score, 1.0)
 
 class CitationAnalyzer:
     """Analisa e extrai citações legais de documentos"""
@@ -378,6 +614,6 @@ class CitationAnalyzer:
             return 'desconhecido'
 
 # Função de utilidade para integração com o backend
-def create_advanced_rag_service(db_connection):
+def create_advanced_rag_service(db_pool: DatabasePool, embedding_service: Optional[EmbeddingService] = None):
     """Factory function para criar o serviço RAG avançado"""
-    return AdvancedRAGService(db_connection)
\ No newline at end of file
+    return AdvancedRAGService(db_pool, embedding_service)
\ No newline at end of file
@@ -0,0 +1,298 @@
+"""
+Answer Cache - Cache de respostas do orquestrador de LLMs
+A chave combina a pergunta normalizada com a impressão digital dos chunks
+recuperados; opcionalmente aceita perguntas semelhantes (similaridade de
+embeddings) sobre o mesmo contexto. Entradas são invalidadas por documento;
+com Redis, uma versão por documento propaga a invalidação a todos os workers.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from services.embedding_service import embedding_service
+
+try:
+    from app.services.redis_pool import RedisUnavailable, shared_redis
+    SHARED_REDIS_AVAILABLE = True
+except (ImportError, ValueError):
+    # Pacote app ausente ou configuração incompleta: invalidação só local
+    SHARED_REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+CacheKey = Tuple[str, str]  # (impressão digital do contexto, pergunta normalizada)
+
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sem acentos nem pontuação: "Como registar uma Empresa?" == "como registar uma empresa" """
+    decomposed = unicodedata.normalize('NFKD', query.lower())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(_WORD_PATTERN.findall(stripped))
+
+
+def context_fingerprint(chunk_ids: Iterable[Any]) -> str:
+    """Hash dos IDs dos chunks recuperados (independente da ordem)"""
+    joined = ','.join(sorted({str(chunk_id) for chunk_id in chunk_ids}))
+    return hashlib.sha1(joined.encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    Cache LRU em memória com TTL. Só guarda respostas com sucesso; cada entrada
+    regista os documentos citados para invalidação quando mudam ou são removidos.
+
+    Com Redis, cada entrada guarda também a versão dos seus documentos e é
+    validada no get: invalidate_documents noutro processo incrementa a versão.
+    Sem Redis acessível a invalidação fica limitada ao processo local.
+    """
+
+    VERSION_KEY_PREFIX = "answer_cache:doc_version:"
+
+    def __init__(
+        self,
+        ttl_seconds: int = 3600,
+        max_entries: int = 5000,
+        embed: Optional[Callable[[List[str]], Awaitable[np.ndarray]]] = None,
+        similarity_threshold: float = 0.0,
+        enabled: bool = True,
+        redis=None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Procura por similaridade só com função de embeddings e limiar > 0
+        self.embed = embed if similarity_threshold > 0 else None
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled
+        self.redis = redis
+
+        self._entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+        self._by_context: Dict[str, Set[str]] = {}
+        self._by_document: Dict[Any, Set[CacheKey]] = {}
+
+        self.stats = {
+            'hits': 0,
+            'similar_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    async def get(self, query: str, chunk_ids: Iterable[Any]) -> Optional[Dict[str, Any]]:
+        """Resposta guardada para a pergunta e o contexto recuperado, ou None"""
+        if not self.enabled:
+            return None
+
+        fingerprint = context_fingerprint(chunk_ids)
+        normalized = normalize_query(query)
+
+        entry = self._lookup((fingerprint, normalized))
+        if entry is None and self.embed and self._by_context.get(fingerprint):
+            entry = await self._lookup_similar(fingerprint, normalized)
+            if entry is not None:
+                self.stats['similar_hits'] += 1
+
+        if entry is not None and not await self._is_current(entry):
+            self._remove(entry['key'])
+            self.stats['invalidations'] += 1
+            entry = None
+
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return entry['answer']
+
+    async def set(
+        self,
+        query: str,
+        chunk_ids: Iterable[Any],
+        document_ids: Iterable[Any],
+        answer: Dict[str, Any]
+    ):
+        """Guarda a resposta; document_ids são os documentos citados no contexto"""
+        if not self.enabled:
+            return
+
+        fingerprint = context_fingerprint(chunk_ids)
+        normalized = normalize_query(query)
+        key = (fingerprint, normalized)
+
+        vector = None
+        if self.embed:
+            try:
+                vector = (await self.embed([normalized]))[0]
+            except Exception as e:
+                logger.warning(f"Embedding da pergunta falhou, entrada sem similaridade: {e}")
+
+        self._remove(key)
+        documents = set(document_ids)
+        self._entries[key] = {
+            'key': key,
+            'answer': answer,
+            'documents': documents,
+            'versions': await self._document_versions(documents),
+            'vector': vector,
+            'expires_at': time.monotonic() + self.ttl_seconds
+        }
+        self._by_context.setdefault(fingerprint, set()).add(normalized)
+        for document_id in documents:
+            self._by_document.setdefault(document_id, set()).add(key)
+        self.stats['sets'] += 1
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+
+    async def invalidate_documents(self, document_ids: Iterable[Any]) -> int:
+        """
+        Remove as respostas que citam algum dos documentos (devolve quantas no
+        processo local) e incrementa as versões no Redis para os outros workers
+        """
+        document_ids = list(document_ids)
+        await self._bump_versions(document_ids)
+
+        removed = 0
+        for document_id in document_ids:
+            for key in self._by_document.pop(document_id, set()):
+                if self._remove(key):
+                    removed += 1
+        if removed:
+            self.stats['invalidations'] += removed
+            logger.info(f"Cache de respostas: {removed} entradas invalidadas")
+        return removed
+
+    def clear(self):
+        self._entries.clear()
+        self._by_context.clear()
+        self._by_document.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_ratio': round(self.stats['hits'] / lookups * 100, 2) if lookups else 0.0,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'similarity_threshold': self.similarity_threshold if self.embed else None,
+            'enabled': self.enabled
+        }
+
+    def _version_keys(self, documents: Iterable[Any]) -> List[str]:
+        return [f"{self.VERSION_KEY_PREFIX}{document_id}" for document_id in sorted(documents, key=str)]
+
+    async def _document_versions(self, documents: Set[Any]) -> Optional[Tuple[int, ...]]:
+        """Versões actuais dos documentos (ordenados), ou None sem Redis"""
+        if self.redis is None or not documents or not self.redis.is_available():
+            return None
+        keys = self._version_keys(documents)
+        try:
+            replies = await self.redis.execute(lambda client: client.mget(keys))
+        except RedisUnavailable:
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao ler versões de documentos no Redis: {e}")
+            return None
+        return tuple(int(reply or 0) for reply in replies)
+
+    async def _bump_versions(self, document_ids: List[Any]):
+        async def operation(client):
+            async with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.incr(key)
+                    # Versão expirada volta a 0 e também difere: entradas antigas são descartadas
+                    pipe.expire(key, self.ttl_seconds * 2)
+                return await pipe.execute()
+
+        if self.redis is None or not document_ids or not self.redis.is_available():
+            return
+        keys = self._version_keys(document_ids)
+        try:
+            await self.redis.execute(operation)
+        except RedisUnavailable:
+            logger.warning("Redis indisponível: invalidação do cache de respostas só local")
+        except Exception as e:
+            logger.error(f"Erro ao incrementar versões de documentos no Redis: {e}")
+
+    async def _is_current(self, entry: Dict[str, Any]) -> bool:
+        """False se outro processo invalidou algum documento da entrada"""
+        current = await self._document_versions(entry['documents'])
+        if current is None:
+            # Sem Redis agora: vale a invalidação local
+            return True
+        # Entradas guardadas sem Redis não podem ser validadas
+        return entry['versions'] == current
+
+    def _lookup(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry['expires_at']:
+            self._remove(key)
+            self.stats['expired'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _lookup_similar(self, fingerprint: str, normalized: str) -> Optional[Dict[str, Any]]:
+        """Pergunta mais semelhante com o mesmo contexto, acima do limiar"""
+        try:
+            query_vector = (await self.embed([normalized]))[0]
+        except Exception as e:
+            logger.warning(f"Embedding da pergunta falhou: {e}")
+            return None
+
+        best_key, best_score = None, self.similarity_threshold
+        for candidate in list(self._by_context.get(fingerprint, ())):
+            vector = self._entries[(fingerprint, candidate)]['vector']
+            if vector is None:
+                continue
+            # Vectores normalizados L2: produto interno = similaridade de cosseno
+            score = float(np.dot(query_vector, vector))
+            if score >= best_score:
+                best_key, best_score = (fingerprint, candidate), score
+
+        return self._lookup(best_key) if best_key else None
+
+    def _remove(self, key: CacheKey) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+
+        fingerprint, normalized = key
+        queries = self._by_context.get(fingerprint)
+        if queries is not None:
+            queries.discard(normalized)
+            if not queries:
+                del self._by_context[fingerprint]
+        for document_id in entry['documents']:
+            keys = self._by_document.get(document_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_document[document_id]
+        return True
+
+
+# Instância global do cache de respostas
+_similarity_threshold = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0))
+answer_cache = AnswerCache(
+    ttl_seconds=int(os.getenv('ANSWER_CACHE_TTL', 3600)),
+    max_entries=int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 5000)),
+    embed=embedding_service.embed_texts if _similarity_threshold > 0 else None,
+    similarity_threshold=_similarity_threshold,
+    enabled=os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true',
+    redis=shared_redis if SHARED_REDIS_AVAILABLE else None
+)
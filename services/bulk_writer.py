@@ -0,0 +1,53 @@
+"""
+Bulk Writer - Inserção em massa com COPY FROM STDIN
+Envia as linhas em lotes de COPY dentro da transacção do chamador,
+em vez de um INSERT (e uma ida ao servidor) por linha
+"""
+import os
+from typing import Callable, Iterable, Optional, Sequence
+
+from psycopg import sql
+
+# Linhas por instrução COPY (cada lote é uma ida ao servidor)
+COPY_BATCH_SIZE = int(os.getenv('BULK_COPY_BATCH_SIZE', 5000))
+
+
+async def copy_rows(
+    cur,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+    batch_size: int = COPY_BATCH_SIZE,
+    on_batch: Optional[Callable[[int], None]] = None
+) -> int:
+    """
+    Copia as linhas para a tabela na transacção do cursor (o commit é do chamador).
+    on_batch recebe o total de linhas escritas após cada lote.
+    """
+    statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join(sql.Identifier(column) for column in columns)
+    )
+    batch_size = max(1, batch_size)
+    written = 0
+    batch = []
+
+    async def flush():
+        nonlocal written
+        async with cur.copy(statement) as copy:
+            for row in batch:
+                await copy.write_row(row)
+        written += len(batch)
+        batch.clear()
+        if on_batch:
+            on_batch(written)
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+
+    return written
@@ -5,29 +5,14 @@ Provides automated complexity rating for legal texts
 
 from typing import Dict, Any
 
+from models.legal_terms import SERVICE_LEGAL_TERMS, SERVICE_COMPLEX_CONCEPTS, legal_term_matcher
+
 class ComplexityService:
     """Service for analyzing legal text complexity"""
     
     def __init__(self):
-        self.legal_terms = [
-            'constituição', 'código civil', 'código penal', 'código comercial',
-            'habeas corpus', 'mandado de segurança', 'usucapião', 'prescrição',
-            'jurisprudência', 'acórdão', 'recurso', 'apelação', 'cassação',
-            'responsabilidade civil', 'danos morais', 'indenização',
-            'contrato', 'obrigação', 'direito real', 'propriedade',
-            'sucessão', 'herança', 'testamento', 'inventário',
-            'processo civil', 'processo penal', 'processo administrativo',
-            'tribunal', 'sentença', 'decisão judicial', 'competência',
-            'jurisdição', 'legitimidade', 'interesse processual'
-        ]
-        
-        self.complex_concepts = [
-            'interpretação constitucional', 'aplicação da lei', 'hermenêutica jurídica',
-            'princípios gerais do direito', 'analogia legal', 'lacuna da lei',
-            'retroatividade', 'irretroatividade', 'direito adquirido',
-            'ato jurídico perfeito', 'coisa julgada', 'devido processo legal',
-            'contraditório', 'ampla defesa', 'presunção de inocência'
-        ]
+        self.legal_terms = SERVICE_LEGAL_TERMS
+        self.complex_concepts = SERVICE_COMPLEX_CONCEPTS
         
         self.complexity_weights = {
             'basic_legal_term': 1,
@@ -48,7 +33,8 @@ class ComplexityService:
         Returns:
             Dictionary with complexity analysis results
         """
-        text_lower = text.lower()
+        # Single pass over the text for every term
+        found_terms = legal_term_matcher.find_terms(text)
         complexity_score = 0
         analysis_details = {
             'legal_terms_found': [],
@@ -58,16 +44,14 @@ class ComplexityService:
         }
         
         # Check for legal terms
-        for term in self.legal_terms:
-            if term in text_lower:
-                complexity_score += self.complexity_weights['basic_legal_term']
-                analysis_details['legal_terms_found'].append(term)
+        for term in legal_term_matcher.terms_in(found_terms, self.legal_terms):
+            complexity_score += self.complexity_weights['basic_legal_term']
+            analysis_details['legal_terms_found'].append(term)
         
         # Check for complex concepts
-        for concept in self.complex_concepts:
-            if concept in text_lower:
-                complexity_score += self.complexity_weights['complex_concept']
-                analysis_details['complex_concepts_found'].append(concept)
+        for concept in legal_term_matcher.terms_in(found_terms, self.complex_concepts):
+            complexity_score += self.complexity_weights['complex_concept']
+            analysis_details['complex_concepts_found'].append(concept)
         
         # Text length factors
         if len(text) > 500:
@@ -0,0 +1,127 @@
+"""
+Database Pool - Pool assíncrono de conexões PostgreSQL
+Substitui o psycopg2.connect por pedido por um pool partilhado pelo processo
+"""
+import os
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class DatabasePool:
+    """Pool de conexões assíncronas com verificação de saúde e reciclagem"""
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 2,
+        max_size: int = 10,
+        acquire_timeout: float = 10.0,
+        max_lifetime: float = 1800.0,
+        max_idle: float = 300.0
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self._pool: Optional[AsyncConnectionPool] = None
+
+    @classmethod
+    def from_env(cls, dsn: Optional[str] = None) -> "DatabasePool":
+        """Cria pool a partir das variáveis de ambiente DB_POOL_*"""
+        return cls(
+            dsn=dsn or os.getenv('DATABASE_URL', ''),
+            min_size=int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            max_size=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            acquire_timeout=float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 10)),
+            max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            max_idle=float(os.getenv('DB_POOL_MAX_IDLE', 300))
+        )
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    async def open(self):
+        """Abre o pool e aguarda pelas conexões mínimas"""
+        if self._pool is not None:
+            return
+
+        pool = AsyncConnectionPool(
+            conninfo=self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            timeout=self.acquire_timeout,
+            max_lifetime=self.max_lifetime,
+            max_idle=self.max_idle,
+            kwargs={'row_factory': dict_row},
+            # Conexões partidas são descartadas antes de serem entregues
+            check=AsyncConnectionPool.check_connection,
+            open=False
+        )
+        await pool.open(wait=True, timeout=self.acquire_timeout)
+        self._pool = pool
+        logger.info(f"✓ Pool de base de dados aberto ({self.min_size}-{self.max_size} conexões)")
+
+    async def close(self):
+        """Fecha o pool e todas as conexões"""
+        if self._pool is None:
+            return
+
+        await self._pool.close()
+        self._pool = None
+        logger.info("Pool de base de dados fechado")
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncConnection]:
+        """
+        Obtém uma conexão do pool.
+        A transacção é confirmada à saída e revertida se houver excepção.
+        """
+        if self._pool is None:
+            await self.open()
+
+        async with self._pool.connection() as conn:
+            yield conn
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas do pool (conexões em uso, em espera, etc.)"""
+        if self._pool is None:
+            return {'open': False}
+
+        stats = self._pool.get_stats()
+        return {
+            'open': True,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'pool_size': stats.get('pool_size', 0),
+            'pool_available': stats.get('pool_available', 0),
+            'requests_waiting': stats.get('requests_waiting', 0),
+            'requests_num': stats.get('requests_num', 0),
+            'requests_errors': stats.get('requests_errors', 0),
+            'connections_lost': stats.get('connections_lost', 0)
+        }
+
+
+# Instância global do pool (aberta no startup da aplicação)
+db_pool = DatabasePool.from_env()
+
+
+async def get_db_pool() -> DatabasePool:
+    """Dependency FastAPI que devolve o pool partilhado"""
+    return db_pool
+
+
+async def get_db() -> AsyncIterator[AsyncConnection]:
+    """Dependency FastAPI que empresta uma conexão durante o pedido"""
+    async with db_pool.connection() as conn:
+        yield conn
+
@@ -5,46 +5,77 @@ Integra com a hierarquia legal e chunking inteligente
 import os
 import re
 import json
+import asyncio
 import hashlib
 import chardet
-from typing import List, Dict, Any, Optional, Union
+from typing import Callable, List, Dict, Any, Optional, Union
 from pathlib import Path
 from datetime import datetime
 
-# Document processing imports
+# Document processing imports (PyPDF2 é usado pelo pdf_extractor)
 try:
-    import PyPDF2
-    import docx
     from docx import Document
-    PDF_AVAILABLE = True
     DOCX_AVAILABLE = True
 except ImportError:
-    PDF_AVAILABLE = False
     DOCX_AVAILABLE = False
 
 from models.legal_document_hierarchy import (
     LegalDocumentHierarchy, LegalDocumentType, LegalArea, DocumentMetadata
 )
 from services.legal_chunker import LegalChunker, LegalChunk
+from services.db_pool import DatabasePool
+from services.embedding_service import EmbeddingService, embedding_service as default_embedding_service
+from services.pdf_extractor import PDF_AVAILABLE, pdf_extractor
+from services.bulk_writer import copy_rows
+from services.answer_cache import answer_cache
+from psycopg import OperationalError
+from psycopg.rows import tuple_row
+from psycopg.types.json import Jsonb
+
+# Colunas escritas por COPY em document_chunks
+CHUNK_COLUMNS = ('document_id', 'content', 'chunk_index', 'metadata', 'created_at')
+
+# Falhas transitórias (ligação/pool, deadlock, timeouts, I/O) podem ser repetidas.
+# OperationalError cobre também PoolTimeout, deadlocks e statement_timeout.
+TRANSIENT_ERRORS = (OperationalError, ConnectionError, TimeoutError, asyncio.TimeoutError, OSError)
+# Erros de ficheiro que uma nova tentativa não resolve
+PERMANENT_OS_ERRORS = (FileNotFoundError, PermissionError, IsADirectoryError, NotADirectoryError)
+
+
+class IngestionCancelled(Exception):
+    """O job foi cancelado (ou reclamado por outro worker) antes de ser concluído"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """True para erros transitórios; dados inválidos e bugs falham de imediato"""
+    return isinstance(error, TRANSIENT_ERRORS) and not isinstance(error, PERMANENT_OS_ERRORS)
 
 class DocumentIngestor:
     """Sistema de ingestão e processamento de documentos legais"""
     
-    def __init__(self, db_connection_factory):
-        self.db_connection = db_connection_factory
+    def __init__(self, db_pool: DatabasePool, embedding_service: Optional[EmbeddingService] = None):
+        self.db_pool = db_pool
+        self.embedding_service = embedding_service or default_embedding_service
         self.chunker = LegalChunker(max_chunk_size=1000, overlap_size=200)
         self.supported_formats = ['.pdf', '.docx', '.txt']
         
         # Cache para evitar reprocessamento
         self.processed_hashes = set()
         
-    def process_document(
+    async def process_document(
         self, 
         file_path: str, 
         original_filename: str,
-        override_metadata: Optional[Dict[str, Any]] = None
+        override_metadata: Optional[Dict[str, Any]] = None,
+        upload_id: Optional[int] = None,
+        progress_callback: Optional[Callable[..., None]] = None
     ) -> Dict[str, Any]:
-        """Processa documento legal completo com metadados e chunking"""
+        """
+        Processa documento legal completo com metadados e chunking.
+        upload_id actualiza um registo existente de uploaded_documents em vez de criar um;
+        progress_callback recebe campos de progresso (stage, pages_total, chunks_written, ...)
+        """
+        report = progress_callback or (lambda **fields: None)
         
         try:
             # Validações iniciais
@@ -55,8 +86,9 @@ class DocumentIngestor:
             if file_extension not in self.supported_formats:
                 return {'success': False, 'error': f'Formato não suportado: {file_extension}'}
             
-            # Extrair texto do documento
-            extracted_text = self._extract_text(file_path, file_extension)
+            # Extrair texto do documento (fora do event loop)
+            report(stage='extracting')
+            extracted_text = await asyncio.to_thread(self._extract_text, file_path, file_extension, report)
             if not extracted_text or len(extracted_text.strip()) < 50:
                 return {'success': False, 'error': 'Documento vazio ou muito pequeno'}
             
@@ -76,7 +108,9 @@ class DocumentIngestor:
             )
             
             # Processar chunks com chunker legal
-            chunks = self.chunker.chunk_legal_document(
+            report(stage='chunking')
+            chunks = await asyncio.to_thread(
+                self.chunker.chunk_legal_document,
                 text=extracted_text,
                 title=title,
                 legal_area=doc_metadata.legal_area,
@@ -84,13 +118,15 @@ class DocumentIngestor:
             )
             
             # Salvar no banco de dados
-            document_id = self._save_to_database(
+            document_id = await self._save_to_database(
                 doc_metadata, 
                 extracted_text, 
                 chunks, 
                 content_hash,
                 original_filename,
-                file_path
+                file_path,
+                upload_id=upload_id,
+                report=report
             )
             
             # Adicionar hash ao cache
@@ -118,14 +154,25 @@ class DocumentIngestor:
                 }
             }
             
+        except IngestionCancelled as e:
+            return {'success': False, 'error': str(e), 'cancelled': True}
         except Exception as e:
-            return {'success': False, 'error': f'Erro no processamento: {str(e)}'}
+            return {
+                'success': False,
+                'error': f'Erro no processamento: {str(e)}',
+                'retryable': is_retryable_error(e)
+            }
     
-    def _extract_text(self, file_path: str, file_extension: str) -> str:
+    def _extract_text(
+        self,
+        file_path: str,
+        file_extension: str,
+        report: Optional[Callable[..., None]] = None
+    ) -> str:
         """Extrai texto baseado no tipo de arquivo"""
         
         if file_extension == '.pdf':
-            return self._extract_pdf_text(file_path)
+            return self._extract_pdf_text(file_path, report)
         elif file_extension == '.docx':
             return self._extract_docx_text(file_path)
         elif file_extension == '.txt':
@@ -133,23 +180,26 @@ class DocumentIngestor:
         else:
             raise ValueError(f"Formato não suportado: {file_extension}")
     
-    def _extract_pdf_text(self, file_path: str) -> str:
-        """Extrai texto de arquivo PDF"""
+    def _extract_pdf_text(self, file_path: str, report: Optional[Callable[..., None]] = None) -> str:
+        """Extrai texto de arquivo PDF (páginas extraídas em paralelo, limpas à medida que chegam)"""
         if not PDF_AVAILABLE:
             raise ImportError("PyPDF2 não disponível para processamento de PDF")
         
-        text = ""
+        # Limpar página a página e juntar com espaço equivale a limpar o texto
+        # completo, já que _clean_extracted_text colapsa todo o espaço em branco
+        report = report or (lambda **fields: None)
+        pages = []
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n\n"
+            report(pages_total=pdf_extractor.count_pages(file_path), pages_extracted=0)
+            for page_number, page_text in enumerate(pdf_extractor.iter_pages(file_path), start=1):
+                page_text = self._clean_extracted_text(page_text)
+                if page_text:
+                    pages.append(page_text)
+                report(pages_extracted=page_number)
         except Exception as e:
             raise ValueError(f"Erro ao extrair texto do PDF: {str(e)}")
         
-        return self._clean_extracted_text(text)
+        return " ".join(pages)
     
     def _extract_docx_text(self, file_path: str) -> str:
         """Extrai texto de arquivo DOCX"""
@@ -252,21 +302,28 @@ class DocumentIngestor:
             'muito_complexo': complexity_dist[4]
         }
     
-    def _save_to_database(
+    async def _save_to_database(
         self, 
         doc_metadata: DocumentMetadata, 
         full_text: str,
         chunks: List[LegalChunk],
         content_hash: str,
         original_filename: str,
-        file_path: str
+        file_path: str,
+        upload_id: Optional[int] = None,
+        report: Optional[Callable[..., None]] = None
     ) -> int:
         """Salva documento e chunks no banco de dados"""
+        report = report or (lambda **fields: None)
+        
+        # Embeddings calculados antes de abrir a transacção
+        report(stage='embedding', chunks_total=len(chunks), chunks_written=0)
+        chunk_vectors = await self.embedding_service.embed_texts([chunk.content for chunk in chunks])
         
-        with self.db_connection() as conn:
-            with conn.cursor() as cur:
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
                 # Inserir documento principal
-                cur.execute("""
+                await cur.execute("""
                     INSERT INTO legal_documents (
                         title, content, metadata, content_hash, 
                         document_type, legal_area, created_at
@@ -293,47 +350,74 @@ class DocumentIngestor:
                     datetime.now()
                 ))
                 
-                document_id = cur.fetchone()[0]
+                document_id = (await cur.fetchone())['id']
                 
-                # Inserir chunks
-                for chunk in chunks:
-                    chunk_metadata = self.chunker.get_chunk_metadata(chunk)
-                    
-                    cur.execute("""
-                        INSERT INTO document_chunks (
-                            document_id, content, chunk_index, metadata, created_at
+                # Inserir chunks em lotes de COPY
+                report(stage='saving')
+                await copy_rows(
+                    cur, 'document_chunks', CHUNK_COLUMNS,
+                    self._chunk_rows(document_id, chunks),
+                    on_batch=lambda written: report(chunks_written=written)
+                )
+                
+                await self.embedding_service.store_embeddings(
+                    cur,
+                    document_id,
+                    [chunk.content for chunk in chunks],
+                    [chunk.chunk_index for chunk in chunks],
+                    chunk_vectors
+                )
+                
+                # Registrar no log de uploads (ou concluir o registo do job)
+                if upload_id is not None:
+                    # Só conclui se o job continua em processamento: um cancelamento
+                    # feito entretanto não pode ser sobreposto
+                    await cur.execute("""
+                        UPDATE uploaded_documents
+                        SET processed_document_id = %s, chunks_created = %s, status = %s
+                        WHERE id = %s AND status = %s
+                        RETURNING id
+                    """, (document_id, len(chunks), 'completed', upload_id, 'processing'))
+                    if await cur.fetchone() is None:
+                        await conn.rollback()
+                        raise IngestionCancelled(f"Job {upload_id} já não está em processamento")
+                else:
+                    await cur.execute("""
+                        INSERT INTO uploaded_documents (
+                            original_filename, processed_document_id, 
+                            chunks_created, status, created_at
                         ) VALUES (%s, %s, %s, %s, %s)
                     """, (
+                        original_filename,
                         document_id,
-                        chunk.content,
-                        chunk.chunk_index,
-                        json.dumps(chunk_metadata),
+                        len(chunks),
+                        'completed',
                         datetime.now()
                     ))
                 
-                # Registrar no log de uploads
-                cur.execute("""
-                    INSERT INTO uploaded_documents (
-                        original_filename, processed_document_id, 
-                        chunks_created, status, created_at
-                    ) VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    original_filename,
-                    document_id,
-                    len(chunks),
-                    'completed',
-                    datetime.now()
-                ))
-                
-                conn.commit()
-                return document_id
+                await conn.commit()
+        
+        self.embedding_service.invalidate()
+        return document_id
     
-    def get_processing_stats(self) -> Dict[str, Any]:
+    def _chunk_rows(self, document_id: int, chunks: List[LegalChunk]):
+        """Linhas de document_chunks para COPY (um único timestamp por documento)"""
+        created_at = datetime.now()
+        for chunk in chunks:
+            yield (
+                document_id,
+                chunk.content,
+                chunk.chunk_index,
+                Jsonb(self.chunker.get_chunk_metadata(chunk)),
+                created_at
+            )
+    
+    async def get_processing_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas de processamento"""
-        with self.db_connection() as conn:
-            with conn.cursor() as cur:
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
                 # Estatísticas gerais
-                cur.execute("""
+                await cur.execute("""
                     SELECT 
                         COUNT(*) as total_documents,
                         COUNT(DISTINCT metadata->>'document_type') as document_types,
@@ -341,10 +425,11 @@ class DocumentIngestor:
                         AVG(jsonb_array_length(metadata->'keywords')) as avg_keywords
                     FROM legal_documents
                 """)
-                general_stats = dict(cur.fetchone())
-                
+                general_stats = dict(await cur.fetchone())
+            
+            async with conn.cursor(row_factory=tuple_row) as cur:
                 # Distribuição por tipo
-                cur.execute("""
+                await cur.execute("""
                     SELECT 
                         metadata->>'document_type' as doc_type,
                         COUNT(*) as count
@@ -352,10 +437,10 @@ class DocumentIngestor:
                     GROUP BY metadata->>'document_type'
                     ORDER BY count DESC
                 """)
-                type_distribution = dict(cur.fetchall())
+                type_distribution = dict(await cur.fetchall())
                 
                 # Distribuição por área
-                cur.execute("""
+                await cur.execute("""
                     SELECT 
                         metadata->>'legal_area' as legal_area,
                         COUNT(*) as count
@@ -363,17 +448,18 @@ class DocumentIngestor:
                     GROUP BY metadata->>'legal_area'
                     ORDER BY count DESC
                 """)
-                area_distribution = dict(cur.fetchall())
-                
+                area_distribution = dict(await cur.fetchall())
+            
+            async with conn.cursor() as cur:
                 # Estatísticas de chunks
-                cur.execute("""
+                await cur.execute("""
                     SELECT 
                         COUNT(*) as total_chunks,
                         AVG(length(content)) as avg_chunk_size,
                         COUNT(DISTINCT metadata->>'chunk_type') as chunk_types
                     FROM document_chunks
                 """)
-                chunk_stats = dict(cur.fetchone())
+                chunk_stats = dict(await cur.fetchone())
                 
                 return {
                     'general': general_stats,
@@ -383,64 +469,71 @@ class DocumentIngestor:
                     'last_updated': datetime.now().isoformat()
                 }
     
-    def check_document_exists(self, content_hash: str) -> bool:
+    async def check_document_exists(self, content_hash: str) -> bool:
         """Verifica se documento já foi processado"""
-        with self.db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT id FROM legal_documents WHERE content_hash = %s",
                     (content_hash,)
                 )
-                return cur.fetchone() is not None
+                return await cur.fetchone() is not None
     
-    def reprocess_document(self, document_id: int) -> Dict[str, Any]:
+    async def reprocess_document(self, document_id: int) -> Dict[str, Any]:
         """Reprocessa documento existente com novos algoritmos"""
         try:
-            with self.db_connection() as conn:
-                with conn.cursor() as cur:
+            async with self.db_pool.connection() as conn:
+                async with conn.cursor() as cur:
                     # Buscar documento
-                    cur.execute("""
+                    await cur.execute("""
                         SELECT title, content, metadata 
                         FROM legal_documents 
                         WHERE id = %s
                     """, (document_id,))
                     
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if not result:
                         return {'success': False, 'error': 'Documento não encontrado'}
                     
-                    title, content, metadata = result
+                    title, content, metadata = result['title'], result['content'], result['metadata']
                     
                     # Reprocessar com chunker atual
                     doc_type = LegalDocumentType(metadata.get('document_type', 2))
                     legal_area = LegalArea(metadata.get('legal_area', 2))
                     
-                    new_chunks = self.chunker.chunk_legal_document(
+                    new_chunks = await asyncio.to_thread(
+                        self.chunker.chunk_legal_document,
                         text=content,
                         title=title,
                         legal_area=legal_area,
                         document_type=doc_type
                     )
                     
-                    # Remover chunks antigos
-                    cur.execute("DELETE FROM document_chunks WHERE document_id = %s", (document_id,))
+                    new_vectors = await self.embedding_service.embed_texts(
+                        [chunk.content for chunk in new_chunks]
+                    )
+                    
+                    # Remover chunks e embeddings antigos
+                    await cur.execute("DELETE FROM document_chunks WHERE document_id = %s", (document_id,))
+                    await cur.execute("DELETE FROM document_embeddings WHERE document_id = %s", (document_id,))
                     
                     # Inserir novos chunks
-                    for chunk in new_chunks:
-                        chunk_metadata = self.chunker.get_chunk_metadata(chunk)
-                        cur.execute("""
-                            INSERT INTO document_chunks (
-                                document_id, content, chunk_index, metadata, created_at
-                            ) VALUES (%s, %s, %s, %s, %s)
-                        """, (
-                            document_id,
-                            chunk.content,
-                            chunk.chunk_index,
-                            json.dumps(chunk_metadata),
-                            datetime.now()
-                        ))
+                    await copy_rows(
+                        cur, 'document_chunks', CHUNK_COLUMNS,
+                        self._chunk_rows(document_id, new_chunks)
+                    )
+                    
+                    await self.embedding_service.store_embeddings(
+                        cur,
+                        document_id,
+                        [chunk.content for chunk in new_chunks],
+                        [chunk.chunk_index for chunk in new_chunks],
+                        new_vectors
+                    )
                     
-                    conn.commit()
+                    await conn.commit()
+                    self.embedding_service.invalidate()
+                    await answer_cache.invalidate_documents([document_id])
                     
                     return {
                         'success': True,
@@ -0,0 +1,299 @@
+"""
+Embedding Service - Embeddings vectoriais para recuperação semântica
+Backends locais plugáveis, armazenamento float32 binário e busca top-k
+"""
+import os
+import re
+import time
+import zlib
+import asyncio
+import logging
+import unicodedata
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import numpy as np
+from psycopg.rows import tuple_row
+
+from services.db_pool import DatabasePool
+from services.bulk_writer import copy_rows
+
+logger = logging.getLogger(__name__)
+
+# Vectores guardados como float32 little-endian (4 bytes por dimensão)
+VECTOR_DTYPE = np.dtype('<f4')
+
+
+def vector_to_bytes(vector: np.ndarray) -> bytes:
+    """Serializa um vector para BYTEA compacto"""
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def bytes_to_vector(data: bytes) -> np.ndarray:
+    """Deserializa BYTEA para vector float32"""
+    return np.frombuffer(data, dtype=VECTOR_DTYPE)
+
+
+class EmbeddingBackend(ABC):
+    """Interface para backends de embeddings locais"""
+
+    name: str = "base"
+    dimension: int = 0
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Devolve matriz (n, dimension) float32 com linhas normalizadas L2"""
+        pass
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Embeddings por feature hashing de unigramas e bigramas.
+    Sem dependências externas nem modelo para descarregar.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self._token_pattern = re.compile(r'\w+', re.UNICODE)
+
+    def _tokenize(self, text: str) -> List[str]:
+        text = unicodedata.normalize('NFKD', text.lower())
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        return [t for t in self._token_pattern.findall(text) if len(t) > 1]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            tokens = self._tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+            for feature in features:
+                # crc32 é estável entre processos (ao contrário de hash())
+                h = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[row, h % self.dimension] += sign
+
+        # TF sublinear preservando o sinal
+        np.copyto(matrix, np.sign(matrix) * np.log1p(np.abs(matrix)))
+        return _l2_normalize(matrix)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Backend com sentence-transformers (opcional)"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def _l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def create_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """Cria o backend configurado em EMBEDDING_BACKEND (hashing por omissão)"""
+    name = name or os.getenv('EMBEDDING_BACKEND', 'hashing')
+
+    if name == 'sentence-transformers':
+        try:
+            model_name = os.getenv(
+                'EMBEDDING_MODEL',
+                'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+            )
+            return SentenceTransformerBackend(model_name)
+        except ImportError as e:
+            logger.warning(f"sentence-transformers não disponível, a usar hashing: {e}")
+
+    return HashingEmbeddingBackend(dimension=int(os.getenv('EMBEDDING_DIMENSION', 384)))
+
+
+class VectorIndex:
+    """
+    Índice em memória com busca exacta por produto interno (brute-force NumPy).
+    Adequado a corpora pequenos; é recarregado quando a tabela muda.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._clear()
+
+    def _clear(self):
+        self.matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        self.document_ids = np.zeros(0, dtype=np.int64)
+        self.chunk_indexes = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.document_ids)
+
+    def build(self, rows: List[Tuple[int, int, bytes]]):
+        """Constrói o índice a partir de (document_id, chunk_index, embedding)"""
+        if not rows:
+            self._clear()
+            return
+
+        self.document_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        self.chunk_indexes = np.fromiter((r[1] or 0 for r in rows), dtype=np.int32, count=len(rows))
+        self.matrix = np.frombuffer(
+            b''.join(bytes(r[2]) for r in rows), dtype=VECTOR_DTYPE
+        ).reshape(len(rows), self.dimension)
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[int, int, float]]:
+        """Top-k por similaridade de cosseno (vectores já normalizados)"""
+        if len(self) == 0 or k <= 0:
+            return []
+
+        scores = self.matrix @ query_vector.astype(np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [
+            (int(self.document_ids[i]), int(self.chunk_indexes[i]), float(scores[i]))
+            for i in top
+        ]
+
+
+class EmbeddingService:
+    """Gera, guarda e pesquisa embeddings de chunks legais"""
+
+    def __init__(self, backend: EmbeddingBackend, refresh_interval: float = 60.0):
+        self.backend = backend
+        self.index = VectorIndex(backend.dimension)
+        self.refresh_interval = refresh_interval
+        self._fingerprint: Optional[Tuple[int, int]] = None
+        self._last_check = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.backend, 'model_name', self.backend.name)
+
+    async def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Gera embeddings fora do event loop"""
+        if not texts:
+            return np.zeros((0, self.backend.dimension), dtype=np.float32)
+        return await asyncio.to_thread(self.backend.embed, texts)
+
+    async def ensure_schema(self, pool: DatabasePool):
+        """Cria document_embeddings com vector BYTEA (converte a coluna JSON antiga)"""
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS document_embeddings (
+                        id SERIAL PRIMARY KEY,
+                        document_id INTEGER REFERENCES legal_documents(id) ON DELETE CASCADE,
+                        chunk_text TEXT NOT NULL,
+                        chunk_index INTEGER,
+                        embedding_vector BYTEA,
+                        embedding_model VARCHAR(200),
+                        embedding_dim INTEGER,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                await cur.execute("""
+                    ALTER TABLE document_embeddings
+                    ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(200),
+                    ADD COLUMN IF NOT EXISTS embedding_dim INTEGER;
+                """)
+                # A coluna JSON antiga nunca foi preenchida com vectores reais
+                await cur.execute("""
+                    DO $$
+                    BEGIN
+                        IF EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name = 'document_embeddings'
+                              AND column_name = 'embedding_vector'
+                              AND data_type IN ('json', 'jsonb')
+                        ) THEN
+                            ALTER TABLE document_embeddings
+                            ALTER COLUMN embedding_vector TYPE BYTEA USING NULL;
+                        END IF;
+                    END
+                    $$;
+                """)
+                await cur.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_embeddings_document ON document_embeddings(document_id, chunk_index);"
+                )
+            await conn.commit()
+
+    async def store_embeddings(
+        self,
+        cur,
+        document_id: int,
+        chunk_texts: List[str],
+        chunk_indexes: List[int],
+        vectors: np.ndarray
+    ):
+        """Insere embeddings na transacção do chamador (chamar invalidate() após o commit)"""
+        await copy_rows(
+            cur,
+            'document_embeddings',
+            ('document_id', 'chunk_text', 'chunk_index', 'embedding_vector', 'embedding_model', 'embedding_dim'),
+            (
+                (document_id, text, index, vector_to_bytes(vector), self.model_name, self.backend.dimension)
+                for text, index, vector in zip(chunk_texts, chunk_indexes, vectors)
+            )
+        )
+
+    def invalidate(self):
+        """Força verificação do índice na próxima busca"""
+        self._last_check = 0.0
+        self._fingerprint = None
+
+    async def _refresh_index(self, pool: DatabasePool):
+        """Recarrega o índice se a tabela mudou desde a última verificação"""
+        if self._fingerprint is not None and time.monotonic() - self._last_check < self.refresh_interval:
+            return
+
+        async with self._lock:
+            if self._fingerprint is not None and time.monotonic() - self._last_check < self.refresh_interval:
+                return
+
+            async with pool.connection() as conn:
+                async with conn.cursor(row_factory=tuple_row) as cur:
+                    await cur.execute("""
+                        SELECT COUNT(*), COALESCE(MAX(id), 0)
+                        FROM document_embeddings
+                        WHERE embedding_model = %s AND embedding_dim = %s
+                    """, (self.model_name, self.backend.dimension))
+                    fingerprint = tuple(await cur.fetchone())
+
+                    if fingerprint != self._fingerprint:
+                        await cur.execute("""
+                            SELECT document_id, chunk_index, embedding_vector
+                            FROM document_embeddings
+                            WHERE embedding_model = %s AND embedding_dim = %s
+                              AND embedding_vector IS NOT NULL
+                        """, (self.model_name, self.backend.dimension))
+                        rows = await cur.fetchall()
+                        await asyncio.to_thread(self.index.build, rows)
+                        logger.info(f"Índice vectorial recarregado ({len(self.index)} chunks)")
+
+            self._fingerprint = fingerprint
+            self._last_check = time.monotonic()
+
+    async def search(self, pool: DatabasePool, query: str, k: int = 20) -> List[Tuple[int, int, float]]:
+        """Top-k chunks mais próximos: lista de (document_id, chunk_index, score)"""
+        await self._refresh_index(pool)
+        query_vector = (await self.embed_texts([query]))[0]
+        return self.index.search(query_vector, k)
+
+# Instância global do serviço de embeddings
+embedding_service = EmbeddingService(
+    create_embedding_backend(),
+    refresh_interval=float(os.getenv('EMBEDDING_INDEX_REFRESH_SECONDS', 60))
+)
@@ -0,0 +1,283 @@
+"""
+Fulltext Migration - Coluna tsvector materializada em document_chunks
+Mantém os vectores por trigger, faz backfill em lotes e cria o índice GIN
+sem bloquear a tabela
+"""
+import asyncio
+import logging
+from typing import Dict
+
+from psycopg import AsyncConnection
+from psycopg.rows import tuple_row
+from services.db_pool import DatabasePool
+
+logger = logging.getLogger(__name__)
+
+# Texto do chunk: registos antigos usam chunk_text, o DocumentIngestor usa content
+CHUNK_TEXT_SQL = "coalesce(NEW.chunk_text, NEW.content, '')"
+
+# ALTER TABLE e CREATE TRIGGER bloqueiam a tabela (ACCESS EXCLUSIVE / SHARE ROW
+# EXCLUSIVE): só correm quando as colunas ou triggers ainda não existem. Alterar a
+# definição de um trigger existente exige removê-lo numa migração manual.
+TSV_COLUMNS = ('tsv', 'tsv_weighted')
+
+# Colunas nullable sem default: apenas alteração de catálogo, sem reescrever a tabela
+ADD_COLUMNS_SQL = """
+    ALTER TABLE document_chunks
+    ADD COLUMN IF NOT EXISTS tsv tsvector,
+    ADD COLUMN IF NOT EXISTS tsv_weighted tsvector;
+"""
+
+EXISTING_COLUMNS_SQL = """
+    SELECT column_name FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'document_chunks'
+      AND column_name = ANY(%s)
+"""
+
+# CREATE OR REPLACE FUNCTION só toca no catálogo, não nas tabelas
+FUNCTION_STATEMENTS = [
+    f"""
+    CREATE OR REPLACE FUNCTION document_chunks_tsv_update() RETURNS trigger AS $$
+    DECLARE
+        doc_title TEXT;
+    BEGIN
+        SELECT title INTO doc_title FROM legal_documents WHERE id = NEW.document_id;
+        NEW.tsv := to_tsvector('portuguese', {CHUNK_TEXT_SQL});
+        NEW.tsv_weighted :=
+            setweight(to_tsvector('portuguese', coalesce(doc_title, '')), 'A') ||
+            setweight(to_tsvector('portuguese', {CHUNK_TEXT_SQL}), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    # Alterar o título do documento tem de refrescar o vector ponderado dos seus chunks
+    """
+    CREATE OR REPLACE FUNCTION legal_documents_title_tsv_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE document_chunks
+        SET tsv_weighted =
+            setweight(to_tsvector('portuguese', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('portuguese', coalesce(chunk_text, content, '')), 'B')
+        WHERE document_id = NEW.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """
+]
+
+TRIGGER_STATEMENTS = {
+    'trg_document_chunks_tsv': """
+    CREATE TRIGGER trg_document_chunks_tsv
+    BEFORE INSERT OR UPDATE OF chunk_text, content, document_id ON document_chunks
+    FOR EACH ROW EXECUTE FUNCTION document_chunks_tsv_update();
+    """,
+    'trg_legal_documents_title_tsv': """
+    CREATE TRIGGER trg_legal_documents_title_tsv
+    AFTER UPDATE OF title ON legal_documents
+    FOR EACH ROW WHEN (OLD.title IS DISTINCT FROM NEW.title)
+    EXECUTE FUNCTION legal_documents_title_tsv_update();
+    """
+}
+
+EXISTING_TRIGGERS_SQL = "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal AND tgname = ANY(%s)"
+
+BACKFILL_BATCH_SQL = """
+    UPDATE document_chunks dc
+    SET tsv = to_tsvector('portuguese', coalesce(dc.chunk_text, dc.content, '')),
+        tsv_weighted =
+            setweight(to_tsvector('portuguese', coalesce(
+                (SELECT ld.title FROM legal_documents ld WHERE ld.id = dc.document_id), ''
+            )), 'A') ||
+            setweight(to_tsvector('portuguese', coalesce(dc.chunk_text, dc.content, '')), 'B')
+    -- Subselect em vez de join: chunks sem documento também são preenchidos,
+    -- senão ficariam com tsv NULL e o ciclo de lotes terminaria cedo
+    WHERE dc.id IN (
+          SELECT id FROM document_chunks
+          WHERE tsv IS NULL
+          ORDER BY id
+          LIMIT %s
+          FOR UPDATE SKIP LOCKED
+      )
+"""
+
+# CREATE/DROP INDEX CONCURRENTLY não pode correr dentro de uma transacção
+INDEX_STATEMENTS = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_tsv ON document_chunks USING gin(tsv);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_tsv_weighted ON document_chunks USING gin(tsv_weighted);"
+]
+
+# O índice de expressão antigo só é removido quando já não há chunks por preencher
+DROP_LEGACY_INDEX_SQL = "DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_text;"
+PENDING_BACKFILL_SQL = "SELECT EXISTS (SELECT 1 FROM document_chunks WHERE tsv IS NULL)"
+
+# Expressão do índice antigo (idx_chunks_text): cobre os chunks ainda sem tsv
+LEGACY_TSVECTOR_SQL = "to_tsvector('portuguese', dc.chunk_text)"
+
+# Chave do advisory lock que garante um único worker a correr a migração
+MIGRATION_LOCK_KEY = 720_341_002
+# Lock de transacção que serializa apply_schema entre workers
+SCHEMA_LOCK_KEY = 720_341_003
+
+# Intervalo com que os outros workers verificam se o backfill terminou
+BACKFILL_POLL_SECONDS = 30.0
+
+# True (neste processo) quando já não há chunks sem tsv: a pesquisa deixa de
+# incluir a alternativa pela expressão antiga, que sem idx_chunks_text obrigaria
+# a um seq scan
+_backfill_complete = False
+
+
+def is_backfill_complete() -> bool:
+    return _backfill_complete
+
+
+def tsv_match_sql(column: str = "dc.tsv", query: str = "q") -> str:
+    """Condição de pesquisa; até ao fim do backfill inclui os chunks ainda sem tsv"""
+    if _backfill_complete:
+        return f"{column} @@ {query}"
+    return f"({column} @@ {query} OR ({column} IS NULL AND {LEGACY_TSVECTOR_SQL} @@ {query}))"
+
+
+def tsv_rank_sql(column: str = "dc.tsv", query: str = "q") -> str:
+    """ts_rank com a mesma alternativa para chunks sem tsv (só durante o backfill)"""
+    if _backfill_complete:
+        return f"ts_rank({column}, {query})"
+    return f"ts_rank(COALESCE({column}, {LEGACY_TSVECTOR_SQL}), {query})"
+
+
+async def refresh_backfill_state(pool: DatabasePool) -> bool:
+    """Consulta se ainda há chunks por preencher e actualiza o estado do processo"""
+    global _backfill_complete
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=tuple_row) as cur:
+            await cur.execute(PENDING_BACKFILL_SQL)
+            pending = (await cur.fetchone())[0]
+    _backfill_complete = not pending
+    return _backfill_complete
+
+
+async def apply_schema(pool: DatabasePool):
+    """
+    Adiciona as colunas e triggers em falta (idempotente). Com tudo já criado
+    não executa DDL sobre document_chunks nem legal_documents.
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=tuple_row) as cur:
+            # Workers a arrancar em simultâneo verificam e criam um de cada vez
+            await cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+
+            await cur.execute(EXISTING_COLUMNS_SQL, (list(TSV_COLUMNS),))
+            if len(await cur.fetchall()) < len(TSV_COLUMNS):
+                await cur.execute(ADD_COLUMNS_SQL)
+
+            for statement in FUNCTION_STATEMENTS:
+                await cur.execute(statement)
+
+            await cur.execute(EXISTING_TRIGGERS_SQL, (list(TRIGGER_STATEMENTS),))
+            existing = {row[0] for row in await cur.fetchall()}
+            for name, statement in TRIGGER_STATEMENTS.items():
+                if name not in existing:
+                    await cur.execute(statement)
+        await conn.commit()
+
+
+async def backfill_chunk_tsvectors(
+    pool: DatabasePool,
+    batch_size: int = 1000,
+    pause_seconds: float = 0.05
+) -> int:
+    """
+    Preenche tsv/tsv_weighted em lotes pequenos, cada um na sua transacção,
+    para que escritas concorrentes nunca esperem mais do que um lote.
+    """
+    total_updated = 0
+
+    while True:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(BACKFILL_BATCH_SQL, (batch_size,))
+                updated = cur.rowcount
+            await conn.commit()
+
+        if updated <= 0:
+            break
+
+        total_updated += updated
+        logger.info(f"Backfill tsvector: {total_updated} chunks actualizados")
+        await asyncio.sleep(pause_seconds)
+
+    return total_updated
+
+
+async def create_search_indexes(pool: DatabasePool) -> bool:
+    """
+    Cria os índices GIN com CONCURRENTLY numa conexão autocommit dedicada.
+    Devolve True se o índice antigo foi removido (backfill completo).
+    """
+    global _backfill_complete
+    async with await AsyncConnection.connect(pool.dsn, autocommit=True) as conn:
+        for statement in INDEX_STATEMENTS:
+            await conn.execute(statement)
+
+        cursor = await conn.execute(PENDING_BACKFILL_SQL)
+        pending = (await cursor.fetchone())[0]
+        if pending:
+            logger.warning("Backfill tsvector incompleto: idx_chunks_text mantido")
+            return False
+
+        # A pesquisa deixa de depender da expressão antiga antes de o índice sair
+        _backfill_complete = True
+        await conn.execute(DROP_LEGACY_INDEX_SQL)
+        return True
+
+
+async def run_fulltext_migration(
+    pool: DatabasePool,
+    batch_size: int = 1000,
+    include_schema: bool = True
+) -> Dict[str, int]:
+    """
+    Executa a migração completa: schema, backfill e índices. Com vários workers,
+    só o que obtiver o advisory lock a executa; os restantes aguardam que o
+    backfill termine para deixarem de usar a alternativa sem tsv na pesquisa.
+    """
+    try:
+        # Lock de sessão numa conexão dedicada: libertado ao fechar, mesmo se cancelada
+        async with await AsyncConnection.connect(pool.dsn, autocommit=True) as lock_conn:
+            cursor = await lock_conn.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            acquired = (await cursor.fetchone())[0]
+            if acquired:
+                if include_schema:
+                    await apply_schema(pool)
+                updated = await backfill_chunk_tsvectors(pool, batch_size=batch_size)
+                legacy_dropped = await create_search_indexes(pool)
+                await lock_conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+        if not acquired:
+            logger.info("Migração tsvector já em curso noutro worker")
+            while not await refresh_backfill_state(pool):
+                await asyncio.sleep(BACKFILL_POLL_SECONDS)
+            return {'chunks_backfilled': 0, 'skipped': 1}
+
+        logger.info(f"✓ Migração tsvector concluída ({updated} chunks preenchidos)")
+        return {'chunks_backfilled': updated, 'legacy_index_dropped': int(legacy_dropped)}
+    except Exception as e:
+        logger.error(f"Erro na migração tsvector: {e}")
+        return {'chunks_backfilled': 0, 'error': str(e)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migração tsvector de document_chunks")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    async def _main():
+        pool = DatabasePool.from_env()
+        try:
+            print(await run_fulltext_migration(pool, batch_size=args.batch_size))
+        finally:
+            await pool.close()
+
+    asyncio.run(_main())
@@ -0,0 +1,548 @@
+"""
+Ingestion Jobs - Processamento de documentos em segundo plano
+Jobs persistidos em PostgreSQL (estado em uploaded_documents.status), fila Redis
+ou em processo e pool de workers com progresso, retry e cancelamento
+"""
+import json
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from services.db_pool import DatabasePool
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Estados partilhados com uploaded_documents.status
+JOB_QUEUED = 'queued'
+JOB_PROCESSING = 'processing'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+# Fracção do trabalho total no início de cada etapa (para percentagem e ETA)
+STAGE_PROGRESS = {
+    'queued': 0.0,
+    'extracting': 0.0,
+    'chunking': 0.45,
+    'embedding': 0.5,
+    'saving': 0.6,
+    'completed': 1.0
+}
+
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS uploaded_documents (
+        id SERIAL PRIMARY KEY,
+        original_filename VARCHAR(255),
+        processed_document_id INTEGER,
+        chunks_created INTEGER DEFAULT 0,
+        status VARCHAR(20) DEFAULT 'pending',
+        error_message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    ALTER TABLE uploaded_documents
+    ADD COLUMN IF NOT EXISTS processed_document_id INTEGER,
+    ADD COLUMN IF NOT EXISTS chunks_created INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'pending',
+    ADD COLUMN IF NOT EXISTS error_message TEXT;
+    """,
+    # Um job por upload: o id do job é o id de uploaded_documents
+    """
+    CREATE TABLE IF NOT EXISTS ingestion_jobs (
+        upload_id INTEGER PRIMARY KEY REFERENCES uploaded_documents(id) ON DELETE CASCADE,
+        file_path TEXT NOT NULL,
+        override_metadata JSONB,
+        stage VARCHAR(30) DEFAULT 'queued',
+        attempts INTEGER DEFAULT 0,
+        max_attempts INTEGER DEFAULT 3,
+        pages_total INTEGER,
+        pages_extracted INTEGER DEFAULT 0,
+        chunks_total INTEGER,
+        chunks_written INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        heartbeat_at TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_uploaded_documents_status ON uploaded_documents(status);"
+]
+
+JOB_SELECT_SQL = """
+    SELECT
+        u.id AS job_id, u.status, u.original_filename, u.processed_document_id AS document_id,
+        u.chunks_created, u.error_message, u.created_at,
+        j.stage, j.attempts, j.max_attempts, j.pages_total, j.pages_extracted,
+        j.chunks_total, j.chunks_written, j.started_at, j.finished_at,
+        EXTRACT(EPOCH FROM (now() - j.started_at)) AS elapsed_seconds
+    FROM uploaded_documents u
+    JOIN ingestion_jobs j ON j.upload_id = u.id
+    WHERE u.id = %s
+"""
+
+PROGRESS_FIELDS = ('stage', 'pages_total', 'pages_extracted', 'chunks_total', 'chunks_written')
+
+
+class InProcessJobQueue:
+    """Fila em memória (um único processo; recuperada da base de dados no arranque)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def put(self, job_id: int):
+        await self._queue.put(job_id)
+
+    async def get(self, timeout: float) -> Optional[int]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        pass
+
+
+class RedisJobQueue:
+    """Fila partilhada entre processos numa lista Redis"""
+
+    name = "redis"
+
+    def __init__(self, url: str, key: str = "muzaia:ingestion:queue"):
+        self.key = key
+        self._client = aioredis.from_url(url, decode_responses=True)
+
+    async def ping(self):
+        await self._client.ping()
+
+    async def put(self, job_id: int):
+        await self._client.rpush(self.key, job_id)
+
+    async def get(self, timeout: float) -> Optional[int]:
+        item = await self._client.blpop([self.key], timeout=max(1, int(timeout)))
+        return int(item[1]) if item else None
+
+    async def close(self):
+        await self._client.aclose()
+
+
+async def create_job_queue(redis_url: Optional[str] = None):
+    """Fila Redis quando configurada e acessível, senão fila em processo"""
+    if redis_url and REDIS_AVAILABLE:
+        queue = RedisJobQueue(redis_url)
+        try:
+            await queue.ping()
+            return queue
+        except Exception as e:
+            logger.warning(f"Redis indisponível para a fila de ingestão, a usar fila em memória: {e}")
+            await queue.close()
+    return InProcessJobQueue()
+
+
+class IngestionJobManager:
+    """Submete, executa e acompanha jobs de ingestão de documentos"""
+
+    def __init__(
+        self,
+        db_pool: DatabasePool,
+        ingestor,
+        workers: int = 2,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+        heartbeat_interval: float = 2.0,
+        stale_after: float = 120.0,
+        redis_url: Optional[str] = None
+    ):
+        self.db_pool = db_pool
+        self.ingestor = ingestor
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.redis_url = redis_url
+
+        self._queue = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._background_tasks: Set[asyncio.Task] = set()
+        # Jobs a correr neste processo: tarefa e progresso ao vivo
+        self._running: Dict[int, asyncio.Task] = {}
+        self._progress: Dict[int, Dict[str, Any]] = {}
+        self._cancel_requested: Set[int] = set()
+
+    @property
+    def queue_backend(self) -> Optional[str]:
+        return self._queue.name if self._queue else None
+
+    async def ensure_schema(self):
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                for statement in SCHEMA_STATEMENTS:
+                    await cur.execute(statement)
+            await conn.commit()
+
+    async def start(self):
+        """Cria o schema, liga a fila, recupera jobs pendentes e inicia os workers"""
+        await self.ensure_schema()
+        self._queue = await create_job_queue(self.redis_url)
+        await self._recover_jobs()
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(n)) for n in range(self.workers)
+        ]
+        logger.info(f"✓ Fila de ingestão iniciada ({self._queue.name}, {self.workers} workers)")
+
+    async def stop(self):
+        for task in self._worker_tasks + list(self._background_tasks):
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, *self._background_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        if self._queue:
+            await self._queue.close()
+            self._queue = None
+
+    async def submit(
+        self,
+        file_path: str,
+        original_filename: str,
+        override_metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Regista o upload como 'queued' e coloca o job na fila"""
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    INSERT INTO uploaded_documents (original_filename, chunks_created, status)
+                    VALUES (%s, 0, %s)
+                    RETURNING id
+                """, (original_filename, JOB_QUEUED))
+                job_id = (await cur.fetchone())['id']
+
+                await cur.execute("""
+                    INSERT INTO ingestion_jobs (upload_id, file_path, override_metadata, max_attempts)
+                    VALUES (%s, %s, %s, %s)
+                """, (
+                    job_id,
+                    file_path,
+                    json.dumps(override_metadata) if override_metadata else None,
+                    self.max_attempts
+                ))
+            await conn.commit()
+
+        await self._queue.put(job_id)
+        return job_id
+
+    async def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Estado, progresso e ETA do job"""
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(JOB_SELECT_SQL, (job_id,))
+                row = await cur.fetchone()
+
+        if row is None:
+            return None
+
+        row = dict(row)
+        # Progresso ao vivo é mais recente do que o último heartbeat
+        if job_id in self._progress:
+            row.update(self._progress[job_id])
+
+        return self._format_job(row)
+
+    async def cancel(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Cancela um job em fila ou em execução"""
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    UPDATE uploaded_documents SET status = %s
+                    WHERE id = %s AND status IN (%s, %s)
+                    RETURNING id
+                """, (JOB_CANCELLED, job_id, JOB_QUEUED, JOB_PROCESSING))
+                cancelled = await cur.fetchone() is not None
+                if cancelled:
+                    await cur.execute(
+                        "UPDATE ingestion_jobs SET finished_at = now() WHERE upload_id = %s",
+                        (job_id,)
+                    )
+            await conn.commit()
+
+        # Noutros processos o heartbeat detecta o novo estado
+        if cancelled:
+            self._cancel_running(job_id)
+
+        return await self.get_job(job_id)
+
+    async def retry(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Volta a colocar na fila um job falhado ou cancelado"""
+        job = await self.get_job(job_id)
+        if job is None:
+            return None
+        if job['status'] not in (JOB_FAILED, JOB_CANCELLED):
+            raise ValueError(f"Só jobs falhados ou cancelados podem ser repetidos (estado: {job['status']})")
+
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT file_path FROM ingestion_jobs WHERE upload_id = %s", (job_id,))
+                file_path = (await cur.fetchone())['file_path']
+                if not Path(file_path).exists():
+                    raise ValueError("Arquivo do upload já não existe; é necessário novo upload")
+
+                await cur.execute("""
+                    UPDATE uploaded_documents SET status = %s, error_message = NULL
+                    WHERE id = %s AND status IN (%s, %s)
+                """, (JOB_QUEUED, job_id, JOB_FAILED, JOB_CANCELLED))
+                await cur.execute("""
+                    UPDATE ingestion_jobs
+                    SET stage = 'queued', attempts = 0, pages_total = NULL, pages_extracted = 0,
+                        chunks_total = NULL, chunks_written = 0,
+                        started_at = NULL, heartbeat_at = NULL, finished_at = NULL
+                    WHERE upload_id = %s
+                """, (job_id,))
+            await conn.commit()
+
+        await self._queue.put(job_id)
+        return await self.get_job(job_id)
+
+    async def _recover_jobs(self):
+        """Repõe na fila jobs de workers que morreram (e, em memória, todos os pendentes)"""
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    UPDATE uploaded_documents u SET status = %s
+                    FROM ingestion_jobs j
+                    WHERE j.upload_id = u.id AND u.status = %s
+                      AND (j.heartbeat_at IS NULL OR j.heartbeat_at < now() - make_interval(secs => %s))
+                    RETURNING u.id
+                """, (JOB_QUEUED, JOB_PROCESSING, self.stale_after))
+                job_ids = [row['id'] for row in await cur.fetchall()]
+
+                if self._queue.name == InProcessJobQueue.name:
+                    await cur.execute("""
+                        SELECT u.id FROM uploaded_documents u
+                        JOIN ingestion_jobs j ON j.upload_id = u.id
+                        WHERE u.status = %s
+                        ORDER BY u.id
+                    """, (JOB_QUEUED,))
+                    job_ids = [row['id'] for row in await cur.fetchall()]
+            await conn.commit()
+
+        for job_id in job_ids:
+            await self._queue.put(job_id)
+        if job_ids:
+            logger.info(f"Fila de ingestão: {len(job_ids)} jobs recuperados")
+
+    async def _worker(self, worker_number: int):
+        while True:
+            try:
+                job_id = await self._queue.get(timeout=5.0)
+                if job_id is not None:
+                    await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no worker de ingestão {worker_number}: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _claim(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Passa o job de 'queued' a 'processing' (atómico entre workers e processos)"""
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    UPDATE uploaded_documents SET status = %s
+                    WHERE id = %s AND status = %s
+                    RETURNING original_filename
+                """, (JOB_PROCESSING, job_id, JOB_QUEUED))
+                claimed = await cur.fetchone()
+                if claimed is None:
+                    await conn.rollback()
+                    return None
+
+                await cur.execute("""
+                    UPDATE ingestion_jobs
+                    SET attempts = attempts + 1, stage = 'extracting',
+                        started_at = now(), heartbeat_at = now(), finished_at = NULL
+                    WHERE upload_id = %s
+                    RETURNING file_path, override_metadata, attempts, max_attempts
+                """, (job_id,))
+                job = dict(await cur.fetchone())
+            await conn.commit()
+
+        job['original_filename'] = claimed['original_filename']
+        return job
+
+    async def _run_job(self, job_id: int):
+        job = await self._claim(job_id)
+        if job is None:
+            return
+
+        progress: Dict[str, Any] = {'stage': 'extracting'}
+        self._progress[job_id] = progress
+        task = asyncio.create_task(self.ingestor.process_document(
+            job['file_path'],
+            job['original_filename'],
+            job['override_metadata'],
+            upload_id=job_id,
+            progress_callback=progress.update
+        ))
+        self._running[job_id] = task
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, task, progress))
+
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if job_id in self._cancel_requested:
+                logger.info(f"Job de ingestão {job_id} cancelado")
+                return
+            # Shutdown do worker: o job volta à fila
+            await self._set_status(job_id, JOB_QUEUED, stage='queued')
+            raise
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
+            self._progress.pop(job_id, None)
+
+        await self._write_progress(job_id, progress)
+
+        if result.get('cancelled'):
+            # Transacção desfeita no ingestor; o estado fica como cancel() o deixou
+            logger.info(f"Job de ingestão {job_id} cancelado antes de concluir")
+            return
+
+        if result['success']:
+            await self._finish(job_id, stage='completed')
+            Path(job['file_path']).unlink(missing_ok=True)
+        elif result.get('retryable') and job['attempts'] < job['max_attempts']:
+            delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+            logger.warning(f"Job de ingestão {job_id} falhou (tentativa {job['attempts']}), nova tentativa em {delay:.0f}s")
+            await self._set_status(job_id, JOB_QUEUED, stage='queued', error=result['error'])
+            self._schedule(self._requeue_later(job_id, delay))
+        else:
+            # O ficheiro é mantido para permitir retry manual
+            await self._set_status(job_id, JOB_FAILED, stage='failed', error=result['error'])
+            await self._finish(job_id, stage='failed')
+
+    async def _heartbeat(self, job_id: int, task: asyncio.Task, progress: Dict[str, Any]):
+        """Persiste o progresso periodicamente e detecta cancelamentos feitos noutro processo"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                status = await self._write_progress(job_id, progress)
+                if status == JOB_CANCELLED:
+                    self._cancel_running(job_id)
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat do job de ingestão {job_id} falhou: {e}")
+
+    async def _write_progress(self, job_id: int, progress: Dict[str, Any]) -> Optional[str]:
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    UPDATE ingestion_jobs j
+                    SET stage = %s, pages_total = %s, pages_extracted = %s,
+                        chunks_total = %s, chunks_written = %s, heartbeat_at = now()
+                    FROM uploaded_documents u
+                    WHERE j.upload_id = %s AND u.id = j.upload_id
+                    RETURNING u.status
+                """, (
+                    progress.get('stage'),
+                    progress.get('pages_total'),
+                    progress.get('pages_extracted', 0),
+                    progress.get('chunks_total'),
+                    progress.get('chunks_written', 0),
+                    job_id
+                ))
+                row = await cur.fetchone()
+            await conn.commit()
+        return row['status'] if row else None
+
+    async def _set_status(self, job_id: int, status: str, stage: str, error: Optional[str] = None):
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE uploaded_documents SET status = %s, error_message = %s WHERE id = %s",
+                    (status, error, job_id)
+                )
+                await cur.execute(
+                    "UPDATE ingestion_jobs SET stage = %s WHERE upload_id = %s",
+                    (stage, job_id)
+                )
+            await conn.commit()
+
+    async def _finish(self, job_id: int, stage: str):
+        async with self.db_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE ingestion_jobs SET stage = %s, finished_at = now() WHERE upload_id = %s",
+                    (stage, job_id)
+                )
+            await conn.commit()
+
+    async def _requeue_later(self, job_id: int, delay: float):
+        await asyncio.sleep(delay)
+        await self._queue.put(job_id)
+
+    def _schedule(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _cancel_running(self, job_id: int):
+        task = self._running.get(job_id)
+        if task is not None and not task.done():
+            self._cancel_requested.add(job_id)
+            task.cancel()
+
+    def _format_job(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        status = row['status']
+        stage = row.get('stage') or 'queued'
+        fraction = self._progress_fraction(status, stage, row)
+
+        eta_seconds = None
+        elapsed = row.get('elapsed_seconds')
+        if status == JOB_PROCESSING and elapsed is not None and fraction > 0.01:
+            eta_seconds = round(float(elapsed) * (1 - fraction) / fraction, 1)
+
+        return {
+            'job_id': row['job_id'],
+            'status': status,
+            'stage': stage,
+            'original_filename': row['original_filename'],
+            'document_id': row['document_id'],
+            'attempts': row['attempts'],
+            'max_attempts': row['max_attempts'],
+            'progress': {
+                'percent': round(fraction * 100, 1),
+                'pages_total': row['pages_total'],
+                'pages_extracted': row['pages_extracted'],
+                'chunks_total': row['chunks_total'],
+                'chunks_written': row['chunks_written']
+            },
+            'eta_seconds': eta_seconds,
+            'error': row['error_message'],
+            'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+            'started_at': row['started_at'].isoformat() if row['started_at'] else None,
+            'finished_at': row['finished_at'].isoformat() if row['finished_at'] else None
+        }
+
+    @staticmethod
+    def _progress_fraction(status: str, stage: str, row: Dict[str, Any]) -> float:
+        if status == JOB_COMPLETED:
+            return 1.0
+
+        fraction = STAGE_PROGRESS.get(stage, 0.0)
+        if stage == 'extracting' and row.get('pages_total'):
+            fraction = STAGE_PROGRESS['chunking'] * (row.get('pages_extracted') or 0) / row['pages_total']
+        elif stage == 'saving' and row.get('chunks_total'):
+            fraction += (1.0 - fraction) * (row.get('chunks_written') or 0) / row['chunks_total']
+        return min(fraction, 1.0)
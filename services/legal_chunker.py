@@ -7,6 +7,8 @@ import json
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from models.legal_document_hierarchy import LegalArea, LegalDocumentType
+from models.legal_terms import CHUNKER_AREA_CONCEPTS, CHUNKER_GENERAL_CONCEPTS, legal_term_matcher
+from services.legal_structure import LegalStructureTokenizer, STRUCTURE_LEVELS
 
 @dataclass
 class LegalChunk:
@@ -29,63 +31,29 @@ class LegalChunker:
         self.max_chunk_size = max_chunk_size
         self.overlap_size = overlap_size
         
-        # Padrões para identificar estruturas legais
-        self.patterns = {
+        # Estratégias estruturais por ordem de preferência: (cabeçalho, terminadores)
+        # Terminadores: cabeçalhos, palavras-chave soltas ou marcadores de início de linha;
+        # um bloco termina sempre também no fim da linha
+        self.structure_strategies = {
             'artigo': [
-                r'artigo\s+(\d+)\.?º?\s*[-–—]?\s*(.*?)(?=artigo\s+\d+|$)',
-                r'art\.?\s*(\d+)\.?º?\s*[-–—]?\s*(.*?)(?=art\.?\s*\d+|$)',
-                r'^(\d+)\.?\s*[-–—]\s*(.*?)(?=^\d+\.|$)'
+                ('artigo', {'headers': ('artigo',)}),
+                ('art', {'headers': ('art',)}),
+                ('artigo_linha', {'lines': ('artigo_linha_fim',)})
             ],
             'seccao': [
-                r'secção\s+([IVX]+|\d+)\s*[-–—]?\s*(.*?)(?=secção|artigo|$)',
-                r'seção\s+([IVX]+|\d+)\s*[-–—]?\s*(.*?)(?=seção|artigo|$)'
-            ],
-            'capitulo': [
-                r'capítulo\s+([IVX]+|\d+)\s*[-–—]?\s*(.*?)(?=capítulo|secção|$)',
-                r'titulo\s+([IVX]+|\d+)\s*[-–—]?\s*(.*?)(?=titulo|capítulo|$)'
-            ],
-            'alinea': [
-                r'^([a-z])\)\s*(.*?)(?=^[a-z]\)|$)',
-                r'alínea\s+([a-z])\)\s*(.*?)(?=alínea|$)'
+                ('seccao', {'keywords': ('secção', 'artigo')}),
+                ('secao', {'keywords': ('seção', 'artigo')})
             ],
             'paragrafo': [
-                r'§\s*(\d+)º?\s*[-–—]?\s*(.*?)(?=§|artigo|$)',
-                r'parágrafo\s+(\d+)º?\s*[-–—]?\s*(.*?)(?=parágrafo|artigo|$)',
-                r'^\s*(\d+)\.?\s+(.*?)(?=^\s*\d+\.|$)'
-            ],
-            'numero': [
-                r'^\s*(\d+)\.\s+(.*?)(?=^\s*\d+\.|$)',
-                r'^\s*(\d+)\s*[-–—]\s*(.*?)(?=^\s*\d+\s*[-–—]|$)'
+                ('paragrafo_sinal', {'keywords': ('§', 'artigo')}),
+                ('paragrafo', {'keywords': ('parágrafo', 'artigo')}),
+                ('paragrafo_linha', {'lines': ('paragrafo_linha_fim',)})
             ]
         }
         
-        # Conceitos jurídicos por área para detecção
         self.legal_concepts = {
-            LegalArea.CIVIL: [
-                "personalidade jurídica", "capacidade", "responsabilidade civil", 
-                "contrato", "propriedade", "obrigação", "direitos reais", "posse",
-                "usufruito", "servidão", "hipoteca", "penhor", "herança", "sucessão"
-            ],
-            LegalArea.PENAL: [
-                "crime", "dolo", "culpa", "pena", "prisão", "multa", "medida de segurança",
-                "legítima defesa", "estado de necessidade", "tentativa", "comparticipação",
-                "prescrição", "extinção da responsabilidade", "atenuação", "agravação"
-            ],
-            LegalArea.COMERCIAL: [
-                "sociedade comercial", "empresa", "estabelecimento comercial", "marca",
-                "patente", "concorrência", "falência", "recuperação", "títulos de crédito",
-                "letra de câmbio", "cheque", "nota promissória", "seguro", "transporte"
-            ],
-            LegalArea.TRABALHO: [
-                "contrato de trabalho", "trabalhador", "empregador", "salário", "férias",
-                "despedimento", "cessação", "horário de trabalho", "horas extraordinárias",
-                "segurança no trabalho", "acidentes de trabalho", "greve", "sindicato"
-            ],
-            LegalArea.ADMINISTRATIVO: [
-                "administração pública", "funcionário público", "acto administrativo",
-                "procedimento administrativo", "recurso administrativo", "contrato público",
-                "serviço público", "domínio público", "expropriação", "licenciamento"
-            ]
+            LegalArea[area_name]: concepts
+            for area_name, concepts in CHUNKER_AREA_CONCEPTS.items()
         }
     
     def chunk_legal_document(
@@ -128,59 +96,58 @@ class LegalChunker:
     
     def _extract_structural_chunks(self, text: str, legal_area: LegalArea) -> List[Dict[str, Any]]:
         """Extrai chunks baseados na estrutura legal do documento"""
-        chunks = []
+        # Todas as fronteiras estruturais encontradas numa única passagem
+        tokenizer = LegalStructureTokenizer(text)
         
         # Tentar extrair artigos primeiro (estrutura mais comum)
-        for pattern in self.patterns['artigo']:
-            matches = list(re.finditer(pattern, text, re.MULTILINE | re.DOTALL | re.IGNORECASE))
-            if matches:
-                for i, match in enumerate(matches):
-                    chunk_content = match.group(0).strip()
-                    if len(chunk_content) > 50:  # Filtrar chunks muito pequenos
-                        chunks.append({
-                            'content': chunk_content,
-                            'type': 'artigo',
-                            'number': match.group(1),
-                            'start_pos': match.start(),
-                            'end_pos': match.end()
-                        })
-                break  # Se encontrou artigos, parar
+        chunks = self._chunks_from_strategies(tokenizer, 'artigo', min_length=50, min_matches=1)
         
         # Se não encontrou artigos, tentar secções
         if not chunks:
-            for pattern in self.patterns['seccao']:
-                matches = list(re.finditer(pattern, text, re.MULTILINE | re.DOTALL | re.IGNORECASE))
-                if matches:
-                    for match in matches:
-                        chunk_content = match.group(0).strip()
-                        if len(chunk_content) > 50:
-                            chunks.append({
-                                'content': chunk_content,
-                                'type': 'seccao',
-                                'number': match.group(1),
-                                'start_pos': match.start(),
-                                'end_pos': match.end()
-                            })
-                    break
+            chunks = self._chunks_from_strategies(tokenizer, 'seccao', min_length=50, min_matches=1)
         
         # Se não encontrou nem artigos nem secções, tentar parágrafos numerados
         if not chunks:
-            for pattern in self.patterns['paragrafo']:
-                matches = list(re.finditer(pattern, text, re.MULTILINE | re.IGNORECASE))
-                if len(matches) > 2:  # Pelo menos 3 parágrafos para ser considerado estrutural
-                    for match in matches:
-                        chunk_content = match.group(0).strip()
-                        if len(chunk_content) > 30:
-                            chunks.append({
-                                'content': chunk_content,
-                                'type': 'paragrafo',
-                                'number': match.group(1),
-                                'start_pos': match.start(),
-                                'end_pos': match.end()
-                            })
-                    break
-        
-        return sorted(chunks, key=lambda x: x['start_pos'])
+            # Pelo menos 3 parágrafos para ser considerado estrutural
+            chunks = self._chunks_from_strategies(tokenizer, 'paragrafo', min_length=30, min_matches=3)
+        
+        return chunks
+    
+    def _chunks_from_strategies(
+        self,
+        tokenizer: LegalStructureTokenizer,
+        chunk_type: str,
+        min_length: int,
+        min_matches: int
+    ) -> List[Dict[str, Any]]:
+        """Usa a primeira estratégia com blocos suficientes (as seguintes são ignoradas)"""
+        chunks = []
+        
+        for header_kind, terminators in self.structure_strategies[chunk_type]:
+            segments = tokenizer.segments(
+                header_kind,
+                terminator_headers=terminators.get('headers', ()),
+                terminator_keywords=terminators.get('keywords', ()),
+                terminator_lines=terminators.get('lines', ())
+            )
+            if len(segments) < min_matches:
+                continue
+            
+            for token, end in segments:
+                chunk_content = tokenizer.text[token.start:end].strip()
+                if len(chunk_content) > min_length:  # Filtrar chunks muito pequenos
+                    context = tokenizer.context_at(token.start, STRUCTURE_LEVELS[header_kind])
+                    chunks.append({
+                        'content': chunk_content,
+                        'type': chunk_type,
+                        'number': token.number,
+                        'start_pos': token.start,
+                        'end_pos': end,
+                        'context': " > ".join(f"{t.kind} {t.number}" for t in context) or None
+                    })
+            break
+        
+        return chunks
     
     def _process_structural_chunks(
         self, 
@@ -204,6 +171,7 @@ class LegalChunker:
                         chunk_type=f"{chunk_data['type']}_parte",
                         chunk_index=len(processed_chunks),
                         section_number=chunk_data.get('number'),
+                        subsection=chunk_data.get('context'),
                         legal_area=legal_area,
                         document_type=document_type
                     )
@@ -214,6 +182,7 @@ class LegalChunker:
                     chunk_type=chunk_data['type'],
                     chunk_index=len(processed_chunks),
                     section_number=chunk_data.get('number'),
+                    subsection=chunk_data.get('context'),
                     legal_area=legal_area,
                     document_type=document_type
                 )
@@ -337,23 +306,17 @@ class LegalChunker:
     
     def _detect_legal_concepts(self, content: str, legal_area: LegalArea) -> List[str]:
         """Detecta conceitos jurídicos no conteúdo"""
-        content_lower = content.lower()
+        # Uma única passagem pelo conteúdo para todos os conceitos
+        found_terms = legal_term_matcher.find_terms(content)
         concepts_found = []
         
         # Verificar conceitos da área específica
         if legal_area in self.legal_concepts:
-            for concept in self.legal_concepts[legal_area]:
-                if concept.lower() in content_lower:
-                    concepts_found.append(concept)
+            concepts_found.extend(legal_term_matcher.terms_in(found_terms, self.legal_concepts[legal_area]))
         
         # Verificar conceitos gerais
-        general_concepts = [
-            "direito", "dever", "obrigação", "responsabilidade", "lei", "norma",
-            "tribunal", "processo", "sentença", "recurso", "prazo", "procedimento"
-        ]
-        
-        for concept in general_concepts:
-            if concept in content_lower and concept not in concepts_found:
+        for concept in legal_term_matcher.terms_in(found_terms, CHUNKER_GENERAL_CONCEPTS):
+            if concept not in concepts_found:
                 concepts_found.append(concept)
         
         return concepts_found
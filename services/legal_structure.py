@@ -0,0 +1,201 @@
+"""
+Legal Structure - Tokenizador estrutural de documentos legais
+Encontra todas as fronteiras (TÍTULO, CAPÍTULO, SECÇÃO, ARTIGO, parágrafo, alínea)
+numa única passagem e resolve o contexto hierárquico a partir dos offsets
+"""
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+# Uma única varredura por palavras-chave e quebras de linha. "ar(?=t)" e "alíne(?=a)"
+# não consomem a última letra, para não esconder um "titulo"/"art" sobreposto
+_TOKEN_PATTERN = r'artigo|ar(?=t)|secção|seção|capítulo|t[ií]tulo|alíne(?=a)|parágrafo|§|\n'
+_TOKEN_SCAN = re.compile(_TOKEN_PATTERN)
+_TOKEN_SCAN_IGNORECASE = re.compile(_TOKEN_PATTERN, re.IGNORECASE)
+_TOKEN_KEYWORDS = {'ar': 'art', 'alíne': 'alínea', 'título': 'titulo'}
+
+# re.IGNORECASE também aceita ı como i e ſ como s
+_CASE_FOLD = (('ı', 'i'), ('ſ', 's'))
+
+
+def _fold_case(text: str) -> str:
+    text = text.lower()
+    for char, replacement in _CASE_FOLD:
+        if char in text:
+            text = text.replace(char, replacement)
+    return text
+
+_FLAGS = re.MULTILINE | re.IGNORECASE
+
+# Cabeçalhos ancorados na posição do token (mesmos prefixos dos padrões originais)
+HEADER_PATTERNS = {
+    'artigo': re.compile(r'artigo\s+(\d+)\.?º?\s*[-–—]?\s*', _FLAGS),
+    'art': re.compile(r'art\.?\s*(\d+)\.?º?\s*[-–—]?\s*', _FLAGS),
+    'seccao': re.compile(r'secção\s+([IVX]+|\d+)\s*[-–—]?\s*', _FLAGS),
+    'secao': re.compile(r'seção\s+([IVX]+|\d+)\s*[-–—]?\s*', _FLAGS),
+    'capitulo': re.compile(r'capítulo\s+([IVX]+|\d+)\s*[-–—]?\s*', _FLAGS),
+    'titulo': re.compile(r't[ií]tulo\s+([IVX]+|\d+)\s*[-–—]?\s*', _FLAGS),
+    'alinea': re.compile(r'alínea\s+([a-z])\)\s*', _FLAGS),
+    'paragrafo_sinal': re.compile(r'§\s*(\d+)º?\s*[-–—]?\s*', _FLAGS),
+    'paragrafo': re.compile(r'parágrafo\s+(\d+)º?\s*[-–—]?\s*', _FLAGS),
+    # Cabeçalhos em início de linha
+    'artigo_linha': re.compile(r'^(\d+)\.?\s*[-–—]\s*', _FLAGS),
+    'paragrafo_linha': re.compile(r'^\s*(\d+)\.?\s+', _FLAGS),
+    'alinea_linha': re.compile(r'^([a-z])\)\s*', _FLAGS)
+}
+
+# Marcadores que terminam um bloco mas não abrem cabeçalho
+_LINE_TERMINATORS = {
+    'artigo_linha_fim': re.compile(r'^\d+\.', _FLAGS),
+    'paragrafo_linha_fim': re.compile(r'^\s*\d+\.', _FLAGS)
+}
+
+# Palavra-chave encontrada pela varredura -> cabeçalhos possíveis nessa posição
+_KEYWORD_HEADERS = {
+    'artigo': ('artigo',),
+    'art': ('art',),
+    'secção': ('seccao',),
+    'seção': ('secao',),
+    'capítulo': ('capitulo',),
+    'titulo': ('titulo',),
+    'alínea': ('alinea',),
+    'parágrafo': ('paragrafo',),
+    '§': ('paragrafo_sinal',)
+}
+
+_LINE_HEADERS = ('artigo_linha', 'paragrafo_linha', 'alinea_linha')
+
+# Nível hierárquico de cada tipo de cabeçalho (menor = mais alto na árvore)
+STRUCTURE_LEVELS = {
+    'titulo': 1,
+    'capitulo': 2,
+    'seccao': 3, 'secao': 3,
+    'artigo': 4, 'art': 4, 'artigo_linha': 4,
+    'paragrafo': 5, 'paragrafo_sinal': 5, 'paragrafo_linha': 5,
+    'alinea': 6, 'alinea_linha': 6
+}
+
+
+@dataclass
+class StructureToken:
+    """Cabeçalho estrutural encontrado no texto"""
+    kind: str
+    start: int
+    header_end: int
+    number: str
+
+
+class LegalStructureTokenizer:
+    """Tokenizador de fronteiras estruturais para um texto"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens: Dict[str, List[StructureToken]] = {kind: [] for kind in HEADER_PATTERNS}
+        self.keyword_positions: Dict[str, List[int]] = {kind: [] for kind in _KEYWORD_HEADERS}
+        self.terminator_positions: Dict[str, List[int]] = {kind: [] for kind in _LINE_TERMINATORS}
+        self.newline_positions: List[int] = []
+        self._scan()
+        self._level_index = self._build_level_index()
+
+    def _scan(self):
+        # Varrer o texto em minúsculas sem IGNORECASE é bastante mais rápido;
+        # só é possível quando a conversão preserva os offsets
+        folded = _fold_case(self.text)
+        exact_offsets = len(folded) == len(self.text)
+        if exact_offsets:
+            matches = _TOKEN_SCAN.finditer(folded)
+        else:
+            matches = _TOKEN_SCAN_IGNORECASE.finditer(self.text)
+
+        self._scan_line_start(0)
+
+        for match in matches:
+            keyword = match.group(0)
+            position = match.start()
+
+            if keyword == '\n':
+                self.newline_positions.append(position)
+                self._scan_line_start(position + 1)
+                continue
+
+            if not exact_offsets:
+                keyword = _fold_case(keyword)
+            keyword = _TOKEN_KEYWORDS.get(keyword, keyword)
+            self.keyword_positions[keyword].append(position)
+            for kind in _KEYWORD_HEADERS[keyword]:
+                self._try_header(kind, position)
+
+    def _scan_line_start(self, position: int):
+        for kind in _LINE_HEADERS:
+            self._try_header(kind, position)
+        for kind, pattern in _LINE_TERMINATORS.items():
+            if pattern.match(self.text, position):
+                self.terminator_positions[kind].append(position)
+
+    def _try_header(self, kind: str, position: int):
+        header = HEADER_PATTERNS[kind].match(self.text, position)
+        if header:
+            self.tokens[kind].append(StructureToken(kind, position, header.end(), header.group(1)))
+
+    def _build_level_index(self) -> Dict[int, Tuple[List[int], List[StructureToken]]]:
+        by_level: Dict[int, List[StructureToken]] = {}
+        for kind, kind_tokens in self.tokens.items():
+            by_level.setdefault(STRUCTURE_LEVELS[kind], []).extend(kind_tokens)
+
+        index = {}
+        for level, level_tokens in by_level.items():
+            level_tokens.sort(key=lambda token: token.start)
+            index[level] = ([token.start for token in level_tokens], level_tokens)
+        return index
+
+    def context_at(self, position: int, max_level: int) -> List[StructureToken]:
+        """
+        Cabeçalhos que envolvem a posição com nível inferior a max_level
+        (ex.: título > capítulo > secção); cada nível só conta se começar depois
+        do cabeçalho do nível acima
+        """
+        path = []
+        lower_bound = 0
+        for level in sorted(self._level_index):
+            if level >= max_level:
+                break
+            starts, level_tokens = self._level_index[level]
+            i = bisect_right(starts, position) - 1
+            if i >= 0 and starts[i] >= lower_bound:
+                path.append(level_tokens[i])
+                lower_bound = starts[i]
+        return path
+
+    def segments(
+        self,
+        header_kind: str,
+        terminator_headers: Tuple[str, ...] = (),
+        terminator_keywords: Tuple[str, ...] = (),
+        terminator_lines: Tuple[str, ...] = ()
+    ) -> List[Tuple[StructureToken, int]]:
+        """
+        Blocos de um tipo de cabeçalho: (token, fim). Cada bloco termina no
+        primeiro terminador ou fim de linha a partir do fim do cabeçalho, e o
+        bloco seguinte começa no primeiro cabeçalho a partir desse fim.
+        """
+        boundaries = sorted(
+            [token.start for kind in terminator_headers for token in self.tokens[kind]] +
+            [p for keyword in terminator_keywords for p in self.keyword_positions[keyword]] +
+            [p for kind in terminator_lines for p in self.terminator_positions[kind]] +
+            self.newline_positions
+        )
+        text_end = len(self.text)
+
+        segments = []
+        position = 0
+        for token in self.tokens[header_kind]:
+            if token.start < position:
+                continue
+            i = bisect_left(boundaries, token.header_end)
+            end = boundaries[i] if i < len(boundaries) else text_end
+            segments.append((token, end))
+            position = end
+
+        return segments
+
@@ -0,0 +1,150 @@
+"""
+PDF Extractor - Extracção de texto de PDF paralela por intervalos de páginas
+Um pool de processos extrai blocos de páginas e o gerador devolve as páginas
+por ordem, com um número limitado de blocos em memória
+"""
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Union
+
+try:
+    import PyPDF2
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+# fork a partir de um processo com threads (event loop, pools) pode herdar locks
+# bloqueados; forkserver (ou spawn, onde não existe) arranca workers limpos
+_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extrai as páginas [start, end) num processo do pool"""
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _count_pages(file_path: str) -> int:
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+@contextmanager
+def _as_file(source: Union[str, bytes]) -> Iterator[str]:
+    """Os workers abrem o PDF pelo caminho; bytes são escritos uma vez em disco"""
+    if isinstance(source, (bytes, bytearray)):
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+            tmp.write(source)
+            tmp.flush()
+            yield tmp.name
+    else:
+        yield source
+
+
+class ParallelPDFExtractor:
+    """
+    Extractor de PDF com pool de processos partilhado.
+    PDFs pequenos são extraídos no próprio processo (sem custo de IPC).
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        pages_per_task: int = 16,
+        max_pending_tasks: Optional[int] = None
+    ):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.pages_per_task = max(1, pages_per_task)
+        # Blocos submetidos mas ainda não consumidos (limita a memória)
+        self.max_pending_tasks = max_pending_tasks or self.max_workers * 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(_START_METHOD)
+            )
+        return self._executor
+
+    def shutdown(self):
+        """Termina o pool de processos (chamado no shutdown da aplicação)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def count_pages(self, source: Union[str, bytes]) -> int:
+        """Número de páginas do PDF"""
+        if not PDF_AVAILABLE:
+            raise ImportError("PyPDF2 não disponível para processamento de PDF")
+
+        with _as_file(source) as file_path:
+            return _count_pages(file_path)
+
+    def iter_pages(self, source: Union[str, bytes]) -> Iterator[str]:
+        """
+        Gera o texto de cada página por ordem (páginas sem texto devolvem "").
+        Aceita o caminho do ficheiro ou o conteúdo em bytes.
+        """
+        if not PDF_AVAILABLE:
+            raise ImportError("PyPDF2 não disponível para processamento de PDF")
+
+        with _as_file(source) as file_path:
+            total_pages = _count_pages(file_path)
+
+            if total_pages <= self.pages_per_task or self.max_workers <= 1:
+                yield from _extract_page_range(file_path, 0, total_pages)
+                return
+
+            # Cada bloco volta a abrir o PDF: em documentos grandes usar blocos
+            # maiores para manter ~4 blocos por worker
+            task_pages = max(self.pages_per_task, -(-total_pages // (self.max_workers * 4)))
+            executor = self._get_executor()
+            ranges = iter(
+                (start, min(start + task_pages, total_pages))
+                for start in range(0, total_pages, task_pages)
+            )
+            pending = deque()
+
+            def submit_next() -> bool:
+                page_range = next(ranges, None)
+                if page_range is None:
+                    return False
+                pending.append(executor.submit(_extract_page_range, file_path, *page_range))
+                return True
+
+            try:
+                while len(pending) < self.max_pending_tasks and submit_next():
+                    pass
+
+                while pending:
+                    pages = pending.popleft().result()
+                    submit_next()
+                    yield from pages
+            finally:
+                # Consumidor parou a meio (ou erro): descartar blocos pendentes
+                for future in pending:
+                    future.cancel()
+                # O ficheiro temporário só pode ser apagado quando nenhum worker o lê
+                for future in pending:
+                    if not future.cancelled():
+                        try:
+                            future.result()
+                        except Exception:
+                            pass
+
+    def extract_text(self, source: Union[str, bytes], separator: str = "\n") -> str:
+        """Texto completo: cada página seguida do separador"""
+        return "".join(page + separator for page in self.iter_pages(source))
+
+
+# Instância global do extractor de PDF
+pdf_extractor = ParallelPDFExtractor(
+    max_workers=int(os.getenv('PDF_EXTRACTION_WORKERS', 0)) or None,
+    pages_per_task=int(os.getenv('PDF_PAGES_PER_TASK', 16))
+)
@@ -0,0 +1,152 @@
+"""
+Micro-benchmark do overhead por pedido da cadeia de middlewares
+Compara a aplicação sem middlewares, a cadeia antiga (mesmas verificações via
+BaseHTTPMiddleware / @app.middleware("http")) e a cadeia ASGI pura.
+
+Uso (a partir da raiz do repositório):
+    python tests/benchmark_middleware.py [pedidos]
+    python -m tests.benchmark_middleware [pedidos]
+As definições da app têm de estar configuradas (ex.: DATABASE_URL).
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# Executado como script, sys.path tem tests/ e não a raiz onde está o pacote app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.logging.structured_logger import security_logger
+from app.monitoring.system_monitor import system_monitor
+from app.middleware.rate_limiting import RateLimitMiddleware, rate_limit_middleware, rate_limiter
+from app.middleware.security_middleware import (
+    ReplayableReceive, RequestLoggingMiddleware, SecurityMiddleware, SECURITY_HEADERS
+)
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+class LegacySecurityMiddleware(BaseHTTPMiddleware):
+    """Mesmas verificações do SecurityMiddleware, no modelo dispatch/call_next"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.security = SecurityMiddleware(app)
+
+    async def dispatch(self, request, call_next):
+        await self.security.check_request(request, ReplayableReceive(request.receive))
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS:
+            response.headers[name.decode()] = value.decode()
+        return response
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    """Mesmo registo do RequestLoggingMiddleware (log estruturado e latência por rota)"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.logging = RequestLoggingMiddleware(app)
+
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        request_data = {
+            "method": request.method,
+            "url": str(request.url),
+            "headers": dict(request.headers),
+            "client_ip": self.logging.get_client_ip(request),
+            "timestamp": start_time
+        }
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            processing_time = time.time() - start_time
+            security_logger.info("Request processed",
+                                 request_data=request_data,
+                                 response_status=status_code,
+                                 processing_time=processing_time)
+            route = request.scope.get("route")
+            system_monitor.record_request(
+                method=request.method,
+                path=getattr(route, "path", "unmatched"),
+                status_code=status_code,
+                response_time=processing_time,
+                client_id=request_data["client_ip"]
+            )
+
+
+def legacy_app() -> FastAPI:
+    app = build_app()
+    app.middleware("http")(rate_limit_middleware)
+    app.add_middleware(LegacySecurityMiddleware)
+    app.add_middleware(LegacyLoggingMiddleware)
+    return app
+
+
+def asgi_app() -> FastAPI:
+    app = build_app()
+    app.add_middleware(RateLimitMiddleware)
+    app.add_middleware(SecurityMiddleware)
+    app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+async def run(app, requests: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/ping", "raw_path": b"/api/ping",
+        "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"user-agent", b"benchmark")],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 80)
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    # Aquecimento (startup do router, caches internos)
+    for _ in range(200):
+        await app(dict(scope), receive, send)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    logging.disable(logging.CRITICAL)
+    rate_limiter.per_minute_limit = rate_limiter.per_hour_limit = 10 ** 9
+
+    results = {}
+    for name, factory in [("sem middlewares", build_app),
+                          ("BaseHTTPMiddleware", legacy_app),
+                          ("ASGI puro", asgi_app)]:
+        results[name] = asyncio.run(run(factory(), requests))
+
+    baseline = results["sem middlewares"]
+    for name, micros in results.items():
+        print(f"{name:20s} {micros:8.1f} µs/pedido  (+{micros - baseline:6.1f} µs)")
+
+
+if __name__ == "__main__":
+    main()
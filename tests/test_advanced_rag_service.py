@@ -0,0 +1,80 @@
+"""
+Testes para o cálculo de relevância do AdvancedRAGService
+"""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from services.advanced_rag_service import AdvancedRAGService
+
+
+def reference_relevance(service, query, legal_concepts, result):
+    """Cálculo por linha anterior à versão em lote (referência para comparação)"""
+    content = result[2].lower()
+    title = result[1].lower()
+
+    query_terms = query.lower().split()
+    title_score = sum(1 for term in query_terms if term in title) / len(query_terms)
+    content_words = content.split()
+    content_score = 0
+    for term in query_terms:
+        term_count = content.count(term)
+        if term_count > 0:
+            content_score += term_count / len(content_words)
+    content_score = content_score / len(query_terms)
+    text_score = title_score * 0.6 + content_score * 0.4
+
+    area_score = legal_concepts.get(str(result[4] if result[4] else 0), 0) * 0.3
+    hierarchy_score = service._get_hierarchy_weight(result[3] if result[3] else 0) * 0.2
+    temporal_score = service._get_temporal_weight(result[5]) * 0.1
+
+    if not legal_concepts:
+        specificity = 0.5
+    else:
+        specificity = 0
+        for area, score in legal_concepts.items():
+            if area in service.legal_keywords:
+                found = sum(1 for keyword in service.legal_keywords[area] if keyword in content)
+                specificity += found / len(service.legal_keywords[area]) * score
+        specificity = min(specificity, 1.0)
+
+    final_score = text_score * 0.4 + area_score + hierarchy_score + temporal_score + specificity * 0.2
+    return min(max(final_score, 0), 1)
+
+
+CANDIDATES = [
+    (1, "Lei do Trabalho", "O contrato de trabalho entre o trabalhador e o empregador. "
+     "O contrato trabalho pode cessar por despedimento; o salário é devido.", 2, 0, date(2020, 5, 1)),
+    (2, "Código Penal", "Crime e pena: a prisão aplica-se ao crime grave. Crime crime crime.", 3, 0, None),
+    (3, "Constituição da República", "Direitos fundamentais e liberdades do estado.", 1, 0, date(2004, 11, 16)),
+    (4, "Regulamento", "aaaa contratocontrato trabalho trabalhador", 5, None, date(2024, 1, 1)),
+    (5, "Sem termos", "texto sem relação", None, None, None),
+]
+
+
+@pytest.mark.parametrize("query", [
+    "contrato de trabalho e despedimento do trabalhador",
+    "crime pena prisão crime",
+    "direitos fundamentais na constituição",
+    "aa contrato",
+])
+def test_batch_relevance_matches_per_row_scores(query):
+    service = AdvancedRAGService(db_pool=None, embedding_service=object())
+    legal_concepts = service._extract_legal_concepts(query)
+
+    batch = service._calculate_batch_relevance(query, legal_concepts, CANDIDATES)
+    expected = [reference_relevance(service, query, legal_concepts, row) for row in CANDIDATES]
+
+    np.testing.assert_allclose(batch, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_term_counts_do_not_overlap_like_str_count():
+    service = AdvancedRAGService(db_pool=None, embedding_service=object())
+    texts = ["aaaa", "contratocontrato trabalho", ""]
+    vocabulary = ["aa", "contrato", "contrato trabalho"]
+
+    counts = service._term_count_matrix(texts, vocabulary)
+
+    assert counts.tolist() == [[text.count(term) for term in vocabulary] for text in texts]
@@ -0,0 +1,57 @@
+"""
+Testes para a invalidação do cache de respostas entre processos
+"""
+
+import pytest
+
+from app.services.redis_pool import SharedRedis
+from services.answer_cache import AnswerCache
+
+
+def make_caches(count: int):
+    """Caches de workers distintos sobre o mesmo servidor Redis (fakeredis)"""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    caches = []
+    for _ in range(count):
+        redis = SharedRedis("redis://localhost", operation_timeout=1)
+        redis._client = fakeredis.aioredis.FakeRedis(server=server)
+        caches.append(AnswerCache(redis=redis))
+    return caches
+
+
+class TestAnswerCacheInvalidation:
+
+    @pytest.mark.asyncio
+    async def test_invalidation_reaches_other_workers(self):
+        writer, reader = make_caches(2)
+        answer = {'response': 'ok'}
+        for cache in (writer, reader):
+            await cache.set("Como registar uma empresa?", [1, 2], [10], answer)
+
+        assert await reader.get("como registar uma empresa", [2, 1]) == answer
+
+        await writer.invalidate_documents([10])
+
+        assert await writer.get("como registar uma empresa", [1, 2]) is None
+        assert await reader.get("como registar uma empresa", [1, 2]) is None
+        assert reader.stats['invalidations'] == 1
+
+    @pytest.mark.asyncio
+    async def test_other_documents_are_kept(self):
+        writer, reader = make_caches(2)
+        await reader.set("pergunta", [1], [10], {'response': 'a'})
+        await reader.set("outra pergunta", [2], [20], {'response': 'b'})
+
+        await writer.invalidate_documents([10])
+
+        assert await reader.get("pergunta", [1]) is None
+        assert await reader.get("outra pergunta", [2]) == {'response': 'b'}
+
+    @pytest.mark.asyncio
+    async def test_without_redis_invalidation_is_local(self):
+        cache = AnswerCache()
+        await cache.set("pergunta", [1], [10], {'response': 'a'})
+
+        assert await cache.invalidate_documents([10]) == 1
+        assert await cache.get("pergunta", [1]) is None
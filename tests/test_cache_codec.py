@@ -0,0 +1,140 @@
+"""
+Testes para o codec de cache e a leitura de valores no formato antigo
+"""
+
+import json
+import pickle
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app.services import cache_codec as codec_module
+from app.services.cache_codec import CacheCodec, decode_legacy_pickle
+from app.services.cache_service import RedisCache
+from app.services.redis_pool import SharedRedis
+from app.services.redis_service import RedisService
+
+VALUES = [
+    None,
+    True,
+    42,
+    -7.25,
+    "texto com acentuação",
+    ["a", 1, None, {"b": [2.5, False]}],
+    {"response": "Artigo 1", "sources": [{"id": 3, "score": 0.91}], "meta": {}},
+    2 ** 70,                       # fora de 64 bits: pickle
+    float("nan"),                  # não representável em JSON: pickle
+    (1, 2),                        # tuplo: pickle preserva o tipo
+    {1: "chave int"},
+    {"quando": datetime(2024, 5, 1, 12, 30)},
+    {"valor": Decimal("10.50")},
+    {"bytes": b"\x00\xff"},
+    {"conjunto": {1, 2, 3}},
+]
+
+
+@pytest.fixture(params=["none", "zlib", "auto"])
+def codec(request):
+    return CacheCodec(compression=request.param, compression_threshold=64)
+
+
+@pytest.mark.parametrize("value", VALUES, ids=repr)
+def test_round_trip(codec, value):
+    data = codec.encode(value)
+
+    assert codec.is_encoded(data)
+    decoded = codec.decode(data)
+    if isinstance(value, float) and value != value:
+        assert decoded != decoded
+    else:
+        assert decoded == value
+        assert type(decoded) is type(value)
+
+
+def test_large_payload_is_compressed():
+    codec = CacheCodec(compression="zlib", compression_threshold=64)
+    value = {"texto": "artigo " * 500}
+
+    data = codec.encode(value)
+
+    assert data[1] & 0x0F == codec_module.COMPRESSION_ZLIB
+    assert len(data) < len(json.dumps(value))
+    assert codec.decode(data) == value
+
+
+def test_small_payload_is_not_compressed():
+    data = CacheCodec(compression="zlib", compression_threshold=1024).encode({"a": 1})
+    assert data[1] & 0x0F == codec_module.COMPRESSION_NONE
+
+
+def test_unknown_compression_is_rejected():
+    with pytest.raises(ValueError):
+        CacheCodec(compression="brotli")
+
+
+@pytest.mark.parametrize("legacy", [
+    pickle.dumps({"a": 1}),
+    b'{"a": 1}',
+    b"texto simples",
+    b"1",
+    b"",
+])
+def test_legacy_values_are_not_mistaken_for_codec(legacy):
+    assert not CacheCodec.is_encoded(legacy)
+    with pytest.raises(ValueError):
+        CacheCodec().decode(legacy)
+
+
+@pytest.mark.parametrize("value", [{"a": [1, 2]}, datetime(2024, 1, 1), "ção"])
+def test_decode_legacy_pickle_bytes_and_latin1_text(value):
+    raw = pickle.dumps(value)
+    # Cliente síncrono antigo: pickle descodificado como latin-1 e gravado como UTF-8
+    as_text = raw.decode("latin-1").encode("utf-8")
+
+    assert decode_legacy_pickle(raw) == value
+    assert decode_legacy_pickle(as_text) == value
+
+
+def fake_shared_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = SharedRedis("redis://localhost", operation_timeout=1)
+    redis._client = fakeredis.aioredis.FakeRedis()
+    return redis
+
+
+class TestLegacyRedisFormats:
+
+    @pytest.mark.asyncio
+    async def test_redis_service_reads_json_text_and_hex_pickle(self):
+        redis = fake_shared_redis()
+        service = RedisService(redis=redis)
+        client = redis._client
+        await client.set("muzaia:json", json.dumps({"a": [1, 2]}))
+        await client.set("muzaia:texto", "valor antigo")
+        await client.set("muzaia:hex:pickle", pickle.dumps((1, "dois")).hex())
+
+        assert await service.get("json") == {"a": [1, 2]}
+        assert await service.get("texto") == "valor antigo"
+        assert await service.get("hex") == (1, "dois")
+
+    @pytest.mark.asyncio
+    async def test_redis_service_round_trip_uses_codec(self):
+        redis = fake_shared_redis()
+        service = RedisService(redis=redis)
+
+        await service.set("novo", {"quando": datetime(2024, 5, 1)})
+
+        assert CacheCodec.is_encoded(await redis._client.get("muzaia:novo"))
+        assert await service.get("novo") == {"quando": datetime(2024, 5, 1)}
+
+    @pytest.mark.asyncio
+    async def test_redis_cache_reads_legacy_pickle(self):
+        redis = fake_shared_redis()
+        cache = RedisCache(redis=redis)
+        raw = pickle.dumps({"resposta": "ção"})
+        await redis._client.set("bytes", raw)
+        await redis._client.set("texto", raw.decode("latin-1").encode("utf-8"))
+
+        assert await cache.get("bytes") == {"resposta": "ção"}
+        assert await cache.get("texto") == {"resposta": "ção"}
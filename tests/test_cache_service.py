@@ -4,8 +4,13 @@ Testes para o serviço de cache
 
 import pytest
 import asyncio
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from app.services.cache_service import CacheService, InMemoryCache, cache_service
+from app.services import redis_service as redis_service_module
+from app.services.redis_pool import SharedRedis
+from app.services.redis_service import RedisService, cached as redis_cached, default_key_builder
 
 class TestInMemoryCache:
     
@@ -91,6 +96,39 @@ class TestInMemoryCache:
         assert stats["size"] == 3
         assert stats["max_size"] == 5
 
+    def test_byte_limit_eviction(self):
+        """Teste remoção LRU por limite de bytes"""
+        cache = InMemoryCache(max_size=100, max_bytes=250)
+        for i in range(3):
+            cache.set(f"key{i}", "x" * 100)
+        
+        # Só cabem dois valores de 100 bytes
+        assert cache.get("key0") is None
+        assert cache.get("key2") == "x" * 100
+        assert cache.stats()["memory_usage"] <= 250
+    
+    def test_hit_accounting_per_prefix(self):
+        """Teste contadores reais de hits/misses por prefixo"""
+        self.cache.set("muzaia:legal:1", "value1")
+        self.cache.get("muzaia:legal:1")
+        self.cache.get("muzaia:legal:2")
+        
+        stats = self.cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 50.0
+        assert stats["prefixes"]["muzaia:legal"]["sets"] == 1
+    
+    def test_sweep_expired(self):
+        """Teste varrimento de entradas expiradas"""
+        self.cache.set("key1", "value1", ttl_seconds=1)
+        self.cache.set("key2", "value2")
+        
+        time.sleep(1.1)
+        
+        assert self.cache.sweep_expired() == 1
+        assert self.cache.stats()["size"] == 1
+
 class TestCacheService:
     
     def setup_method(self):
@@ -221,5 +259,125 @@ async def test_cache_decorator():
     assert result3 == "result_different_value"
     assert call_count == 2
 
+class TestRedisCachedDecorator:
+    """Decorador cached do redis_service: single-flight, stale-while-revalidate e chaves"""
+    
+    @pytest.fixture(autouse=True)
+    def isolated_caches(self, monkeypatch):
+        """Tiers vazios em cada teste (Redis não configurado: fallback em memória)"""
+        monkeypatch.setattr(redis_service_module, "redis_service", RedisService(redis=SharedRedis(None)))
+        monkeypatch.setattr(redis_service_module, "_sync_cache", InMemoryCache(max_size=100))
+    
+    def test_sync_concurrent_misses_compute_once(self):
+        """Teste misses concorrentes (threads) executam a função uma vez"""
+        calls = 0
+        
+        @redis_cached(ttl=60)
+        def slow_lookup(term):
+            nonlocal calls
+            calls += 1
+            time.sleep(0.1)
+            return f"resultado_{term}"
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: slow_lookup("artigo"), range(8)))
+        
+        assert results == ["resultado_artigo"] * 8
+        assert calls == 1
+    
+    @pytest.mark.asyncio
+    async def test_async_concurrent_misses_compute_once(self):
+        """Teste misses concorrentes (tarefas) executam a função uma vez"""
+        calls = 0
+        
+        @redis_cached(ttl=60)
+        async def slow_lookup(term):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return f"resultado_{term}"
+        
+        results = await asyncio.gather(*(slow_lookup("artigo") for _ in range(8)))
+        
+        assert results == ["resultado_artigo"] * 8
+        assert calls == 1
+    
+    def test_sync_serves_stale_while_refreshing(self):
+        """Teste valor obsoleto é devolvido de imediato enquanto a revalidação corre"""
+        calls = 0
+        release = threading.Event()
+        
+        @redis_cached(ttl=0, stale_ttl=60)
+        def lookup():
+            nonlocal calls
+            calls += 1
+            if calls > 1:
+                release.wait(2)
+            return calls
+        
+        assert lookup() == 1
+        
+        # Revalidação bloqueada: o valor antigo é servido sem esperar
+        start = time.monotonic()
+        assert lookup() == 1
+        assert time.monotonic() - start < 0.5
+        
+        release.set()
+        deadline = time.monotonic() + 2
+        while lookup() == 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert lookup() >= 2
+    
+    @pytest.mark.asyncio
+    async def test_async_serves_stale_while_refreshing(self):
+        """Teste revalidação assíncrona em segundo plano com valor obsoleto servido"""
+        calls = 0
+        release = asyncio.Event()
+        
+        @redis_cached(ttl=0, stale_ttl=60)
+        async def lookup():
+            nonlocal calls
+            calls += 1
+            if calls > 1:
+                await release.wait()
+            return calls
+        
+        assert await lookup() == 1
+        assert await lookup() == 1
+        # A revalidação em curso não é repetida por novos hits obsoletos
+        assert await lookup() == 1
+        await asyncio.sleep(0)
+        assert calls == 2
+        
+        release.set()
+        await asyncio.sleep(0.01)
+        assert await lookup() == 2
+    
+    def test_instances_share_one_entry(self):
+        """Teste métodos de instâncias distintas partilham a mesma entrada"""
+        calls = 0
+        
+        class Repository:
+            @redis_cached(ttl=60)
+            def find(self, term):
+                nonlocal calls
+                calls += 1
+                return f"resultado_{term}"
+        
+        assert Repository().find("artigo") == "resultado_artigo"
+        assert Repository().find("artigo") == "resultado_artigo"
+        assert calls == 1
+    
+    def test_key_builder_skips_self_and_normalizes_args(self):
+        """Teste chave ignora self e normaliza argumentos posicionais/nomeados"""
+        def find(self, term, limit=10):
+            pass
+        
+        key = default_key_builder(find, (object(), "artigo"), {"limit": 10})
+        
+        assert key == default_key_builder(find, (object(), "artigo", 10), {})
+        assert key == default_key_builder(find, (object(), "artigo"), {})
+        assert key != default_key_builder(find, (object(), "artigo", 5), {})
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
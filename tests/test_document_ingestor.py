@@ -0,0 +1,65 @@
+"""
+Testes para a classificação de falhas do DocumentIngestor
+"""
+
+import psycopg
+import pytest
+
+from services.document_ingestor import DocumentIngestor, IngestionCancelled, is_retryable_error
+
+LEGAL_TEXT = (
+    "Lei n.º 1/2024\n\nArtigo 1\nObjecto\n"
+    "A presente lei regula o registo de empresas comerciais e define os prazos aplicáveis.\n"
+)
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (psycopg.OperationalError("server closed the connection"), True),
+    (ConnectionResetError(), True),
+    (TimeoutError(), True),
+    (OSError("disk I/O error"), True),
+    (FileNotFoundError(), False),
+    (PermissionError(), False),
+    (ValueError("texto inválido"), False),
+    (KeyError("document_id"), False),
+    (psycopg.errors.UniqueViolation(), False),
+])
+def test_only_transient_errors_are_retryable(error, retryable):
+    assert is_retryable_error(error) is retryable
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error, retryable", [
+    (psycopg.OperationalError("pool timeout"), True),
+    (TypeError("bug"), False),
+])
+async def test_process_document_reports_retryable(tmp_path, monkeypatch, error, retryable):
+    path = tmp_path / "lei.txt"
+    path.write_text(LEGAL_TEXT, encoding="utf-8")
+    ingestor = DocumentIngestor(db_pool=None, embedding_service=object())
+
+    async def failing_save(*args, **kwargs):
+        raise error
+    monkeypatch.setattr(ingestor, "_save_to_database", failing_save)
+
+    result = await ingestor.process_document(str(path), "lei.txt")
+
+    assert result['success'] is False
+    assert result['retryable'] is retryable
+
+
+@pytest.mark.asyncio
+async def test_process_document_reports_cancellation(tmp_path, monkeypatch):
+    path = tmp_path / "lei.txt"
+    path.write_text(LEGAL_TEXT, encoding="utf-8")
+    ingestor = DocumentIngestor(db_pool=None, embedding_service=object())
+
+    async def cancelled_save(*args, **kwargs):
+        raise IngestionCancelled("Job 7 já não está em processamento")
+    monkeypatch.setattr(ingestor, "_save_to_database", cancelled_save)
+
+    result = await ingestor.process_document(str(path), "lei.txt", upload_id=7)
+
+    assert result['success'] is False
+    assert result['cancelled'] is True
+    assert 'retryable' not in result
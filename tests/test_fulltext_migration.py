@@ -0,0 +1,21 @@
+"""
+Testes para as expressões de pesquisa full-text durante e depois do backfill
+"""
+
+import services.fulltext_migration as fulltext_migration
+from services.fulltext_migration import LEGACY_TSVECTOR_SQL, tsv_match_sql, tsv_rank_sql
+
+
+def test_fallback_to_legacy_expression_while_backfilling(monkeypatch):
+    monkeypatch.setattr(fulltext_migration, "_backfill_complete", False)
+
+    assert LEGACY_TSVECTOR_SQL in tsv_match_sql("dc.tsv")
+    assert "dc.tsv IS NULL" in tsv_match_sql("dc.tsv")
+    assert tsv_rank_sql("dc.tsv") == f"ts_rank(COALESCE(dc.tsv, {LEGACY_TSVECTOR_SQL}), q)"
+
+
+def test_plain_indexable_predicate_after_backfill(monkeypatch):
+    monkeypatch.setattr(fulltext_migration, "_backfill_complete", True)
+
+    assert tsv_match_sql("dc.tsv_weighted") == "dc.tsv_weighted @@ q"
+    assert tsv_rank_sql("COALESCE(dc.tsv_weighted, dc.tsv)") == "ts_rank(COALESCE(dc.tsv_weighted, dc.tsv), q)"
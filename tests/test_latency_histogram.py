@@ -0,0 +1,87 @@
+"""
+Testes para os histogramas de latência com memória fixa
+"""
+
+import math
+import random
+
+import pytest
+
+from app.monitoring.latency_histogram import HistogramRegistry, LatencyHistogram
+
+QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1.0]
+
+
+def exact_quantile(values, q):
+    """Nearest-rank sobre os valores ordenados"""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def latency_samples(seed: int, count: int = 20000):
+    """Latências lognormais (≈ 1ms a 60s) com uma cauda de valores lentos"""
+    rng = random.Random(seed)
+    values = [min(rng.lognormvariate(math.log(0.2), 1.2), 60.0) for _ in range(count)]
+    values += [rng.uniform(5, 30) for _ in range(count // 100)]
+    return values
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.02, 0.05])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_quantiles_within_relative_accuracy(relative_accuracy, seed):
+    values = latency_samples(seed)
+    histogram = LatencyHistogram(relative_accuracy=relative_accuracy)
+    for value in values:
+        histogram.record(value)
+
+    for q in QUANTILES:
+        exact = exact_quantile(values, q)
+        estimate = histogram.quantile(q)
+        assert abs(estimate - exact) <= relative_accuracy * exact + 1e-12, (q, exact, estimate)
+
+
+def test_memory_is_fixed():
+    histogram = LatencyHistogram()
+    buckets = len(histogram._buckets)
+    for value in latency_samples(4, count=50000):
+        histogram.record(value)
+
+    assert len(histogram._buckets) == buckets
+    assert histogram.count == 50500
+
+
+def test_values_outside_range_are_clamped():
+    histogram = LatencyHistogram(min_value=1e-3, max_value=10.0)
+    histogram.record(1e-6)
+    histogram.record(50.0)
+
+    assert histogram.quantile(0.5) == 1e-3
+    # O último bucket devolve no máximo o maior valor registado
+    assert histogram.quantile(1.0) <= 50.0
+    assert histogram.max == 50.0
+
+
+def test_summary_in_milliseconds():
+    histogram = LatencyHistogram()
+    assert histogram.summary() == {"count": 0}
+    assert histogram.quantile(0.5) is None
+
+    for value in (0.1, 0.2, 0.3):
+        histogram.record(value)
+    summary = histogram.summary()
+
+    assert summary["count"] == 3
+    assert summary["mean_ms"] == 200.0
+    assert summary["p50_ms"] == pytest.approx(200.0, rel=0.01)
+    assert summary["max_ms"] == 300.0
+
+
+def test_registry_caps_keys():
+    registry = HistogramRegistry(max_keys=2)
+    for key in ("/a", "/b", "/c", "/d"):
+        registry.record(key, 0.1)
+
+    summary = registry.summary()
+    assert set(summary["by_key"]) == {"/a", "/b", HistogramRegistry.OVERFLOW_KEY}
+    assert summary["by_key"][HistogramRegistry.OVERFLOW_KEY]["count"] == 2
+    assert summary["overall"]["count"] == 4
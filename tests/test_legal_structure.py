@@ -0,0 +1,112 @@
+"""
+Testes para o tokenizador estrutural usado pelo LegalChunker
+"""
+
+import re
+
+import pytest
+
+from models.legal_document_hierarchy import LegalArea, LegalDocumentType
+from services.legal_chunker import LegalChunker
+
+# Padrões lookahead do chunker anterior (referência para comparação)
+OLD_PATTERNS = {
+    'artigo': [
+        r'artigo\s+(\d+)\.?º?\s*[-–—]?\s*(.*?)(?=artigo\s+\d+|$)',
+        r'art\.?\s*(\d+)\.?º?\s*[-–—]?\s*(.*?)(?=art\.?\s*\d+|$)',
+        r'^(\d+)\.?\s*[-–—]\s*(.*?)(?=^\d+\.|$)'
+    ],
+    'seccao': [
+        r'secção\s+([IVX]+|\d+)\s*[-–—]?\s*(.*?)(?=secção|artigo|$)',
+        r'seção\s+([IVX]+|\d+)\s*[-–—]?\s*(.*?)(?=seção|artigo|$)'
+    ],
+    'paragrafo': [
+        r'§\s*(\d+)º?\s*[-–—]?\s*(.*?)(?=§|artigo|$)',
+        r'parágrafo\s+(\d+)º?\s*[-–—]?\s*(.*?)(?=parágrafo|artigo|$)',
+        r'^\s*(\d+)\.?\s+(.*?)(?=^\s*\d+\.|$)'
+    ]
+}
+
+
+def old_structural_chunks(text):
+    """_extract_structural_chunks anterior, com um finditer por padrão"""
+    def from_patterns(chunk_type, flags, min_length, min_matches):
+        chunks = []
+        for pattern in OLD_PATTERNS[chunk_type]:
+            matches = list(re.finditer(pattern, text, flags))
+            if len(matches) >= min_matches:
+                for match in matches:
+                    content = match.group(0).strip()
+                    if len(content) > min_length:
+                        chunks.append((content, chunk_type, match.group(1), match.start()))
+                break
+        return chunks
+
+    return (
+        from_patterns('artigo', re.MULTILINE | re.DOTALL | re.IGNORECASE, 50, 1) or
+        from_patterns('seccao', re.MULTILINE | re.DOTALL | re.IGNORECASE, 50, 1) or
+        from_patterns('paragrafo', re.MULTILINE | re.IGNORECASE, 30, 3)
+    )
+
+
+SAMPLE_ACT = """LEI N.º 23/2007 de 1 de Agosto
+TITULO I - Disposições gerais
+CAPÍTULO I - Objecto e âmbito
+Artigo 1 - Objecto. A presente lei define os princípios e normas gerais que regem o trabalho subordinado.
+Artigo 2 - Âmbito. Aplica-se às relações jurídicas de trabalho subordinado estabelecidas entre empregadores e trabalhadores.
+CAPÍTULO II - Contrato de trabalho
+SECÇÃO I - Formação do contrato
+Artigo 3.º - Noção. Contrato de trabalho é o acordo pelo qual o trabalhador se obriga a prestar a sua actividade. § 1º O contrato pode ser verbal. § 2º Salvo disposição em contrário.
+Art. 4 - Forma. O contrato de trabalho a prazo certo está sujeito à forma escrita, alínea a) identificação das partes.
+ARTIGO 5 – Período probatório. O período probatório não pode exceder noventa dias para a generalidade dos trabalhadores.
+"""
+
+SECTIONS_ONLY = (
+    "Secção I - Das sociedades comerciais e do seu registo obrigatório junto da conservatória. "
+    "Secção II - Da firma, que deve ser composta de modo a dar a conhecer o objecto social. "
+    "Secção 3 curta."
+)
+
+NUMBERED_PARAGRAPHS = "\n".join(
+    f"{n}. O requerente deve apresentar a declaração número {n} dentro do prazo legal." for n in range(1, 6)
+)
+
+UNSTRUCTURED = "Texto corrido sem cabeçalhos estruturais, apenas considerações gerais sobre a lei."
+
+
+@pytest.mark.parametrize("text", [SAMPLE_ACT, SECTIONS_ONLY, NUMBERED_PARAGRAPHS, UNSTRUCTURED])
+@pytest.mark.parametrize("clean", [False, True])
+def test_chunk_boundaries_match_old_chunker(text, clean):
+    chunker = LegalChunker()
+    if clean:
+        text = chunker._clean_text(text)
+
+    chunks = chunker._extract_structural_chunks(text, LegalArea.TRABALHO)
+
+    assert [(c['content'], c['type'], c['number'], c['start_pos']) for c in chunks] == old_structural_chunks(text)
+
+
+def test_sample_act_chunks_and_context():
+    chunker = LegalChunker()
+    chunks = chunker._extract_structural_chunks(SAMPLE_ACT, LegalArea.TRABALHO)
+
+    assert [c['number'] for c in chunks] == ['1', '2', '3', '5']
+    assert chunks[2]['content'].startswith("Artigo 3.º - Noção.")
+    assert chunks[2]['context'] == "titulo I > capitulo II > seccao I"
+
+
+@pytest.mark.parametrize("heading", ["TÍTULO I", "Título I", "TITULO I"])
+def test_accented_titulo_in_context(heading):
+    text = SAMPLE_ACT.replace("TITULO I", heading)
+    chunks = LegalChunker()._extract_structural_chunks(text, LegalArea.TRABALHO)
+
+    assert chunks[2]['context'] == "titulo I > capitulo II > seccao I"
+
+
+def test_chunk_legal_document_keeps_articles():
+    chunks = LegalChunker().chunk_legal_document(
+        SAMPLE_ACT, "Lei do Trabalho", LegalArea.TRABALHO, LegalDocumentType.LEI
+    )
+
+    assert [chunk.section_number for chunk in chunks] == ['1', '2', '3', '5']
+    assert all(chunk.chunk_type == 'artigo' for chunk in chunks)
@@ -0,0 +1,86 @@
+"""
+Testes para o matcher Aho-Corasick de vocabulário jurídico
+"""
+
+import random
+
+import pytest
+
+import models.legal_terms as legal_terms
+from models.legal_terms import LEGAL_VOCABULARIES, LegalTermMatcher
+
+ALL_TERMS = sorted({term for terms in LEGAL_VOCABULARIES.values() for term in terms})
+
+SAMPLE_TEXTS = [
+    "O CONTRATO DE TRABALHO cessa por despedimento com justa causa; o salário é devido.",
+    "Código Penal: o crime de furto é punido com pena de prisão ou multa.",
+    "A Constituição consagra os direitos fundamentais e a separação de poderes do Estado.",
+    "Recurso de apelação para o Tribunal Supremo sobre a herança e a sucessão.",
+    "contratocontrato trabalhador-empregador impostoiva",
+    "",
+]
+
+
+def random_texts(count: int = 200, seed: int = 7):
+    """Textos com termos do vocabulário colados, em maiúsculas e com ruído"""
+    rng = random.Random(seed)
+    filler = ["a", "de", "lei", "xyz", " ", ", ", "ção"]
+    texts = []
+    for _ in range(count):
+        pieces = [rng.choice(ALL_TERMS + filler) for _ in range(rng.randint(1, 15))]
+        text = rng.choice(["", " "]).join(pieces)
+        texts.append(text.upper() if rng.random() < 0.2 else text)
+    return texts
+
+
+def reference_match(vocabularies, text):
+    """Verificação anterior, termo a termo: `term in text.lower()`"""
+    text_lower = text.lower()
+    result = {}
+    for category, terms in vocabularies.items():
+        found = [term for term in terms if term.lower() in text_lower]
+        if found:
+            result[category] = found
+    return result
+
+
+@pytest.fixture(params=["pyahocorasick", "python"])
+def matcher(request, monkeypatch):
+    if request.param == "pyahocorasick":
+        if not legal_terms.AHOCORASICK_AVAILABLE:
+            pytest.skip("pyahocorasick não instalado")
+    else:
+        monkeypatch.setattr(legal_terms, "AHOCORASICK_AVAILABLE", False)
+    return LegalTermMatcher(LEGAL_VOCABULARIES)
+
+
+@pytest.mark.parametrize("text", SAMPLE_TEXTS + random_texts())
+def test_match_equals_substring_checks(matcher, text):
+    assert matcher.match(text) == reference_match(LEGAL_VOCABULARIES, text)
+
+
+def test_iter_matches_reports_every_occurrence(matcher):
+    text = SAMPLE_TEXTS[0] + " " + SAMPLE_TEXTS[4]
+    text_lower = text.lower()
+    expected = set()
+    for term in matcher.term_categories:
+        start = text_lower.find(term)
+        while start != -1:
+            expected.add((start, term))
+            start = text_lower.find(term, start + 1)
+
+    found = {(start, term) for start, term, _ in matcher.iter_matches(text)}
+
+    assert found == expected
+
+
+def test_match_with_prefix_keeps_vocabulary_order(matcher):
+    text = "Contrato de trabalho: despedimento e salário"
+    matches = matcher.match(text, prefix="complexidade.")
+
+    assert matches["complexidade.direito_trabalho"] == ["contrato de trabalho", "salário", "despedimento"]
+    assert matches == {
+        category: terms
+        for category, terms in reference_match(LEGAL_VOCABULARIES, text).items()
+        if category.startswith("complexidade.")
+    }
@@ -0,0 +1,351 @@
+"""
+Testes para o orquestrador de LLMs
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import llm_orchestra
+from llm_orchestra import (
+    BaseLLMProvider, CircuitBreaker, GeminiProvider, HedgingPolicy, LLMOrchestrator, LLMProvider,
+    ProviderHealthRegistry, ProviderSaturated
+)
+
+
+class FakeProvider(BaseLLMProvider):
+    """Provedor de teste: responde (ou falha, com fail=True) após `delay` segundos"""
+
+    def __init__(self, delay: float = 0.0, max_concurrency: int = 1):
+        super().__init__(api_key="test", max_concurrency=max_concurrency)
+        self.delay = delay
+        self.fail = False
+
+    async def generate_response(self, prompt: str, context: str = "") -> str:
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("falha simulada")
+        return f"resposta: {prompt}"
+
+    def is_available(self) -> bool:
+        return True
+
+    def get_model_info(self):
+        return {"name": "fake"}
+
+
+class TestProviderSaturation:
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_is_saturation_not_failure(self):
+        """Sem vaga no limite local: saturado, sem falha na saúde nem no breaker"""
+        orchestrator = LLMOrchestrator()
+        provider = FakeProvider()
+        orchestrator.add_provider(LLMProvider.GEMINI_2_FLASH, provider)
+
+        await provider.acquire()  # ocupar a única vaga
+        try:
+            with pytest.raises(ProviderSaturated):
+                await orchestrator._attempt(LLMProvider.GEMINI_2_FLASH, 0.05, "q", "")
+        finally:
+            provider.release()
+
+        health = orchestrator.health.snapshot(LLMProvider.GEMINI_2_FLASH)
+        assert health["status"] == ProviderHealthRegistry.UNKNOWN
+        assert health["consecutive_failures"] == 0
+        assert orchestrator.breakers[LLMProvider.GEMINI_2_FLASH].snapshot(30)["window_calls"] == 0
+        assert orchestrator.metrics.usage_stats["saturations"] == 1
+        assert provider.get_concurrency_info()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_deadline_starts_after_acquiring_slot(self):
+        """O tempo em fila não conta para o prazo nem para a latência do breaker"""
+        orchestrator = LLMOrchestrator()
+        provider = FakeProvider(delay=0.1)
+        orchestrator.add_provider(LLMProvider.GEMINI_2_FLASH, provider)
+
+        await provider.acquire()
+        asyncio.get_running_loop().call_later(0.1, provider.release)
+
+        # 0.1s em fila + 0.1s de chamada excede 0.15s no total, mas cada parte cabe
+        response = await orchestrator._attempt(LLMProvider.GEMINI_2_FLASH, 0.15, "q", "")
+
+        assert response == "resposta: q"
+        latencies = list(orchestrator.breakers[LLMProvider.GEMINI_2_FLASH]._latencies)
+        assert len(latencies) == 1 and latencies[0] < 0.15
+
+
+class FakeGeminiModel:
+    """Modelo Gemini de teste: devolve os fragmentos dados em streaming"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        async def iterate():
+            for chunk in self.chunks:
+                yield chunk
+        return iterate()
+
+
+def gemini_chunk(*texts, finish_reason=None):
+    parts = [SimpleNamespace(text=text) for text in texts]
+    reason = SimpleNamespace(name=finish_reason) if finish_reason else None
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts), finish_reason=reason)])
+
+
+def gemini_provider(chunks):
+    provider = GeminiProvider.__new__(GeminiProvider)
+    BaseLLMProvider.__init__(provider, api_key="test")
+    provider.model_version = "gemini-test"
+    provider.model = FakeGeminiModel(chunks)
+    return provider
+
+
+async def collect(stream):
+    return [text async for text in stream]
+
+
+class TestGeminiStreaming:
+
+    @pytest.mark.asyncio
+    async def test_chunks_without_text_are_skipped(self):
+        provider = gemini_provider([
+            gemini_chunk("Artigo ", "1"),
+            gemini_chunk(),  # sem partes de texto: chunk.text levantaria
+            gemini_chunk(" do Código", finish_reason="STOP"),
+        ])
+
+        assert await collect(provider.generate_stream("q")) == ["Artigo 1", " do Código"]
+
+    @pytest.mark.asyncio
+    async def test_partial_answer_keeps_text_on_abnormal_finish(self, caplog):
+        provider = gemini_provider([gemini_chunk("Resposta parcial"), gemini_chunk(finish_reason="MAX_TOKENS")])
+
+        assert await collect(provider.generate_stream("q")) == ["Resposta parcial"]
+        assert "finish_reason=MAX_TOKENS" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_blocked_stream_reports_finish_reason(self):
+        blocked = SimpleNamespace(candidates=[], prompt_feedback=SimpleNamespace(block_reason=SimpleNamespace(name="SAFETY")))
+        provider = gemini_provider([blocked])
+
+        with pytest.raises(Exception, match="finish_reason=SAFETY"):
+            await collect(provider.generate_stream("q"))
+
+
+class TestProviderHealthRegistry:
+    """Limiar de falhas consecutivas para sondas e pedidos reais"""
+
+    @pytest.mark.parametrize("source", ["probe", "request"])
+    def test_single_failure_keeps_provider_available(self, source):
+        health = ProviderHealthRegistry(failure_threshold=3)
+        health.register(LLMProvider.GEMINI_2_FLASH)
+
+        health.record_failure(LLMProvider.GEMINI_2_FLASH, "timeout", source=source)
+        health.record_failure(LLMProvider.GEMINI_2_FLASH, "timeout", source=source)
+        assert health.is_available(LLMProvider.GEMINI_2_FLASH)
+
+        health.record_failure(LLMProvider.GEMINI_2_FLASH, "timeout", source=source)
+        assert not health.is_available(LLMProvider.GEMINI_2_FLASH)
+
+    def test_success_resets_failures(self):
+        health = ProviderHealthRegistry(failure_threshold=2)
+        health.register(LLMProvider.GEMINI_2_FLASH)
+
+        health.record_failure(LLMProvider.GEMINI_2_FLASH, "timeout", source="probe")
+        health.record_success(LLMProvider.GEMINI_2_FLASH, source="request")
+        health.record_failure(LLMProvider.GEMINI_2_FLASH, "timeout", source="probe")
+
+        assert health.is_available(LLMProvider.GEMINI_2_FLASH)
+
+
+class FakeClock:
+    """Relógio monotónico controlado pelo teste"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_orchestra.time, "monotonic", fake)
+    return fake
+
+
+class TestCircuitBreaker:
+
+    def test_opens_on_failure_rate(self, clock):
+        breaker = CircuitBreaker(min_calls=4, failure_rate_threshold=0.5)
+        breaker.record_success(0.1)
+        breaker.record_failure(0.1)
+        breaker.record_success(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED  # abaixo de min_calls
+
+        breaker.record_failure(0.1)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+    def test_opens_on_slow_call_rate(self, clock):
+        breaker = CircuitBreaker(min_calls=3, slow_call_threshold=2.0, slow_call_rate_threshold=0.6)
+        for latency in (2.5, 0.1, 3.0):
+            breaker.record_success(latency)
+
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_half_open_allows_a_single_probe(self, clock):
+        breaker = CircuitBreaker(min_calls=1, open_duration=30)
+        breaker.record_failure()
+
+        clock.now += 29
+        assert not breaker.allow_request()
+
+        clock.now += 1
+        assert breaker.allow_request()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow_request()  # sonda em curso
+
+        # Sonda que nunca reportou resultado é libertada ao fim de open_duration
+        clock.now += 30
+        assert breaker.allow_request()
+
+    def test_probe_success_closes_with_clean_window(self, clock):
+        breaker = CircuitBreaker(min_calls=2)
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now += breaker.open_duration
+        assert breaker.allow_request()
+
+        breaker.record_success(0.2)
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.snapshot(30)["window_calls"] == 0
+        assert breaker.allow_request() and breaker.allow_request()
+
+    def test_probe_failure_reopens(self, clock):
+        breaker = CircuitBreaker(min_calls=1, open_duration=30)
+        breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow_request()
+
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        clock.now += 29
+        assert not breaker.allow_request()
+
+    def test_deadline_follows_p95_latency(self, clock):
+        breaker = CircuitBreaker(min_calls=5, min_timeout=1.0, latency_multiplier=1.5)
+        assert breaker.deadline(30) == 30  # sem histórico
+
+        for _ in range(10):
+            breaker.record_success(4.0)
+        assert breaker.deadline(30) == pytest.approx(6.0)
+
+        for _ in range(100):
+            breaker.record_success(0.1)
+        assert breaker.deadline(30) == 1.0  # limitado por min_timeout
+
+
+def hedging_orchestrator(primary_delay: float, secondary_delay: float, policy: HedgingPolicy):
+    """Primário (Claude Sonnet) com histórico de ~50ms e secundário (Gemini)"""
+    orchestrator = LLMOrchestrator(hedging=policy)
+    primary, secondary = FakeProvider(primary_delay), FakeProvider(secondary_delay)
+    orchestrator.add_provider(LLMProvider.CLAUDE_3_SONNET, primary)
+    orchestrator.add_provider(LLMProvider.GEMINI_2_FLASH, secondary)
+    for _ in range(10):
+        orchestrator.breakers[LLMProvider.CLAUDE_3_SONNET].record_success(0.05)
+    return orchestrator, primary, secondary
+
+
+class TestHedgingPolicy:
+
+    def test_no_hedge_when_disabled_or_without_history(self):
+        breaker = CircuitBreaker(min_calls=5)
+        assert HedgingPolicy(enabled=False).hedge_delay(breaker) is None
+        assert HedgingPolicy(enabled=True).hedge_delay(breaker) is None
+
+    def test_delay_is_latency_percentile_with_floor(self):
+        breaker = CircuitBreaker(min_calls=5)
+        for latency in [1.0] * 9 + [3.0]:
+            breaker.record_success(latency)
+
+        assert HedgingPolicy(enabled=True, percentile=50, min_delay=0.5).hedge_delay(breaker) == 1.0
+        assert HedgingPolicy(enabled=True, percentile=50, min_delay=2.0).hedge_delay(breaker) == 2.0
+
+    def test_hedge_ratio_is_capped(self):
+        policy = HedgingPolicy(enabled=True, max_hedge_ratio=0.1)
+        granted = []
+        for _ in range(50):
+            policy.requests += 1
+            granted.append(policy.try_acquire())
+
+        assert sum(granted) == 5
+        assert policy.hedges_suppressed == 45
+        assert policy.snapshot()["hedge_rate"] == 0.1
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_is_hedged_and_loser_cancelled(self):
+        policy = HedgingPolicy(enabled=True, max_hedge_ratio=1.0, min_delay=0.01)
+        orchestrator, primary, secondary = hedging_orchestrator(1.0, 0.01, policy)
+
+        result = await orchestrator.get_legal_response("q", "")
+        await asyncio.sleep(0.05)  # deixar o primário cancelado libertar a vaga
+
+        assert result["provider"] == LLMProvider.GEMINI_2_FLASH.value
+        assert result["response_time"] < 0.5
+        assert (policy.hedges_fired, policy.hedges_won, policy.hedges_lost) == (1, 1, 0)
+        assert primary.get_concurrency_info()["in_flight"] == 0
+        # O cancelamento do primário não é uma falha
+        assert orchestrator.breakers[LLMProvider.CLAUDE_3_SONNET].snapshot(30)["window_calls"] == 10
+
+    @pytest.mark.asyncio
+    async def test_primary_winning_the_race_is_recorded(self):
+        policy = HedgingPolicy(enabled=True, max_hedge_ratio=1.0, min_delay=0.01)
+        orchestrator, primary, secondary = hedging_orchestrator(0.1, 1.0, policy)
+
+        result = await orchestrator.get_legal_response("q", "")
+
+        assert result["provider"] == LLMProvider.CLAUDE_3_SONNET.value
+        assert (policy.hedges_fired, policy.hedges_won, policy.hedges_lost) == (1, 0, 1)
+
+    @pytest.mark.asyncio
+    async def test_suppressed_hedge_waits_for_primary(self):
+        policy = HedgingPolicy(enabled=True, max_hedge_ratio=0.1, min_delay=0.01)
+        orchestrator, primary, secondary = hedging_orchestrator(0.1, 0.01, policy)
+
+        result = await orchestrator.get_legal_response("q", "")
+
+        assert result["provider"] == LLMProvider.CLAUDE_3_SONNET.value
+        assert policy.hedges_fired == 0 and policy.hedges_suppressed == 1
+        assert secondary.get_concurrency_info()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_counted_without_next_provider(self):
+        policy = HedgingPolicy(enabled=True, max_hedge_ratio=1.0, min_delay=0.01)
+        orchestrator = LLMOrchestrator(hedging=policy)
+        orchestrator.add_provider(LLMProvider.CLAUDE_3_SONNET, FakeProvider(0.1))
+        for _ in range(10):
+            orchestrator.breakers[LLMProvider.CLAUDE_3_SONNET].record_success(0.05)
+
+        result = await orchestrator.get_legal_response("q", "")
+
+        assert result["provider"] == LLMProvider.CLAUDE_3_SONNET.value
+        assert policy.hedges_fired == 0 and policy.hedges_suppressed == 0
+
+    @pytest.mark.asyncio
+    async def test_suppressed_hedge_candidate_is_kept_for_fallback(self):
+        policy = HedgingPolicy(enabled=True, max_hedge_ratio=0.1, min_delay=0.01)
+        orchestrator, primary, secondary = hedging_orchestrator(0.1, 0.01, policy)
+        primary.fail = True
+
+        result = await orchestrator.get_legal_response("q", "")
+
+        assert result["provider"] == LLMProvider.GEMINI_2_FLASH.value
+        assert policy.hedges_fired == 0 and policy.hedges_suppressed == 1
@@ -6,7 +6,11 @@ import pytest
 import asyncio
 from fastapi.testclient import TestClient
 from fastapi import FastAPI, Request
-from app.middleware.rate_limiting import rate_limiter, rate_limit_middleware
+from app.middleware.rate_limiting import AdvancedRateLimiter, rate_limiter, rate_limit_middleware
+from app.services.redis_pool import SharedRedis
+import os
+import subprocess
+import sys
 import time
 
 # Mock app para testes
@@ -82,6 +86,53 @@ class TestRateLimiting:
         assert isinstance(client_id, str)
         assert "127.0.0.1" in client_id
     
+    def test_client_identifier_is_stable_across_processes(self):
+        """O identificador não pode depender da seed de hash do processo (chaves Redis partilhadas)"""
+        code = (
+            "from app.middleware.rate_limiting import rate_limiter\n"
+            "request = type('R', (), {'client': type('C', (), {'host': '10.0.0.1'})(),"
+            " 'headers': {'user-agent': 'test-agent'}})()\n"
+            "print(rate_limiter.get_client_identifier(request))"
+        )
+        identifiers = {
+            subprocess.run(
+                [sys.executable, "-c", code],
+                env={**os.environ, "PYTHONHASHSEED": seed},
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            for seed in ("1", "2")
+        }
+        assert len(identifiers) == 1
+    
+    @pytest.mark.asyncio
+    async def test_limiters_share_budget_through_redis(self):
+        """Dois workers (instâncias distintas) partilham o mesmo limite via Redis"""
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeServer()
+        
+        limiters = []
+        for _ in range(2):
+            redis = SharedRedis("redis://localhost", operation_timeout=1)
+            redis._client = fakeredis.aioredis.FakeRedis(server=server)
+            limiter = AdvancedRateLimiter(redis=redis)
+            limiter.per_minute_limit = 4
+            limiters.append(limiter)
+        
+        request = type('MockRequest', (), {
+            'client': type('Client', (), {'host': '10.0.0.2'})(),
+            'headers': {'user-agent': 'worker-test'}
+        })()
+        
+        allowed = []
+        for i in range(6):
+            limiter = limiters[i % 2]
+            result = await limiter.check_and_record(limiter.get_client_identifier(request))
+            allowed.append(result["allowed"])
+        
+        assert allowed == [True] * 4 + [False] * 2
+        assert all(not limiter.request_cache for limiter in limiters)
+    
     def test_cache_cleanup(self):
         """Teste limpeza automática do cache"""
         # Adicionar entrada antiga
@@ -98,6 +149,19 @@ class TestRateLimiting:
         # Entrada antiga deve ter sido removida
         assert "old_client" not in rate_limiter.request_cache
     
+    def test_sliding_window_weights_previous_window(self):
+        """Pedidos da janela anterior contam proporcionalmente ao tempo restante"""
+        rate_limiter.per_minute_limit = 10
+        start = 6000.0  # início de uma janela de 60s
+
+        for _ in range(10):
+            assert rate_limiter.check_and_record_local("client", start + 50)["allowed"]
+
+        # A meio da janela seguinte, metade dos 10 pedidos anteriores ainda conta
+        results = [rate_limiter.check_and_record_local("client", start + 90) for _ in range(6)]
+        assert [r["allowed"] for r in results] == [True] * 5 + [False]
+        assert results[4]["remaining"] == 0
+
     @pytest.mark.asyncio
     async def test_concurrent_requests(self):
         """Teste rate limiting com requests concorrentes"""
@@ -0,0 +1,23 @@
+"""
+Testes para a thread de amostragem do monitor do sistema
+"""
+
+import time
+
+from app.monitoring.system_monitor import SystemMonitor
+
+
+def test_first_sample_does_not_wait_for_interval(monkeypatch):
+    monkeypatch.setattr(SystemMonitor, "FIRST_SAMPLE_DELAY", 0.01)
+    monitor = SystemMonitor(max_history=10)
+    monitor.start_sampler(interval=300)
+    try:
+        deadline = time.monotonic() + 5
+        while not len(monitor.system_metrics_history) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(monitor.system_metrics_history) == 1
+        assert len(monitor.api_metrics_history) == 1
+    finally:
+        monitor.stop_monitoring()
+        monitor._sampler.join(timeout=1)
+    assert not monitor._sampler.is_alive()